@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Mesh cache for GmshCalculation.
+
+The cache builds on AiiDA's own caching mechanism: a finished ``GmshCalculation`` whose hash
+matches the hash of a new calculation is reused as cache source, such that the stored
+``mshfile`` is returned without going through scheduler or transport. The hash of a
+``GmshCalculation`` covers the content of the ``geofile`` (and of any other ``SinglefileData``
+input), the canonicalized ``GmshParameters`` (see ``GmshParameters.canonical_dict``) and the
+``gmsh_version`` option.
+
+Enable the cache for gmsh calculations with::
+
+    verdi config set caching.enabled_for aiida.calculations:gmsh
+
+The functions below implement the eviction policy used by ``verdi data gmsh cache``. Evicting an
+entry clears the hash of the calculation node, such that it is no longer considered as cache
+source. The node itself (and its provenance) is kept.
+"""
+import collections
+import datetime
+
+from aiida.common import timezone
+from aiida.common.hashing import _HASH_EXTRA_KEY
+from aiida.orm import CalcJobNode, QueryBuilder, load_node
+
+PROCESS_TYPE = 'aiida.calculations:gmsh'
+
+CacheEntry = collections.namedtuple('CacheEntry', ['pk', 'uuid', 'ctime', 'hash', 'hits'])
+
+
+def get_cache_entries():
+    """Return all valid cache sources of ``GmshCalculation``, most recent first.
+
+    :return: list of :py:class:`CacheEntry`
+    """
+    hits = collections.Counter()
+    qb = QueryBuilder()
+    qb.append(CalcJobNode,
+              filters={
+                  'process_type': PROCESS_TYPE,
+                  'extras': {
+                      'has_key': '_aiida_cached_from'
+                  }
+              },
+              project=['extras._aiida_cached_from'])
+    for (source_uuid,) in qb.iterall():
+        hits[source_uuid] += 1
+
+    qb = QueryBuilder()
+    qb.append(CalcJobNode,
+              filters={
+                  'process_type': PROCESS_TYPE,
+                  'attributes.exit_status': 0,
+                  'extras': {
+                      'has_key': _HASH_EXTRA_KEY
+                  }
+              },
+              project=['id', 'uuid', 'ctime', 'extras.{}'.format(_HASH_EXTRA_KEY)])
+    qb.order_by({CalcJobNode: {'ctime': 'desc'}})
+
+    entries = []
+    for pk, uuid, ctime, node_hash in qb.iterall():
+        if node_hash is None:
+            # hash was cleared, i.e. entry was evicted
+            continue
+        entries.append(CacheEntry(pk, uuid, ctime, node_hash, hits[uuid]))
+    return entries
+
+
+def select_evictions(entries, max_age=None, max_entries=None, now=None):
+    """Select cache entries to evict.
+
+    The eviction policy is applied in the following order:
+
+     1. Of several entries with the same hash only the most recent one is kept.
+     2. Entries older than ``max_age`` are evicted.
+     3. Of the remaining entries only the ``max_entries`` most recent ones are kept.
+
+    :param entries: list of :py:class:`CacheEntry`, most recent first
+    :param max_age: maximum age of an entry
+    :param type max_age: :py:class:`datetime.timedelta`
+    :param max_entries: maximum number of entries to keep
+    :param type max_entries: int
+    :param now: reference time (defaults to now)
+    :return: list of :py:class:`CacheEntry` to evict
+    """
+    now = now or timezone.now()
+
+    evicted = []
+    keep = []
+    seen = set()
+    for entry in entries:
+        if entry.hash in seen or (max_age is not None and now - entry.ctime > max_age):
+            evicted.append(entry)
+        else:
+            seen.add(entry.hash)
+            keep.append(entry)
+
+    if max_entries is not None:
+        evicted.extend(keep[max_entries:])
+
+    return evicted
+
+
+def evict(max_age_days=None, max_entries=None, everything=False, dry_run=False):
+    """Evict entries from the mesh cache.
+
+    :param max_age_days: evict entries older than this number of days
+    :param type max_age_days: float
+    :param max_entries: maximum number of entries to keep
+    :param type max_entries: int
+    :param everything: evict all entries
+    :param type everything: bool
+    :param dry_run: only return the entries that would be evicted
+    :param type dry_run: bool
+    :return: list of evicted :py:class:`CacheEntry`
+    """
+    entries = get_cache_entries()
+    if everything:
+        evicted = entries
+    else:
+        max_age = datetime.timedelta(days=max_age_days) if max_age_days is not None else None
+        evicted = select_evictions(entries, max_age=max_age, max_entries=max_entries)
+
+    if not dry_run:
+        for entry in evicted:
+            load_node(entry.pk).clear_hash()
+
+    return evicted
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Calcfunctions provided by aiida_gmsh.
+
+For small meshes, the latency of ``GmshCalculation`` is dominated by upload, scheduler and retrieval.
+``mesh_geofile`` drives the gmsh Python API (``pip install aiida-gmsh[sdk]``) directly in a
+calcfunction with the same ``GmshParameters``, and produces the same outputs (``mshfile`` and ``mesh``)
+with the same link labels as ``GmshCalculation``.
+
+gmsh keeps global state and is not thread-safe. The meshes are therefore generated in a pool of worker
+processes, each of which initializes gmsh once and resets the session between calls.
+
+``run_mesh`` chooses between the in-process path and ``GmshCalculation`` based on the expected mesh size.
+
+``convert_to_xdmf`` converts the ``mshfile`` of either path to XDMF/HDF5 (see :py:mod:`aiida_gmsh.xdmf`).
+
+``fetch_remote_mesh`` retrieves a mesh left on the remote computer (``keep_remote`` option of ``GmshCalculation``).
+"""
+import atexit
+import concurrent.futures
+import hashlib
+import os
+import posixpath
+import shutil
+import tempfile
+
+from aiida.engine import calcfunction, run
+from aiida.orm import Dict, FolderData, SinglefileData
+from aiida.plugins import CalculationFactory, DataFactory
+
+from aiida_gmsh.data import OPTIMIZE_METHODS
+from aiida_gmsh.msh import METADATA_ATTRIBUTE, read_metadata
+
+# meshes with up to this number of elements are generated in-process by ``run_mesh``
+IN_PROCESS_MAX_ELEMENTS = 100000
+
+# number of worker processes running gmsh sessions
+MAX_WORKERS = os.cpu_count() or 1
+
+# values of the Mesh.Algorithm and Mesh.Algorithm3D options of gmsh
+ALGORITHMS_2D = {
+    'meshadapt': 1,
+    'auto': 2,
+    'initial2d': 3,
+    'del2d': 5,
+    'front2d': 6,
+    'delquad': 8,
+    'quadqs': 11,
+}
+ALGORITHMS_3D = {
+    'del3d': 1,
+    'initial3d': 3,
+    'front3d': 4,
+    'mmg3d': 7,
+    'hxt': 10,
+}
+MSH_VERSIONS = {
+    'msh': 4.1,
+    'msh4': 4.1,
+    'msh41': 4.1,
+    'msh2': 2.2,
+    'msh22': 2.2,
+}
+
+_POOL = None
+
+
+def is_available():
+    """Return True if the gmsh Python API can be imported."""
+    try:
+        import gmsh  # pylint: disable=import-outside-toplevel,unused-import
+    except (ImportError, OSError):  # OSError: shared library of gmsh not found
+        return False
+    return True
+
+
+def _initialize_worker():
+    """Initialize the gmsh session of a worker process."""
+    import gmsh  # pylint: disable=import-outside-toplevel
+
+    gmsh.initialize(readConfigFiles=False, interruptible=False)
+    gmsh.option.setNumber('General.Terminal', 0)
+    atexit.register(gmsh.finalize)
+
+
+def _reset_session():
+    """Reset models, parser variables and options left over by the previous call."""
+    import gmsh  # pylint: disable=import-outside-toplevel
+
+    gmsh.clear()
+    gmsh.parser.clear()
+    gmsh.option.restoreDefaults()
+    gmsh.option.setNumber('General.Terminal', 0)
+
+
+def _generate(geofile, parameters, output_filename, parent_mesh=None):
+    """Generate the mesh in the gmsh session of the current (worker) process.
+
+    Mirrors the command line options of ``GmshParameters.cmdline_params``: a parent mesh is merged after the
+    geofile and only refined or optimized, not meshed again.
+
+    :param geofile: absolute path of the .geo file
+    :param parameters: validated dictionary of command line options
+    :param output_filename: absolute path of the output file
+    :param parent_mesh: absolute path of an existing mesh
+    """
+    import gmsh  # pylint: disable=import-outside-toplevel
+
+    _reset_session()
+    dim = max([int(key) for key in ('1', '2', '3') if parameters.get(key)], default=0)
+
+    for name, value in parameters.get('setnumber', {}).items():
+        gmsh.parser.setNumber(name, [value])
+    for name, value in parameters.get('setstring', {}).items():
+        gmsh.parser.setString(name, [value])
+    for key, option in (('clscale', 'Mesh.MeshSizeFactor'), ('clmin', 'Mesh.MeshSizeMin'),
+                        ('clmax', 'Mesh.MeshSizeMax'), ('nt', 'General.NumThreads')):
+        if key in parameters:
+            gmsh.option.setNumber(option, parameters[key])
+    if 'algo' in parameters:
+        algo = parameters['algo']
+        if algo in ALGORITHMS_3D:
+            gmsh.option.setNumber('Mesh.Algorithm3D', ALGORITHMS_3D[algo])
+        else:
+            gmsh.option.setNumber('Mesh.Algorithm', ALGORITHMS_2D[algo])
+    if parameters.get('bin'):
+        gmsh.option.setNumber('Mesh.Binary', 1)
+    if parameters.get('format', 'auto') != 'auto':
+        gmsh.option.setNumber('Mesh.MshFileVersion', MSH_VERSIONS[parameters['format']])
+
+    gmsh.open(geofile)
+    if parent_mesh is not None:
+        gmsh.merge(parent_mesh)
+    elif dim:
+        gmsh.model.mesh.generate(dim)
+        if parameters.get('order', 1) > 1:
+            gmsh.model.mesh.setOrder(parameters['order'])
+    if parameters.get('refine'):
+        gmsh.model.mesh.refine()
+    for key, method in OPTIMIZE_METHODS:
+        if parameters.get(key):
+            gmsh.model.mesh.optimize(method)
+    if 'part' in parameters and (dim or parameters.get('refine')):
+        gmsh.model.mesh.partition(parameters['part'])
+    gmsh.write(output_filename)
+
+
+def get_pool(max_workers=None):
+    """Return the pool of worker processes running gmsh sessions (created on first use).
+
+    :param max_workers: number of worker processes (defaults to ``MAX_WORKERS``)
+    """
+    global _POOL  # pylint: disable=global-statement
+    if _POOL is None:
+        _POOL = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers or MAX_WORKERS,
+                                                       initializer=_initialize_worker)
+    return _POOL
+
+
+def shutdown_pool():
+    """Shut down the pool of worker processes (a new pool is created on the next call)."""
+    global _POOL  # pylint: disable=global-statement
+    if _POOL is not None:
+        _POOL.shutdown()
+        _POOL = None
+
+
+def _check_parameters(parameters):
+    """Raise a ValueError for command line options not supported by the in-process path."""
+    fmt = parameters.get('format', 'auto')
+    if fmt != 'auto' and fmt not in MSH_VERSIONS:
+        raise ValueError("format '{}' is not supported in-process, use GmshCalculation".format(fmt))
+    if parameters.get('part_split'):
+        raise ValueError('part_split is not supported in-process, use GmshCalculation')
+
+
+@calcfunction
+def mesh_geofile(geofile, parameters, parent_mesh=None):
+    """Mesh a .geo file in-process with the gmsh Python API.
+
+    :param geofile: the .geo file to process
+    :param parameters: command line parameters for gmsh (``GmshParameters``)
+    :param parent_mesh: existing mesh (``SinglefileData``) merged after the geofile, which is refined or
+        optimized without meshing it again (see ``GmshCalculation``)
+    :returns: dictionary with the ``mshfile`` and (for .msh files) the ``mesh``
+    """
+    pm_dict = parameters.get_dict()
+    _check_parameters(pm_dict)
+    if parent_mesh is not None and any(pm_dict.get(dim) for dim in ('1', '2', '3')):
+        raise ValueError('The parent_mesh is not meshed again and cannot be combined with 1, 2 or 3.')
+    output_filename = pm_dict.get('o', 'mesh.msh')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        geofile_path = os.path.join(tmpdir, geofile.filename)
+        with geofile.open(mode='rb') as source, open(geofile_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        parent_path = None
+        if parent_mesh is not None:
+            # the parent is kept in a subfolder, such that it is not overwritten by the output file
+            parent_path = os.path.join(tmpdir, 'parent', parent_mesh.filename)
+            os.mkdir(os.path.dirname(parent_path))
+            with parent_mesh.open(mode='rb') as source, open(parent_path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+        output_path = os.path.join(tmpdir, os.path.basename(output_filename))
+        get_pool().submit(_generate, geofile_path, pm_dict, output_path, parent_path).result()
+
+        outputs = {'mshfile': SinglefileData(file=output_path, filename=os.path.basename(output_filename))}
+        if output_path.endswith('.msh'):
+            with open(output_path, 'rb') as handle:
+                outputs['mshfile'].set_attribute(METADATA_ATTRIBUTE, read_metadata(handle))
+            with open(output_path, 'rb') as handle:
+                outputs['mesh'] = DataFactory('gmsh.mesh').from_msh(handle)
+
+    return outputs
+
+
+def should_mesh_in_process(parameters, expected_num_elements=None, max_elements=IN_PROCESS_MAX_ELEMENTS):
+    """Decide whether a mesh should be generated in-process (see ``run_mesh``).
+
+    3D meshes are generated by ``GmshCalculation``, unless the expected number of elements is given and small.
+
+    :param parameters: ``GmshParameters``
+    :param expected_num_elements: expected number of elements of the mesh (if known)
+    :param max_elements: maximum number of elements for meshing in-process
+    """
+    if not is_available():
+        return False
+    pm_dict = parameters.get_dict()
+    try:
+        _check_parameters(pm_dict)
+    except ValueError:
+        return False
+    if expected_num_elements is not None:
+        return expected_num_elements <= max_elements
+    return not pm_dict.get('3')
+
+
+def run_mesh(geofile, parameters, code=None, expected_num_elements=None, max_elements=IN_PROCESS_MAX_ELEMENTS,
+             **kwargs):
+    """Mesh a .geo file in-process or with ``GmshCalculation``, depending on the expected mesh size.
+
+    :param geofile: the .geo file to process
+    :param parameters: ``GmshParameters``
+    :param code: the gmsh code used by ``GmshCalculation`` (if None, the mesh is always generated in-process)
+    :param expected_num_elements: expected number of elements of the mesh (if known)
+    :param max_elements: maximum number of elements for meshing in-process
+    :param kwargs: further inputs of ``GmshCalculation``, e.g. ``metadata``
+    :returns: dictionary of outputs, containing at least the ``mshfile``
+    """
+    if code is None or should_mesh_in_process(parameters, expected_num_elements, max_elements):
+        return mesh_geofile(geofile, parameters)
+    return run(CalculationFactory('gmsh'), code=code, geofile=geofile, parameters=parameters, **kwargs)
+
+
+@calcfunction
+def convert_to_xdmf(mshfile, options=None):
+    """Convert a MSH 4.1 file to XDMF/HDF5 (``pip install aiida-gmsh[xdmf]``).
+
+    The mesh is streamed block by block into chunked HDF5 datasets (see :py:func:`aiida_gmsh.xdmf.write_xdmf`).
+
+    :param mshfile: the mesh, e.g. the ``mshfile`` output of ``GmshCalculation``
+    :param options: Dict with keyword arguments of ``write_xdmf``
+        (``gdim``, ``compression``, ``compression_opts``, ``chunk_rows``)
+    :returns: dictionary with the ``xdmf`` FolderData (``<name>.xdmf`` and ``<name>.h5``) and the
+        ``xdmf_summary`` Dict
+    """
+    from aiida_gmsh.xdmf import write_xdmf  # pylint: disable=import-outside-toplevel
+
+    stem = os.path.splitext(mshfile.filename)[0]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with mshfile.open(mode='rb') as handle:
+            summary = write_xdmf(handle, os.path.join(tmpdir, stem + '.h5'), os.path.join(tmpdir, stem + '.xdmf'),
+                                 **(options.get_dict() if options is not None else {}))
+        folder = FolderData(tree=tmpdir)
+
+    return {'xdmf': folder, 'xdmf_summary': Dict(dict=summary)}
+
+
+@calcfunction
+def fetch_remote_mesh(remote_mesh):
+    """Retrieve a mesh which was left on the remote computer by ``GmshCalculation`` (``keep_remote`` option).
+
+    The checksum of the retrieved file is compared with the one computed on the remote computer.
+
+    :param remote_mesh: the ``remote_mesh`` output of ``GmshCalculation``
+    :returns: dictionary with the ``mshfile``
+    :raises ValueError: if the checksum of the retrieved file does not match
+    """
+    filename = posixpath.basename(remote_mesh.get_remote_path())
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, filename)
+        with remote_mesh.computer.get_transport() as transport:
+            transport.getfile(remote_mesh.get_remote_path(), path)
+
+        expected = remote_mesh.get_attribute('sha256', None)
+        if expected is not None:
+            checksum = hashlib.sha256()
+            with open(path, 'rb') as handle:
+                for chunk in iter(lambda: handle.read(4 * 1024 * 1024), b''):
+                    checksum.update(chunk)
+            if checksum.hexdigest() != expected:
+                raise ValueError("Checksum of '{}' does not match the checksum computed on the remote computer".format(
+                    remote_mesh.get_remote_path()))
+
+        mshfile = SinglefileData(file=path, filename=filename)
+        if filename.endswith('.msh'):
+            with open(path, 'rb') as handle:
+                mshfile.set_attribute(METADATA_ATTRIBUTE, read_metadata(handle))
+
+    return {'mshfile': mshfile}
@@ -4,12 +4,126 @@ Calculations provided by aiida_gmsh.
 
 Register calculations via the "aiida.calculations" entry point in setup.json.
 """
+import io
+import os
+import posixpath
+
 from aiida.common import datastructures
 from aiida.engine import CalcJob
-from aiida.orm import SinglefileData
+from aiida.engine.processes.calcjobs.calcjob import validate_calc_job
+from aiida.orm import Dict, RemoteData, SinglefileData
 from aiida.plugins import DataFactory
 
-GmshParameters = DataFactory('gmsh')
+from aiida_gmsh.dependencies import get_dependency_filename, resolve_dependencies
+from aiida_gmsh.monitor import ABORT_FILENAME
+
+# Commands compressing the output file on the remote computer before retrieval.
+# zstd falls back to gzip if it is not available on the remote computer.
+COMPRESSION_COMMANDS = {
+    'gzip': 'gzip -f {filename}',
+    'zstd': 'if command -v zstd > /dev/null 2>&1; then zstd -q --rm -f {filename}; else gzip -f {filename}; fi',
+}
+COMPRESSION_SUFFIXES = {
+    'gzip': ['.gz'],
+    'zstd': ['.zst', '.gz'],
+}
+
+# Commands extracting the header and the size and checksum of a mesh which is kept on the remote computer.
+# The numbers of nodes and elements are read from the headers of the $Nodes and $Elements sections of .msh
+# files (the second value of each header, written as text or as size_t in binary files).
+KEEP_REMOTE_COMMANDS = """if [ -f {filename} ]; then
+    head -c {header_bytes} {filename} > {filename}.header
+    echo "size $(wc -c < {filename})" > {filename}.stats
+    sha256sum {filename} | awk '{{print "sha256", $1}}' >> {filename}.stats
+    file_type=$(sed -n '2{{p;q}}' {filename} | awk '{{print $2}}')
+    data_size=$(sed -n '2{{p;q}}' {filename} | awk '{{print $3}}')
+    for section in Nodes Elements; do
+        offset=$(grep -abxFm1 '$'"$section" {filename} | cut -d: -f1)
+        [ -n "$offset" ] || continue
+        start=$((offset + ${{#section}} + 3))
+        if [ "$file_type" = 1 ]; then
+            count=$(tail -c +$start {filename} | head -c $((2 * data_size)) | od -An -tu$data_size | awk '{{print $2}}')
+        else
+            count=$(tail -c +$start {filename} | head -n 1 | awk '{{print $2}}')
+        fi
+        [ -z "$count" ] || echo "num_$(echo $section | tr A-Z a-z) $count" >> {filename}.stats
+    done
+fi"""
+
+
+def get_partition_pattern(output_filename):
+    """Return the glob pattern of the files written by gmsh for the partitions of a split mesh.
+
+    With the ``part_split`` option, gmsh writes partition ``n`` of ``mesh.msh`` to ``mesh_n.msh``.
+    """
+    stem, ext = os.path.splitext(output_filename)
+    return '{}_*{}'.format(stem, ext)
+
+
+def validate_compression(value, _):
+    """Validate the compression option."""
+    if value not in COMPRESSION_COMMANDS:
+        return 'compression has to be one of {}.'.format(', '.join(COMPRESSION_COMMANDS))
+    if value == 'zstd':
+        try:
+            import zstandard  # pylint: disable=import-outside-toplevel,unused-import
+        except ImportError:
+            return "compression 'zstd' requires the zstandard package (pip install aiida-gmsh[zstd])."
+    return None
+
+
+def validate_inputs(inputs, ctx):
+    """Validate that gmsh does not use more threads than cores are allocated per MPI process."""
+    error = validate_calc_job(inputs, ctx)
+    if error:
+        return error
+    if 'parameters' not in inputs:
+        return None
+    threads = inputs['parameters'].get_dict().get('nt')
+    cores = inputs.get('metadata', {}).get('options', {}).get('resources', {}).get('num_cores_per_mpiproc')
+    if threads is not None and cores is not None and threads > cores:
+        return 'Number of threads (nt={}) exceeds num_cores_per_mpiproc={}.'.format(threads, cores)
+    options = inputs.get('metadata', {}).get('options', {})
+    if options.get('keep_remote'):
+        if options.get('compression') is not None:
+            return 'The keep_remote option cannot be combined with compression.'
+        if inputs['parameters'].get_dict().get('part_split'):
+            return 'The keep_remote option cannot be combined with part_split.'
+    return validate_parent_mesh(inputs) or validate_dependencies(inputs)
+
+
+def validate_parent_mesh(inputs):
+    """Validate that a geofile or a parent mesh is given, a remote parent mesh has to be on the computer of the code."""
+    if 'geofile' not in inputs and 'parent_mesh' not in inputs:
+        return 'Specify a geofile, a parent_mesh or both.'
+    parent_mesh = inputs.get('parent_mesh')
+    if isinstance(parent_mesh, RemoteData) and 'code' in inputs and \
+            parent_mesh.computer.uuid != inputs['code'].computer.uuid:
+        return 'The parent_mesh is on computer {}, but the code is on {}.'.format(
+            parent_mesh.computer.label, inputs['code'].computer.label)
+    if parent_mesh is not None and 'parameters' in inputs and \
+            any(inputs['parameters'].get_dict().get(dim) for dim in ('1', '2', '3')):
+        return 'The parent_mesh is not meshed again and cannot be combined with 1, 2 or 3.'
+    return None
+
+
+def validate_dependencies(inputs):
+    """Validate that the dependencies provide all files referenced by the geofile.
+
+    Remote dependencies have to be on the computer of the code.
+    """
+    dependencies = inputs.get('dependencies', {})
+    if 'code' in inputs:
+        for label, node in dependencies.items():
+            if isinstance(node, RemoteData) and node.computer.uuid != inputs['code'].computer.uuid:
+                return "Remote dependency '{}' is on computer {}, but the code is on {}.".format(
+                    label, node.computer.label, inputs['code'].computer.label)
+    if 'geofile' in inputs:
+        try:
+            resolve_dependencies(inputs['geofile'], dependencies)
+        except ValueError as exc:
+            return str(exc)
+    return None
 
 
 class GmshCalculation(CalcJob):
@@ -17,17 +131,73 @@ class GmshCalculation(CalcJob):
     AiiDA calculation plugin wrapping the gmsh executable.
 
     Simple AiiDA plugin wrapper for generating a .msh file from a .geo file.
+
+    An existing mesh (``parent_mesh``) is merged after the geofile (if any), such that optimization
+    (``optimize``, ``optimize_netgen``, ``optimize_ho``) or refinement (``refine``) of a previous result
+    does not regenerate the mesh. Since gmsh only applies the optimization options of the command line while
+    meshing, the parent is merged and optimized by a generated script (``_PARENT_SCRIPT``), which is processed
+    without meshing. A remote parent mesh, e.g. the ``remote_mesh`` output of a calculation with
+    the ``keep_remote`` option, is symlinked and not transferred.
     """
 
+    _PARENT_FOLDER = 'parent'
+    _PARENT_SCRIPT = '_aiida_parent.geo'
+
     @classmethod
     def define(cls, spec):
         """Define inputs and outputs of the calculation."""
         # yapf: disable
+        # data types are loaded when the spec is built (not on import of this module)
+        GmshParameters = DataFactory('gmsh')
+        GmshMeshData = DataFactory('gmsh.mesh')
         super().define(spec)
-        spec.input('geofile', valid_type=SinglefileData, help='The .geo file to process.')
+        spec.input('geofile', valid_type=SinglefileData, required=False,
+            help='The .geo file to process (optional if a parent_mesh is given).')
+        spec.input('parent_mesh', valid_type=(SinglefileData, RemoteData), required=False,
+            help='Existing mesh merged after the geofile, e.g. to optimize or refine it without regenerating it. '
+            'A RemoteData has to point to the mesh file on the computer of the code.')
         spec.input('parameters', valid_type=GmshParameters, help='Command line parameters for gmsh')
+        spec.input_namespace('dependencies', valid_type=(SinglefileData, RemoteData), dynamic=True, required=False,
+            help='Files referenced by Include, Merge and ShapeFromFile statements of the geofile. RemoteData '
+            'have to point to a file on the computer of the code, which is symlinked into the working directory.')
         spec.input('metadata.options.output_filename', valid_type=str, default='mesh.msh')
-        spec.output('mshfile', valid_type=SinglefileData, required=True, help='The output file containing the generated mesh.')
+        spec.input('metadata.options.copy_remote_dependencies', valid_type=bool, default=False,
+            help='Copy RemoteData dependencies (and a remote parent_mesh) into the working directory instead of '
+            'symlinking them.')
+        spec.input('metadata.options.log_filename', valid_type=str, default='gmsh.log',
+            help='File to which the log of gmsh (stdout and stderr) is written.')
+        spec.input('metadata.options.gmsh_version', valid_type=str, required=False,
+            help='Version of the gmsh executable. Part of the hash, such that cached meshes are not reused across versions.')
+        spec.input('metadata.options.parse_mesh', valid_type=bool, default=False,
+            help='Parse the generated .msh file into a GmshMeshData node (a second copy of the mesh, which is '
+            'read into the memory of the daemon). By default, only the metadata of the mesh is stored.')
+        spec.input('metadata.options.compute_quality', valid_type=bool, default=False,
+            help='Compute element quality statistics (SICN, gamma, aspect ratio) of triangles and tetrahedra.')
+        spec.input('metadata.options.compression', valid_type=str, required=False, validator=validate_compression,
+            help='Compress the output file on the remote computer before retrieval (gzip or zstd).')
+        spec.input('metadata.options.retrieve_temporary', valid_type=bool, default=False,
+            help='Retrieve the output file to a temporary folder instead of the retrieved folder, such that the '
+            'mesh is stored only once (in the mshfile output).')
+        spec.input('metadata.options.keep_remote', valid_type=bool, default=False,
+            help='Leave the mesh in the remote working directory (remote_mesh output) and only retrieve its header, '
+            'size and checksum (mesh_stats output). The mesh is lost when the working directory is cleaned.')
+        spec.input('metadata.options.header_bytes', valid_type=int, default=1024 * 1024,
+            help='Number of bytes of the mesh retrieved as header with the keep_remote option.')
+        spec.inputs.validator = validate_inputs
+        spec.output('mshfile', valid_type=SinglefileData, required=False,
+            help='The output file containing the generated mesh (not written for meshes split into partitions).')
+        spec.output_namespace('partitions', valid_type=SinglefileData, dynamic=True, required=False,
+            help='One file per partition (``part_split`` option), labelled ``partition_<n>``.')
+        spec.output('partition_counts', valid_type=Dict, required=False,
+            help='Number of nodes and elements of each partition of a partitioned mesh.')
+        spec.output('remote_mesh', valid_type=RemoteData, required=False,
+            help='The mesh in the remote working directory (keep_remote option).')
+        spec.output('mesh_stats', valid_type=Dict, required=False,
+            help='Format, size, checksum, node and element counts and physical groups of the remote mesh.')
+        spec.output('mesh', valid_type=GmshMeshData, required=False, help='Nodes, elements and physical groups of the mesh.')
+        spec.output('quality', valid_type=Dict, required=False, help='Element quality statistics of the mesh.')
+        spec.output('timings', valid_type=Dict, required=False,
+            help='Wall and CPU time of the meshing stages and peak memory usage reported in the log of gmsh.')
 
         # set default values for AiiDA options
         spec.inputs['metadata']['options']['resources'].default = {
@@ -45,6 +215,8 @@ class GmshCalculation(CalcJob):
 
         # TODO gmsh exit codes
         spec.exit_code(300, 'ERROR_MISSING_OUTPUT_FILES', message='Calculation did not produce all expected output files.')
+        spec.exit_code(310, 'ERROR_INVALID_MESH', message='The output file is not a valid MSH 4.1 file (ASCII or binary).')
+        spec.exit_code(320, 'ERROR_ABORTED_BY_MONITOR', message='The calculation was aborted by the monitor: {reason}.')
 
 
     def prepare_for_submission(self, folder):
@@ -55,24 +227,242 @@ class GmshCalculation(CalcJob):
             needed by the calculation.
         :return: `aiida.common.datastructures.CalcInfo` instance
         """
+        geofile = self.inputs.get('geofile')
+        parent_mesh = self.inputs.get('parent_mesh')
+        parent_path = None
+        if parent_mesh is not None:
+            # the parent is kept in a subfolder, such that it is not overwritten by the output file
+            if isinstance(parent_mesh, RemoteData):
+                parent_filename = posixpath.basename(parent_mesh.get_remote_path())
+            else:
+                parent_filename = parent_mesh.filename
+            parent_path = posixpath.join(self._PARENT_FOLDER, parent_filename)
+            folder.get_subfolder(self._PARENT_FOLDER, create=True)
+
+        merged = parent_path
+        if parent_mesh is not None and not self.inputs.parameters.get_dict().get('refine'):
+            script = self.inputs.parameters.parent_mesh_script(parent_path)
+            folder.create_file_from_filelike(io.StringIO(script), self._PARENT_SCRIPT, mode='w')
+            merged = self._PARENT_SCRIPT
+
         codeinfo = datastructures.CodeInfo()
         codeinfo.cmdline_params = self.inputs.parameters.cmdline_params(
-            geofile=self.inputs.geofile.filename
+            geofile=geofile.filename if geofile is not None else None,
+            output_filename=self.metadata.options.output_filename,
+            parent_mesh=merged,
         )
-        codeinfo.code_uuid = self.inputs.code.uuid
-        # TODO have to use other than stdout ouptut???
 
-        # FIXME gmsh does not write contents of .msh to stdout
-        # however, if commented out 'mesh.msh' is not retrieved by the Parser
-        # codeinfo.stdout_name = self.metadata.options.output_filename
+        # use all cores allocated per MPI process, unless the number of threads is set explicitly
+        threads = self.inputs.parameters.get_dict().get('nt')
+        if threads is None:
+            threads = self.inputs.metadata.options.resources.get('num_cores_per_mpiproc')
+            if threads is not None:
+                codeinfo.cmdline_params += ['-nt', str(threads)]
+
+        codeinfo.code_uuid = self.inputs.code.uuid
+        # the log of gmsh (including errors) is parsed for timings
+        codeinfo.stdout_name = self.metadata.options.log_filename
+        codeinfo.join_files = True
         codeinfo.withmpi = self.inputs.metadata.options.withmpi
 
         # Prepare a `CalcInfo` to be returned to the engine
         calcinfo = datastructures.CalcInfo()
         calcinfo.codes_info = [codeinfo]
-        calcinfo.local_copy_list = [
-            (self.inputs.geofile.uuid, self.inputs.geofile.filename, self.inputs.geofile.filename),
+        if threads is not None:
+            calcinfo.prepend_text = 'export OMP_NUM_THREADS={}'.format(threads)
+        calcinfo.local_copy_list = []
+        if geofile is not None:
+            calcinfo.local_copy_list.append((geofile.uuid, geofile.filename, geofile.filename))
+
+        remote_list = []
+        if isinstance(parent_mesh, RemoteData):
+            remote_list.append((parent_mesh.computer.uuid, parent_mesh.get_remote_path(), parent_path))
+        elif parent_mesh is not None:
+            calcinfo.local_copy_list.append((parent_mesh.uuid, parent_mesh.filename, parent_path))
+
+        # dependencies are placed at the paths with which the geofile references them
+        dependencies = self.inputs.get('dependencies', {})
+        if geofile is not None:
+            paths = resolve_dependencies(geofile, dependencies)
+        else:
+            paths = {label: get_dependency_filename(node) for label, node in dependencies.items()}
+        for label, path in paths.items():
+            node = dependencies[label]
+            if posixpath.dirname(path):
+                folder.get_subfolder(posixpath.dirname(path), create=True)
+            if isinstance(node, RemoteData):
+                remote_list.append((node.computer.uuid, node.get_remote_path(), path))
+            else:
+                calcinfo.local_copy_list.append((node.uuid, node.filename, path))
+        if self.inputs.metadata.options.copy_remote_dependencies:
+            calcinfo.remote_copy_list = remote_list
+        else:
+            calcinfo.remote_symlink_list = remote_list
+        output_filename = self.metadata.options.output_filename
+        if self.inputs.parameters.get_dict().get('part_split'):
+            # gmsh writes one file per partition instead of the output file
+            output_filename = get_partition_pattern(output_filename)
+        calcinfo.retrieve_list = [output_filename]
+
+        compression = self.inputs.metadata.options.get('compression')
+        if compression is not None:
+            calcinfo.append_text = COMPRESSION_COMMANDS[compression].format(filename=output_filename)
+            calcinfo.retrieve_list = [output_filename + suffix for suffix in COMPRESSION_SUFFIXES[compression]]
+
+        if self.inputs.metadata.options.keep_remote:
+            calcinfo.append_text = KEEP_REMOTE_COMMANDS.format(
+                filename=output_filename, header_bytes=self.inputs.metadata.options.header_bytes)
+            calcinfo.retrieve_list = [output_filename + '.header', output_filename + '.stats']
+
+        if self.inputs.metadata.options.retrieve_temporary:
+            calcinfo.retrieve_temporary_list = calcinfo.retrieve_list
+            calcinfo.retrieve_list = []
+        calcinfo.retrieve_list.append(self.metadata.options.log_filename)
+        # written by the monitor (verdi data gmsh monitor) when it aborts the calculation
+        calcinfo.retrieve_list.append(ABORT_FILENAME)
+
+        return calcinfo
+
+
+# Runs the gmsh executable once per item, with at most NPROC processes at a time.
+# Each item directory contains the command line (one argument per line, the geofile relative to the
+# item directory); the exit status of gmsh is written to the file 'exit_status'.
+BATCH_SCRIPT = """#!/bin/bash
+# usage: {script} GMSH NPROC
+GMSH="$1"
+case "$GMSH" in
+    /*) ;;
+    */*) GMSH="$PWD/$GMSH" ;;
+esac
+export GMSH
+
+run_item() {{
+    cd "{items}/$1" || exit 0
+    mapfile -t args < cmdline
+    "$GMSH" "${{args[@]}}" > gmsh.log 2>&1
+    echo $? > exit_status
+}}
+export -f run_item
+
+ls {items} | xargs -P "$2" -I{{}} bash -c 'run_item "$1"' _ {{}}
+"""
+
+
+def validate_batch_inputs(inputs, ctx):
+    """Validate that a single machine is requested and that parameters are specified for every geofile."""
+    error = validate_calc_job(inputs, ctx)
+    if error:
+        return error
+    geofiles = inputs.get('geofiles', {})
+    item_parameters = inputs.get('item_parameters', {})
+
+    # the gmsh processes are started by the batch script, i.e. on the first machine only
+    num_machines = inputs.get('metadata', {}).get('options', {}).get('resources', {}).get('num_machines', 1)
+    if num_machines != 1:
+        return 'The items are meshed on a single machine, but num_machines is {}.'.format(num_machines)
+    if not geofiles:
+        return 'At least one geofile is required.'
+    unknown = set(item_parameters) - set(geofiles)
+    if unknown:
+        return 'item_parameters specified for unknown items: {}'.format(', '.join(sorted(unknown)))
+    if 'parameters' not in inputs:
+        missing = set(geofiles) - set(item_parameters)
+        if missing:
+            return 'No parameters specified for items: {}'.format(', '.join(sorted(missing)))
+    return None
+
+
+class GmshBatchCalculation(CalcJob):
+    """
+    AiiDA calculation plugin meshing many geometries in a single scheduler job.
+
+    The items of the ``geofiles`` namespace are meshed by independent gmsh processes running
+    concurrently on a single machine ('num_machines' must be 1). Failed items do not affect the others:
+    the exit status of every item is reported in the ``exit_statuses`` output.
+    """
+
+    _ITEMS_FOLDER = 'items'
+    _GEOFILES_FOLDER = 'geofiles'
+    _BATCH_SCRIPT = 'batch.sh'
+    _VERSION_FILENAME = 'gmsh_version.txt'
+
+    @classmethod
+    def define(cls, spec):
+        """Define inputs and outputs of the calculation."""
+        # yapf: disable
+        GmshParameters = DataFactory('gmsh')
+        super().define(spec)
+        spec.input_namespace('geofiles', valid_type=SinglefileData, dynamic=True,
+            help='The .geo files to process, keys are used to label the outputs.')
+        spec.input('parameters', valid_type=GmshParameters, required=False,
+            help='Command line parameters for gmsh shared by all items.')
+        spec.input_namespace('item_parameters', valid_type=GmshParameters, dynamic=True, required=False,
+            help='Command line parameters for individual items, overriding the shared parameters.')
+        spec.input('metadata.options.output_filename', valid_type=str, default='mesh.msh')
+        spec.input('metadata.options.max_concurrent', valid_type=int, required=False,
+            help='Maximum number of concurrent gmsh processes (defaults to the number of MPI processes per machine).')
+        spec.inputs.validator = validate_batch_inputs
+        spec.output_namespace('mshfiles', valid_type=SinglefileData, dynamic=True,
+            help='The generated meshes of all items which succeeded.')
+        spec.output('exit_statuses', valid_type=Dict, help='Exit status of gmsh for each item (None if it did not run).')
+
+        spec.inputs['metadata']['options']['resources'].default = {
+            'num_machines': 1,
+            'num_mpiprocs_per_machine': 1,
+        }
+        spec.inputs['metadata']['options']['parser_name'].default = 'gmsh.batch'
+
+        spec.exit_code(300, 'ERROR_MISSING_OUTPUT_FILES', message='Calculation did not produce all expected output files.')
+        spec.exit_code(320, 'ERROR_ALL_ITEMS_FAILED', message='Meshing failed for all items.')
+
+    def prepare_for_submission(self, folder):
+        """
+        Create input files.
+
+        :param folder: an `aiida.common.folders.Folder` where the plugin should temporarily place all files
+            needed by the calculation.
+        :return: `aiida.common.datastructures.CalcInfo` instance
+        """
+        output_filename = self.metadata.options.output_filename
+        item_parameters = self.inputs.get('item_parameters', {})
+
+        # every geofile is uploaded once, even if it is shared by several items (e.g. in a parameter sweep)
+        local_copy_list = []
+        geofile_paths = {}
+        for key, geofile in self.inputs.geofiles.items():
+            if geofile.uuid not in geofile_paths:
+                geofile_paths[geofile.uuid] = '{}/{}/{}'.format(self._GEOFILES_FOLDER, geofile.uuid, geofile.filename)
+                local_copy_list.append((geofile.uuid, geofile.filename, geofile_paths[geofile.uuid]))
+
+            parameters = item_parameters.get(key, self.inputs.get('parameters'))
+            cmdline_params = parameters.cmdline_params(
+                geofile='../../{}'.format(geofile_paths[geofile.uuid]), output_filename=output_filename)
+            item_folder = folder.get_subfolder('{}/{}'.format(self._ITEMS_FOLDER, key), create=True)
+            item_folder.create_file_from_filelike(io.StringIO('\n'.join(cmdline_params) + '\n'), 'cmdline', mode='w')
+
+        script = BATCH_SCRIPT.format(script=self._BATCH_SCRIPT, items=self._ITEMS_FOLDER)
+        folder.create_file_from_filelike(io.StringIO(script), self._BATCH_SCRIPT, mode='w')
+
+        max_concurrent = self.inputs.metadata.options.get('max_concurrent')
+        if max_concurrent is None:
+            max_concurrent = self.inputs.metadata.options.resources.get('num_mpiprocs_per_machine', 1)
+
+        # the code itself only reports its version, the items are meshed by the batch script
+        codeinfo = datastructures.CodeInfo()
+        codeinfo.cmdline_params = ['-version']
+        codeinfo.code_uuid = self.inputs.code.uuid
+        codeinfo.stdout_name = self._VERSION_FILENAME
+        codeinfo.join_files = True  # gmsh prints its version to stderr
+        codeinfo.withmpi = False
+
+        calcinfo = datastructures.CalcInfo()
+        calcinfo.codes_info = [codeinfo]
+        calcinfo.append_text = 'bash {} {} {}'.format(self._BATCH_SCRIPT, self.inputs.code.get_execname(), max_concurrent)
+        calcinfo.local_copy_list = local_copy_list
+        calcinfo.retrieve_list = [
+            self._VERSION_FILENAME,
+            ('{}/*/{}'.format(self._ITEMS_FOLDER, output_filename), '.', 2),
+            ('{}/*/exit_status'.format(self._ITEMS_FOLDER), '.', 2),
         ]
-        calcinfo.retrieve_list = [self.metadata.options.output_filename]
 
         return calcinfo
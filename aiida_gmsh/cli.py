@@ -7,37 +7,89 @@ directly into the 'verdi' command by using AiiDA-specific entry points like
 "aiida.cmdline.data" (both in the setup.json file).
 """
 
+import contextlib
 import sys
 import click
 from aiida.cmdline.utils import decorators
-from aiida.cmdline.commands.cmd_data import verdi_data
-from aiida.cmdline.params.types import DataParamType
-from aiida.orm import QueryBuilder
+from aiida.cmdline.params.types import CodeParamType, DataParamType, GroupParamType
 from aiida.plugins import DataFactory
 
 
 # See aiida.cmdline.data entry point in setup.json
-@verdi_data.group('gmsh')
+# 'verdi data' loads the group via the entry point, importing the verdi command tree here is not needed
+# (and slows down every invocation of 'verdi')
+@click.group('gmsh')
 def data_cli():
     """Command line interface for aiida-gmsh"""
 
+def parse_attribute_filter(ctx, param, values):  # pylint: disable=unused-argument
+    """Parse KEY=VALUE attribute filters, values are interpreted as JSON if possible."""
+    import json
+
+    filters = {}
+    for value in values:
+        key, sep, string = value.partition('=')
+        if not sep or not key:
+            raise click.BadParameter("'{}' is not of the form KEY=VALUE".format(value))
+        try:
+            filters['attributes.{}'.format(key)] = json.loads(string)
+        except ValueError:
+            filters['attributes.{}'.format(key)] = string
+    return filters
+
+
 @data_cli.command('list')
+@click.option('--limit', '-l', type=click.IntRange(min=0), help='Display at most this number of nodes.')
+@click.option('--offset', type=click.IntRange(min=0), default=0, show_default=True, help='Skip this number of nodes.')
+@click.option('--dim', type=click.Choice(['1', '2', '3']), help='Only display parameters of meshes of this dimension.')
+@click.option('--filter', '-f', 'attributes', multiple=True, callback=parse_attribute_filter,
+              help='Only display parameters with attribute KEY equal to VALUE (KEY=VALUE, e.g. order=2).')
+@click.option('--format', '-F', 'fmt', type=click.Choice(['table', 'json', 'csv']), default='table', show_default=True,
+              help='Output format.')
 @decorators.with_dbenv()
-def list_():  # pylint: disable=redefined-builtin
+def list_(limit, offset, dim, attributes, fmt):  # pylint: disable=redefined-builtin
     """
     Display all GmshParameters nodes
+
+    Only the columns needed are queried and rows are written while the results are streamed from the database.
     """
+    import csv
+    import json
+    from aiida.orm import QueryBuilder
+
     GmshParameters = DataFactory('gmsh')
 
+    filters = dict(attributes)
+    if dim is not None:
+        filters['attributes.{}'.format(dim)] = True
+
     qb = QueryBuilder()
-    qb.append(GmshParameters)
-    results = qb.all()
+    qb.append(GmshParameters, filters=filters, project=['id', 'uuid', 'ctime', 'attributes'], tag='parameters')
+    qb.order_by({'parameters': {'id': 'asc'}})
+    qb.offset(offset)
+    if limit is not None:
+        qb.limit(limit)
 
-    s = ''
-    for result in results:
-        obj = result[0]
-        s += '{}, pk: {}\n'.format(str(obj), obj.pk)
-    sys.stdout.write(s)
+    writer = csv.writer(sys.stdout) if fmt == 'csv' else None
+    if fmt == 'table':
+        sys.stdout.write('{:<8} {:<36} {:<19} {}\n'.format('PK', 'UUID', 'Created', 'Parameters'))
+    elif fmt == 'csv':
+        writer.writerow(['pk', 'uuid', 'ctime', 'parameters'])
+    elif fmt == 'json':
+        sys.stdout.write('[')
+
+    for index, (pk, uuid, ctime, attrs) in enumerate(qb.iterall(batch_size=1000)):
+        if fmt == 'table':
+            sys.stdout.write('{:<8} {:<36} {:<19} {}\n'.format(pk, uuid, ctime.strftime('%Y-%m-%d %H:%M:%S'),
+                                                               json.dumps(attrs, sort_keys=True)))
+        elif fmt == 'csv':
+            writer.writerow([pk, uuid, ctime.isoformat(), json.dumps(attrs, sort_keys=True)])
+        else:
+            row = {'pk': pk, 'uuid': uuid, 'ctime': ctime.isoformat(), 'parameters': attrs}
+            sys.stdout.write('{}\n  {}'.format(',' if index else '', json.dumps(row, sort_keys=True)))
+
+    if fmt == 'json':
+        sys.stdout.write('\n]\n')
 
 
 @data_cli.command('export')
@@ -56,3 +108,377 @@ def export(node, outfile):
             f.write(string)
     else:
         click.echo(string)
+
+
+@data_cli.command('bulk-export')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--group', '-G', type=GroupParamType(), help='Only export calculations in this group.')
+@click.option('--pk', 'pks', type=click.INT, multiple=True, help='Only export the calculation with this pk (repeatable).')
+@click.option('--dim', type=click.Choice(['1', '2', '3']), help='Only export meshes of this dimension.')
+@click.option('--filter', '-f', 'attributes', multiple=True, callback=parse_attribute_filter,
+              help='Only export meshes whose parameters have attribute KEY equal to VALUE (KEY=VALUE).')
+@click.option('--compression', type=click.Choice(['gzip', 'zstd']), help='Compress the exported meshes.')
+@click.option('--convert', metavar='EXTENSION', help='Convert the meshes with meshio to the format of this file extension, '
+              'e.g. vtu.')
+@click.option('--workers', '-j', type=click.IntRange(min=1), default=4, show_default=True, help='Number of threads.')
+@decorators.with_dbenv()
+def bulk_export(directory, group, pks, dim, attributes, compression, convert, workers):
+    """
+    Export the meshes of GmshCalculation nodes and their parameters to DIRECTORY
+
+    Each mesh is written to DIRECTORY/<pk>/ together with its parameters (parameters.json).
+    A manifest (DIRECTORY/manifest.json) lists all exported files with size and SHA-256 checksum.
+    """
+    from aiida_gmsh.export import bulk_export as export_meshes, get_export_items
+
+    filters = dict(attributes)
+    if dim is not None:
+        filters['attributes.{}'.format(dim)] = True
+
+    items = get_export_items(group=group, pks=pks, filters=filters)
+    manifest = export_meshes(items, directory, compression=compression, convert=convert, max_workers=workers)
+
+    failed = [entry for entry in manifest['items'] if 'error' in entry]
+    for entry in failed:
+        click.echo('pk: {}, error: {}'.format(entry['pk'], entry['error']), err=True)
+    click.echo('Exported {} of {} meshes to {}.'.format(len(items) - len(failed), len(items), directory))
+    if failed:
+        sys.exit(1)
+
+
+def get_mesh_filters(dim=None, min_nodes=None, max_nodes=None, min_elements=None, max_elements=None,
+                     element_types=(), physical_names=()):
+    """Return QueryBuilder filters on the metadata attribute of mesh files (see ``aiida_gmsh.msh.read_metadata``)."""
+    from aiida_gmsh.msh import METADATA_ATTRIBUTE
+
+    prefix = 'attributes.{}.'.format(METADATA_ATTRIBUTE)
+    filters = {'attributes': {'has_key': METADATA_ATTRIBUTE}}
+    if dim is not None:
+        filters[prefix + 'dimension'] = int(dim)
+    for key, lower, upper in (('num_nodes', min_nodes, max_nodes), ('num_elements', min_elements, max_elements)):
+        bounds = []
+        if lower is not None:
+            bounds.append({'>=': lower})
+        if upper is not None:
+            bounds.append({'<=': upper})
+        if bounds:
+            filters[prefix + key] = {'and': bounds}
+    if element_types:
+        filters[prefix + 'num_elements_per_type'] = {
+            'and': [{'has_key': str(element_type)} for element_type in element_types]
+        }
+    if physical_names:
+        filters[prefix + 'physical_names'] = {'contains': list(physical_names)}
+    return filters
+
+
+@data_cli.command('meshes')
+@click.option('--dim', type=click.Choice(['1', '2', '3']), help='Only display meshes of this dimension.')
+@click.option('--min-nodes', type=click.IntRange(min=0), help='Only display meshes with at least this number of nodes.')
+@click.option('--max-nodes', type=click.IntRange(min=0), help='Only display meshes with at most this number of nodes.')
+@click.option('--min-elements', type=click.IntRange(min=0),
+              help='Only display meshes with at least this number of elements.')
+@click.option('--max-elements', type=click.IntRange(min=0),
+              help='Only display meshes with at most this number of elements.')
+@click.option('--element-type', '-t', 'element_types', type=click.INT, multiple=True,
+              help='Only display meshes containing elements of this gmsh element type, e.g. 4 for tetrahedra (repeatable).')
+@click.option('--physical', '-P', 'physical_names', multiple=True,
+              help='Only display meshes with a physical group of this name (repeatable).')
+@click.option('--limit', '-l', type=click.IntRange(min=0), help='Display at most this number of meshes.')
+@click.option('--format', '-F', 'fmt', type=click.Choice(['table', 'json']), default='table', show_default=True,
+              help='Output format.')
+@decorators.with_dbenv()
+def meshes(dim, min_nodes, max_nodes, min_elements, max_elements, element_types, physical_names, limit, fmt):
+    """
+    Display mesh files matching the given metadata
+
+    The metadata (dimension, node and element counts, bounding box, physical groups) is stored as attributes of
+    the mesh files by GmshCalculation, such that the query is answered from the database alone, e.g.::
+
+        verdi data gmsh meshes --dim 3 --min-elements 5000000 --physical inlet
+    """
+    import json
+    from aiida.orm import QueryBuilder, SinglefileData
+    from aiida_gmsh.msh import METADATA_ATTRIBUTE
+
+    filters = get_mesh_filters(dim, min_nodes, max_nodes, min_elements, max_elements, element_types, physical_names)
+    qb = QueryBuilder()
+    qb.append(SinglefileData, filters=filters, tag='mshfile',
+              project=['id', 'uuid', 'attributes.filename', 'attributes.{}'.format(METADATA_ATTRIBUTE)])
+    qb.order_by({'mshfile': {'id': 'asc'}})
+    if limit is not None:
+        qb.limit(limit)
+
+    if fmt == 'table':
+        sys.stdout.write('{:<8} {:<16} {:<4} {:>12} {:>12}  {}\n'.format(
+            'PK', 'Filename', 'Dim', 'Nodes', 'Elements', 'Physical groups'))
+    rows = []
+    for pk, uuid, filename, metadata in qb.iterall(batch_size=1000):
+        if fmt == 'table':
+            sys.stdout.write('{:<8} {:<16} {:<4} {:>12} {:>12}  {}\n'.format(
+                pk, filename, metadata['dimension'] if metadata['dimension'] is not None else '-',
+                metadata['num_nodes'], metadata['num_elements'], ', '.join(metadata['physical_names'])))
+        else:
+            rows.append({'pk': pk, 'uuid': uuid, 'filename': filename, 'metadata': metadata})
+    if fmt == 'json':
+        click.echo(json.dumps(rows, indent=2, sort_keys=True))
+
+
+def parse_grid(ctx, param, value):  # pylint: disable=unused-argument
+    """Parse a grid of command line options given as JSON string or as path of a JSON file."""
+    import json
+    import os
+
+    if value is None:
+        return None
+    try:
+        if os.path.isfile(value):
+            with open(value) as handle:
+                return json.load(handle)
+        return json.loads(value)
+    except ValueError as exc:
+        raise click.BadParameter('invalid JSON: {}'.format(exc))
+
+
+def parse_options(ctx, param, value):
+    """Parse ``metadata.options`` given as JSON string or as path of a JSON file."""
+    options = parse_grid(ctx, param, value)
+    if options is not None and not isinstance(options, dict):
+        raise click.BadParameter('expected a JSON object, got: {}'.format(value))
+    return options
+
+
+def _format_progress(progress):
+    """Format a ``SweepProgress`` as a single line."""
+    import datetime
+
+    eta = str(datetime.timedelta(seconds=round(progress.eta))) if progress.eta is not None else '-'
+    return '{}/{} submitted, {} running, {} finished, {} failed, {:.2f} jobs/min, ETA {}'.format(
+        progress.submitted, progress.total, progress.running, progress.finished, progress.failed, progress.rate * 60,
+        eta)
+
+
+@data_cli.command('submit-sweep')
+@click.option('--directory', '-d', type=click.Path(exists=True, file_okay=False),
+              help='Submit all .geo files in this directory.')
+@click.option('--group', '-G', type=GroupParamType(), help='Submit all SinglefileData nodes in this group.')
+@click.option('--code', '-X', type=CodeParamType(), required=True, help='The gmsh code.')
+@click.option('--parameters', '-p', type=DataParamType(sub_classes=('aiida.data:gmsh',)),
+              help='GmshParameters shared by all calculations (default: no options).')
+@click.option('--grid', callback=parse_grid, metavar='JSON',
+              help='Lists of values of the command line options to sweep, as JSON string or file, '
+              'e.g. \'{"clscale": [1, 0.5]}\'.')
+@click.option('--options', callback=parse_options, metavar='JSON',
+              help='Options of the calculations (metadata.options), as JSON string or file, e.g. '
+              '\'{"max_wallclock_seconds": 3600, "queue_name": "short", "account": "project"}\'.')
+@click.option('--journal', type=click.Path(dir_okay=False), default='sweep.jsonl', show_default=True,
+              help='Journal of the submissions, used to resume an interrupted sweep.')
+@click.option('--max-in-flight', '-n', type=click.IntRange(min=1), default=50, show_default=True,
+              help='Maximum number of calculations which are submitted but not terminated.')
+@click.option('--poll-interval', type=click.FLOAT, default=10., show_default=True,
+              help='Seconds between polls of the states of the calculations.')
+@click.option('--retry-failed', is_flag=True, help='Resubmit calculations which failed in a previous run.')
+@click.option('--add-to-group', type=GroupParamType(create_if_not_exist=True),
+              help='Add the submitted calculations to this group.')
+@decorators.with_dbenv()
+def submit_sweep(directory, group, code, parameters, grid, options, journal, max_in_flight, poll_interval,
+                 retry_failed, add_to_group):
+    """
+    Submit a GmshCalculation for every geofile and point of the parameter grid
+
+    At most --max-in-flight calculations are running at a time, new calculations are submitted as others
+    terminate. Run the same command again to resume an interrupted sweep: calculations recorded in the
+    journal are not submitted again. The geofiles of --directory are stored once and shared by all their
+    calculations. Requires a running daemon.
+    """
+    import functools
+    import glob
+    import os
+    from aiida.orm import QueryBuilder, SinglefileData
+    from aiida_gmsh.sweep import get_sweep_items, run_sweep, store_geofiles, submit_calculation
+
+    if (directory is None) == (group is None):
+        raise click.UsageError('Specify exactly one of --directory and --group.')
+
+    if directory is not None:
+        paths = {os.path.basename(path): path for path in glob.glob(os.path.join(directory, '*.geo'))}
+        geofiles = store_geofiles(paths)
+    else:
+        qb = QueryBuilder()
+        qb.append(type(group), filters={'id': group.pk}, tag='group')
+        qb.append(SinglefileData, with_group='group', project=['uuid', '*'])
+        geofiles = dict(qb.all())
+
+    if parameters is None:
+        parameters = DataFactory('gmsh')(dict={})
+    items = get_sweep_items(geofiles, parameters, grid)
+    if not items:
+        click.echo('No geofiles found.')
+        return
+
+    def report(progress):
+        if sys.stdout.isatty():
+            click.echo('\r' + _format_progress(progress), nl=False)
+        else:
+            click.echo(_format_progress(progress))
+
+    submit = functools.partial(submit_calculation, code=code, options=options, group=add_to_group)
+    try:
+        progress = run_sweep(items, submit, journal, max_in_flight=max_in_flight, poll_interval=poll_interval,
+                             retry_failed=retry_failed, report=report)
+    except KeyboardInterrupt:
+        click.echo('\nInterrupted, run the same command again to resume the sweep.')
+        sys.exit(130)
+
+    if sys.stdout.isatty():
+        click.echo()
+    click.echo('Sweep done: {} finished, {} failed.'.format(progress.finished, progress.failed))
+    if progress.failed:
+        sys.exit(1)
+
+
+@data_cli.command('monitor')
+@click.argument('pks', metavar='[PK]...', type=click.INT, nargs=-1)
+@click.option('--stall-minutes', type=click.FLOAT, help='Abort calculations whose log did not grow for this time.')
+@click.option('--max-elements', type=click.IntRange(min=1), help='Abort calculations exceeding this number of elements.')
+@click.option('--max-memory', type=click.FLOAT, metavar='MB',
+              help='Abort calculations using more memory (requires the cpu option of GmshParameters).')
+@click.option('--interval', type=click.FLOAT, default=60., show_default=True, help='Seconds between polls.')
+@decorators.with_dbenv()
+def monitor(pks, stall_minutes, max_elements, max_memory, interval):
+    """
+    Monitor running GmshCalculations and abort them if they stall or grow too large
+
+    The log of gmsh is tailed through the transport to report the current stage, the number of elements and
+    the memory usage. Calculations violating one of the rules are killed and fail with exit status 320
+    (ERROR_ABORTED_BY_MONITOR). Monitors the given calculations or all active GmshCalculations.
+    """
+    from aiida.orm import CalcJobNode, QueryBuilder, load_node
+    from aiida_gmsh.caching import PROCESS_TYPE
+    from aiida_gmsh.monitor import MonitorRules, monitor as monitor_calculations
+
+    if stall_minutes is None and max_elements is None and max_memory is None:
+        raise click.UsageError('Specify at least one of --stall-minutes, --max-elements and --max-memory.')
+    rules = MonitorRules(stall_seconds=stall_minutes * 60 if stall_minutes is not None else None,
+                         max_elements=max_elements, max_memory_mb=max_memory)
+
+    if pks:
+        nodes = [load_node(pk) for pk in pks]
+    else:
+        qb = QueryBuilder()
+        qb.append(CalcJobNode,
+                  filters={
+                      'process_type': PROCESS_TYPE,
+                      'attributes.process_state': {
+                          'in': ['created', 'waiting', 'running']
+                      }
+                  })
+        nodes = [node for node, in qb.iterall()]
+    if not nodes:
+        click.echo('No active calculations.')
+        return
+
+    def report(monitor_):
+        progress = monitor_.progress
+        click.echo('pk: {}, stage: {}, nodes: {}, elements: {}, memory: {} Mb, idle: {:.0f} s{}'.format(
+            monitor_.node.pk, progress.stage, progress.num_nodes, progress.num_elements, progress.peak_memory_mb,
+            monitor_.idle_seconds, ', aborted: {}'.format(monitor_.reason) if monitor_.reason else ''))
+
+    monitors = monitor_calculations(nodes, rules, interval=interval, report=report)
+    aborted = [monitor_ for monitor_ in monitors if monitor_.reason is not None]
+    click.echo('All calculations terminated, {} aborted.'.format(len(aborted)))
+
+
+@contextlib.contextmanager
+def _open_mesh(identifier):
+    """Open a mesh given by a file path or by the identifier of a SinglefileData or GmshCalculation node."""
+    import os
+    from aiida.common import exceptions
+    from aiida.orm import CalcJobNode, load_node
+
+    if os.path.isfile(identifier):
+        with open(identifier, 'rb') as handle:
+            yield handle
+        return
+
+    try:
+        node = load_node(identifier)
+        if isinstance(node, CalcJobNode):
+            node = node.outputs.mshfile
+    except (exceptions.NotExistent, exceptions.MultipleObjectsError, AttributeError) as exc:
+        raise click.BadParameter("'{}' is neither a file nor a mesh node: {}".format(identifier, exc))
+    with node.open(mode='rb') as handle:
+        yield handle
+
+
+@data_cli.command('diff')
+@click.argument('first', metavar='MESH1')
+@click.argument('second', metavar='MESH2')
+@click.option('--tolerance', '-t', type=click.FLOAT, default=1e-8, show_default=True,
+              help='Absolute tolerance of the node coordinates.')
+@click.option('--fingerprint', 'show_fingerprints', is_flag=True, help='Print the fingerprints of both meshes (JSON).')
+@decorators.with_dbenv()
+def diff(first, second, tolerance, show_fingerprints):
+    """
+    Compare two meshes up to node and element renumbering
+
+    MESH1 and MESH2 are paths of MSH files or identifiers (PK, UUID) of SinglefileData or GmshCalculation nodes.
+    Node coordinates, connectivity and physical groups are compared. Exits with status 1 if the meshes differ.
+    The fingerprints (see --fingerprint) are exact keys of the meshes for deduplication, which may differ even
+    though the meshes are equal within the tolerance.
+    """
+    import json
+    from aiida_gmsh.compare import compare, fingerprint
+
+    if show_fingerprints:
+        fingerprints = []
+        for identifier in (first, second):
+            with _open_mesh(identifier) as handle:
+                fingerprints.append(fingerprint(handle, tolerance))
+        click.echo(json.dumps(fingerprints, indent=2))
+
+    with _open_mesh(first) as first_handle, _open_mesh(second) as second_handle:
+        differences = compare(first_handle, second_handle, tolerance)
+    for difference in differences:
+        click.echo(difference)
+    if differences:
+        sys.exit(1)
+    click.echo('Meshes are equal within a tolerance of {}.'.format(tolerance))
+
+
+@data_cli.group('cache')
+def cache():
+    """Inspect and purge the mesh cache of GmshCalculation."""
+
+
+@cache.command('list')
+@decorators.with_dbenv()
+def cache_list():
+    """
+    Display all GmshCalculation nodes which serve as cache source
+    """
+    from aiida_gmsh.caching import get_cache_entries
+
+    for entry in get_cache_entries():
+        click.echo('pk: {}, ctime: {}, hash: {}, hits: {}'.format(entry.pk, entry.ctime.strftime('%Y-%m-%d %H:%M:%S'),
+                                                                 entry.hash[:12], entry.hits))
+
+
+@cache.command('purge')
+@click.option('--max-age', type=click.FLOAT, help='Evict entries older than this number of days.')
+@click.option('--max-entries', type=click.INT, help='Keep at most this number of (most recent) entries.')
+@click.option('--all', 'everything', is_flag=True, help='Evict all entries.')
+@click.option('--dry-run', '-n', is_flag=True, help='Only show the entries that would be evicted.')
+@decorators.with_dbenv()
+def cache_purge(max_age, max_entries, everything, dry_run):
+    """
+    Evict entries from the mesh cache
+
+    Duplicate entries (same hash) are always evicted, keeping the most recent one.
+    """
+    from aiida_gmsh.caching import evict
+
+    evicted = evict(max_age_days=max_age, max_entries=max_entries, everything=everything, dry_run=dry_run)
+    for entry in evicted:
+        click.echo('pk: {}, hash: {}'.format(entry.pk, entry.hash[:12]))
+    click.echo('{} {} entries.'.format('Would evict' if dry_run else 'Evicted', len(evicted)))
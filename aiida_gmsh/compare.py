@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Tolerance-based comparison of meshes.
+
+:py:func:`compare` matches the nodes of two meshes by their coordinates: a node matches if all of its
+coordinates differ by at most the tolerance. To find the candidates, the nodes are hashed on grids with
+a spacing of four times the tolerance, offset by half the spacing in each direction. Two nodes within the
+tolerance share a cell of at least one of the eight grids, such that nodes are matched independently of where
+they lie relative to the cells. Elements are then compared by the matched indices of their nodes, and by
+their physical groups. Besides the element blocks being read, the memory needed is 48 bytes per node of
+each mesh (coordinates, tags and matches).
+
+Fingerprints identify meshes which are equal up to node and element renumbering, e.g. to deduplicate results.
+They are computed while streaming through the MSH file block by block
+(see :py:class:`aiida_gmsh.msh.MshReader`):
+
+ * every node is hashed from its coordinates, rounded to multiples of the tolerance, such that the
+   fingerprint does not depend on the node tags;
+ * every element is hashed from the hashes of its nodes (in the local order of the element) and its type;
+ * the hashes of all nodes and of the elements of each type are combined by a commutative sum, such that
+   the fingerprint does not depend on the order of nodes, elements and blocks in the file;
+ * physical groups are included by combining the hash of each element with the names of its physical groups
+   (or the tag for unnamed groups).
+
+Since coordinates are rounded, fingerprints are exact keys: nodes within the tolerance but on either side of a
+rounding boundary hash differently. Use :py:func:`compare` to compare meshes within the tolerance.
+The memory needed is bounded by the size of a single block and 24 bytes per node (tags and hashes).
+"""
+import itertools
+import hashlib
+import json
+
+import numpy as np
+
+from aiida_gmsh.msh import MshError, MshReader, read_nodes, tags_to_indices
+
+DEFAULT_TOLERANCE = 1e-8
+
+_GOLDEN = 0x9e3779b97f4a7c15
+
+
+def _mix(values):
+    """Finalizer of the splitmix64 generator, applied elementwise to an array of uint64."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xbf58476d1ce4e5b9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+
+def _hash_string(string):
+    """Hash a string to a uint64."""
+    return np.uint64(int.from_bytes(hashlib.blake2b(string.encode(), digest_size=8).digest(), 'little'))
+
+
+def _hash_columns(columns, salt):
+    """Combine the columns of a 2D array of uint64 row by row into a single hash per row."""
+    hashes = np.full(columns.shape[0], salt, dtype=np.uint64)
+    for column in range(columns.shape[1]):
+        hashes = _mix(hashes ^ (columns[:, column] + np.uint64(_GOLDEN * (column + 1) % 2**64)))
+    return hashes
+
+
+def hash_nodes(coordinates, tolerance=DEFAULT_TOLERANCE):
+    """Hash node coordinates rounded to multiples of ``tolerance``.
+
+    :param coordinates: float array of shape (num_nodes, 3)
+    :returns: uint64 array of shape (num_nodes,)
+    """
+    rounded = np.round(np.asarray(coordinates, dtype=np.float64) / tolerance).astype(np.int64)
+    return _hash_columns(rounded.view(np.uint64), np.uint64(0))
+
+
+def _physical_key(block, entities, physical_names):
+    """Return the hash of the names of all physical groups (or the tags of unnamed groups) of an element block."""
+    entity = entities.get((block.entity_dim, block.entity_tag))
+    physical_tags = (entity.physical_tags if entity else []) or [0]
+    return _hash_string('\0'.join(
+        sorted(physical_names[tag][1] if tag in physical_names else str(tag) for tag in physical_tags)))
+
+
+def _sum(hashes):
+    """Commutative combination of hashes (sum modulo 2**64)."""
+    return int(np.sum(hashes, dtype=np.uint64))
+
+
+def fingerprint(handle, tolerance=DEFAULT_TOLERANCE):
+    """Compute the fingerprint of a MSH 4.1 file (ASCII or binary).
+
+    :param handle: file handle opened in binary mode
+    :param tolerance: absolute tolerance of the node coordinates
+    :returns: dictionary with keys
+
+     * ``tolerance``
+     * ``num_nodes``, ``nodes``: number of nodes and combined hash of all nodes
+     * ``elements``: dictionary mapping element types (as strings) to dictionaries with the ``count``,
+       the combined ``hash`` of the elements and the combined hash ``physical`` of elements and physical groups
+     * ``physical_names``: sorted list of (dimension, name) of the physical groups
+     * ``digest``: SHA-256 checksum of all of the above
+    """
+    reader = MshReader(handle)
+    physical_names = {}
+    entities = {}
+    node_tags = node_hashes = order = None
+    elements = {}
+
+    for section in reader.sections():
+        if section == 'PhysicalNames':
+            physical_names = reader.read_physical_names()
+        elif section == 'Entities':
+            entities = reader.read_entities()
+        elif section == 'PartitionedEntities':
+            entities = reader.read_partitioned_entities()
+        elif section == 'Nodes':
+            num_nodes = reader.read_section_header()[1]
+            node_tags = np.empty(num_nodes, dtype=np.int64)
+            node_hashes = np.empty(num_nodes, dtype=np.uint64)
+            start = 0
+            for block in reader.iter_node_blocks():
+                stop = start + block.tags.size
+                if stop > num_nodes:
+                    raise MshError('Found more nodes than announced in the $Nodes header')
+                node_tags[start:stop] = block.tags
+                node_hashes[start:stop] = hash_nodes(block.coordinates, tolerance)
+                start = stop
+            if start != num_nodes:
+                raise MshError('Found {} nodes, expected {}'.format(start, num_nodes))
+            order = np.argsort(node_tags)
+        elif section == 'Elements':
+            if node_tags is None:
+                raise MshError('The $Elements section precedes the $Nodes section')
+            for block in reader.iter_element_blocks():
+                hashes = _hash_columns(node_hashes[tags_to_indices(node_tags, block.connectivity, order)],
+                                       np.uint64(block.element_type))
+                physical_key = _physical_key(block, entities, physical_names)
+                entry = elements.setdefault(str(block.element_type), [0, 0, 0])
+                entry[0] += hashes.size
+                entry[1] += _sum(hashes)
+                entry[2] += _sum(_mix(hashes ^ physical_key))
+
+    if node_tags is None:
+        raise MshError('File does not contain a $Nodes section')
+
+    result = {
+        'tolerance': tolerance,
+        'num_nodes': int(node_tags.size),
+        'nodes': '{:016x}'.format(_sum(node_hashes)),
+        'elements': {
+            element_type: {
+                'count': count,
+                'hash': '{:016x}'.format(element_hash % 2**64),
+                'physical': '{:016x}'.format(physical_hash % 2**64),
+            } for element_type, (count, element_hash, physical_hash) in sorted(elements.items())
+        },
+        'physical_names': sorted([dim, name] for dim, name in physical_names.values()),
+    }
+    result['digest'] = hashlib.sha256(json.dumps(result, sort_keys=True).encode()).hexdigest()
+    return result
+
+
+def compare_fingerprints(first, second):
+    """Compare two fingerprints.
+
+    :returns: list of differences (empty if the meshes are equal)
+    """
+    if first['tolerance'] != second['tolerance']:
+        return ['Fingerprints were computed with different tolerances ({} and {})'.format(
+            first['tolerance'], second['tolerance'])]
+
+    differences = []
+    if first['num_nodes'] != second['num_nodes']:
+        differences.append('Number of nodes differs: {} != {}'.format(first['num_nodes'], second['num_nodes']))
+    elif first['nodes'] != second['nodes']:
+        differences.append('Node coordinates differ')
+    # the hashes of the elements depend on the coordinates of their nodes
+    nodes_equal = not differences
+
+    for element_type in sorted(set(first['elements']) | set(second['elements']), key=int):
+        if element_type not in first['elements'] or element_type not in second['elements']:
+            differences.append('Elements of type {} are only contained in the {} mesh'.format(
+                element_type, 'first' if element_type in first['elements'] else 'second'))
+            continue
+        entry, other = first['elements'][element_type], second['elements'][element_type]
+        if entry['count'] != other['count']:
+            differences.append('Number of elements of type {} differs: {} != {}'.format(
+                element_type, entry['count'], other['count']))
+        elif not nodes_equal:
+            continue
+        elif entry['hash'] != other['hash']:
+            differences.append('Connectivity of elements of type {} differs'.format(element_type))
+        elif entry['physical'] != other['physical']:
+            differences.append('Physical groups of elements of type {} differ'.format(element_type))
+
+    if first['physical_names'] != second['physical_names']:
+        differences.append('Names of physical groups differ: {} != {}'.format(
+            first['physical_names'], second['physical_names']))
+    return differences
+
+
+def match_nodes(first, second, tolerance=DEFAULT_TOLERANCE):
+    """Match nodes whose coordinates differ by at most ``tolerance``.
+
+    :param first: coordinates of the nodes of the first mesh (float array of shape (num_nodes, 3))
+    :param second: coordinates of the nodes of the second mesh (float array of shape (num_nodes, 3))
+    :returns: int64 array with the index of the matching node of the first mesh for each node of the second
+        mesh (-1 if there is none); every node of the first mesh is matched at most once
+    """
+    spacing = 4 * tolerance
+    matches = np.full(second.shape[0], -1, dtype=np.int64)
+    unmatched = np.ones(first.shape[0], dtype=bool)
+    for offset in itertools.product((0., .5), repeat=3):
+        # a pass matches at most one node per cell, cells containing several nodes need several passes
+        while True:
+            free_first = np.flatnonzero(unmatched)
+            free_second = np.flatnonzero(matches < 0)
+            if not free_first.size or not free_second.size:
+                return matches
+            accepted, candidates = _match_cells(first[free_first], second[free_second], spacing, offset, tolerance)
+            if not accepted.size:
+                break
+            matches[free_second[accepted]] = free_first[candidates]
+            unmatched[free_first[candidates]] = False
+    return matches
+
+
+def _match_cells(first, second, spacing, offset, tolerance):
+    """Match nodes in the same cell of a grid whose coordinates differ by at most ``tolerance``.
+
+    :returns: tuple of index arrays (nodes of ``second``, matching nodes of ``first``)
+    """
+    keys_first = _hash_columns(np.floor(first / spacing + offset).astype(np.int64).view(np.uint64), np.uint64(0))
+    keys_second = _hash_columns(np.floor(second / spacing + offset).astype(np.int64).view(np.uint64), np.uint64(0))
+
+    order = np.argsort(keys_first)
+    candidates = order[np.minimum(np.searchsorted(keys_first, keys_second, sorter=order), order.size - 1)]
+    found = (keys_first[candidates] == keys_second) & np.all(np.abs(first[candidates] - second) <= tolerance, axis=1)
+    # a node of the first mesh may be the candidate of several nodes of the second mesh
+    _, unique = np.unique(candidates[found], return_index=True)
+    accepted = np.flatnonzero(found)[unique]
+    return accepted, candidates[accepted]
+
+
+class _MeshStream:
+    """Reads the nodes of a MSH file and then streams through its elements."""
+
+    def __init__(self, handle):
+        self.reader = MshReader(handle)
+        self.physical_names = {}
+        self.entities = {}
+        self.coordinates = self.node_tags = None
+        self._sections = self.reader.sections()
+        for section in self._sections:
+            if section == 'PhysicalNames':
+                self.physical_names = self.reader.read_physical_names()
+            elif section == 'Entities':
+                self.entities = self.reader.read_entities()
+            elif section == 'PartitionedEntities':
+                self.entities = self.reader.read_partitioned_entities()
+            elif section == 'Nodes':
+                self.coordinates, self.node_tags = read_nodes(self.reader)
+                break
+            elif section == 'Elements':
+                raise MshError('The $Elements section precedes the $Nodes section')
+        if self.node_tags is None:
+            raise MshError('File does not contain a $Nodes section')
+        self.order = np.argsort(self.node_tags)
+
+    def iter_element_blocks(self):
+        """Iterate over the element blocks, reading the remaining sections."""
+        for section in self._sections:
+            if section == 'PhysicalNames':
+                self.physical_names = self.reader.read_physical_names()
+            elif section == 'Elements':
+                yield from self.reader.iter_element_blocks()
+
+
+def _hash_elements(mesh, node_indices):
+    """Combine the hashes of the elements of each type, with the nodes given by ``node_indices``.
+
+    :returns: dictionary mapping element types to lists [count, hash, hash including the physical groups]
+    """
+    elements = {}
+    for block in mesh.iter_element_blocks():
+        indices = node_indices[tags_to_indices(mesh.node_tags, block.connectivity, mesh.order)]
+        hashes = _hash_columns(indices.view(np.uint64), np.uint64(block.element_type))
+        entry = elements.setdefault(block.element_type, [0, 0, 0])
+        entry[0] += hashes.size
+        entry[1] = (entry[1] + _sum(hashes)) % 2**64
+        entry[2] = (entry[2] + _sum(_mix(hashes ^ _physical_key(block, mesh.entities, mesh.physical_names)))) % 2**64
+    return elements
+
+
+def compare(first, second, tolerance=DEFAULT_TOLERANCE):
+    """Compare two MSH 4.1 files.
+
+    The nodes are matched by their coordinates (see :py:func:`match_nodes`), the elements by the matched
+    nodes, their type and their physical groups.
+
+    :param first: file handle of the first file opened in binary mode
+    :param second: file handle of the second file opened in binary mode
+    :param tolerance: absolute tolerance of the node coordinates
+    :returns: list of differences (empty if the meshes are equal up to node and element renumbering)
+    """
+    meshes = _MeshStream(first), _MeshStream(second)
+    num_nodes = [mesh.node_tags.size for mesh in meshes]
+
+    differences = []
+    if num_nodes[0] != num_nodes[1]:
+        differences.append('Number of nodes differs: {} != {}'.format(*num_nodes))
+        matches = None
+    else:
+        matches = match_nodes(meshes[0].coordinates, meshes[1].coordinates, tolerance)
+        if (matches < 0).any():
+            differences.append('Node coordinates differ')
+            matches = None
+
+    # the nodes of the second mesh are numbered by the index of the matching node of the first mesh
+    node_indices = (np.arange(num_nodes[0]), matches if matches is not None else np.arange(num_nodes[1]))
+    first_elements, second_elements = (_hash_elements(mesh, indices) for mesh, indices in zip(meshes, node_indices))
+
+    for element_type in sorted(set(first_elements) | set(second_elements)):
+        if element_type not in first_elements or element_type not in second_elements:
+            differences.append('Elements of type {} are only contained in the {} mesh'.format(
+                element_type, 'first' if element_type in first_elements else 'second'))
+            continue
+        entry, other = first_elements[element_type], second_elements[element_type]
+        if entry[0] != other[0]:
+            differences.append('Number of elements of type {} differs: {} != {}'.format(
+                element_type, entry[0], other[0]))
+        elif matches is None:
+            # the connectivity can only be compared if all nodes match
+            continue
+        elif entry[1] != other[1]:
+            differences.append('Connectivity of elements of type {} differs'.format(element_type))
+        elif entry[2] != other[2]:
+            differences.append('Physical groups of elements of type {} differ'.format(element_type))
+
+    physical_names = [sorted([dim, name] for dim, name in mesh.physical_names.values()) for mesh in meshes]
+    if physical_names[0] != physical_names[1]:
+        differences.append('Names of physical groups differ: {} != {}'.format(*physical_names))
+    return differences
@@ -7,7 +7,10 @@ Register data types via the "aiida.data" entry point in setup.json.
 
 # You can directly use or subclass aiida.orm.data.Data
 # or any other data type listed under 'verdi data'
-from voluptuous import Schema, Optional
+import itertools
+import json
+
+from voluptuous import All, Coerce, In, Invalid, Range, Schema, Optional
 from aiida.orm import Dict
 
 # A subset of gmsh's command line options
@@ -20,8 +23,34 @@ cmdline_options = {
     Optional('format', default='auto'): str,
     Optional('order', default=1): int,
     Optional('o'): str,
+    Optional('bin'): bool,
+    Optional('clscale'): Coerce(float),
+    Optional('clmin'): Coerce(float),
+    Optional('clmax'): Coerce(float),
+    # number of threads (OpenMP) and meshing algorithm, e.g. the parallel 3D algorithm 'hxt'
+    Optional('nt'): All(int, Range(min=1)),
+    Optional('algo'): In(['auto', 'meshadapt', 'del2d', 'front2d', 'delquad', 'quadqs', 'initial2d',
+                          'del3d', 'front3d', 'mmg3d', 'hxt', 'initial3d']),
+    # ONELAB parameters of the geometry, each entry is passed as '-setnumber name value'
+    Optional('setnumber'): {str: Coerce(float)},
+    Optional('setstring'): {str: str},
+    # verbosity of the log written to stdout and reporting of CPU time and memory usage of all operations
+    Optional('v'): All(int, Range(min=0, max=99)),
+    Optional('cpu'): bool,
+    # number of mesh partitions and whether each partition is written to a separate file '<name>_<partition>.msh'
+    Optional('part'): All(int, Range(min=1)),
+    Optional('part_split'): bool,
+    # post-processing of the mesh, e.g. of a parent mesh merged by GmshCalculation (parent_mesh input)
+    Optional('optimize'): bool,
+    Optional('optimize_netgen'): bool,
+    Optional('optimize_ho'): bool,
+    # uniform refinement (splitting each element) of the mesh, performed instead of mesh generation
+    Optional('refine'): bool,
 }
 
+# optimization switches and the corresponding methods of gmsh's OptimizeMesh command
+OPTIMIZE_METHODS = (('optimize', ''), ('optimize_netgen', 'Netgen'), ('optimize_ho', 'HighOrder'))
+
 
 class GmshParameters(Dict):  # pylint: disable=too-many-ancestors
     """
@@ -56,31 +85,142 @@ class GmshParameters(Dict):  # pylint: disable=too-many-ancestors
 
             print(GmshParameters).schema.schema
 
+        Binary output is enabled by default for 3D meshes, which are usually large.
+
         :param parameters_dict: dictionary with commandline parameters
         :param type parameters_dict: dict
         :returns: validated dictionary
         """
-        return GmshParameters.schema(parameters_dict)
+        parameters_dict = GmshParameters.schema(parameters_dict)
+        if parameters_dict.get('part_split') and 'part' not in parameters_dict:
+            raise Invalid('part_split requires the number of partitions (part)')
+        if parameters_dict.get('refine') and any(parameters_dict.get(dim) for dim in ('1', '2', '3')):
+            raise Invalid('refine replaces mesh generation and cannot be combined with 1, 2 or 3')
+        if parameters_dict.get('3') and 'bin' not in parameters_dict:
+            parameters_dict['bin'] = True
+        return parameters_dict
+
+    def canonical_dict(self):
+        """Return the canonical form of the command line options.
+
+        Defaults are filled in and switches which are turned off are dropped, such that
+        all dictionaries resulting in the same command line have the same canonical form.
+
+        :returns: canonical dictionary
+        """
+        return self._canonicalize(self.validate(self.get_dict()))
+
+    @staticmethod
+    def _canonicalize(pm_dict):
+        """Drop switches which are turned off from a validated dictionary (``cmdline_params`` leaves them out)."""
+        return {key: value for key, value in pm_dict.items() if value is not False}
+
+    def expand_grid(self, grid):
+        """Expand a grid of command line options around these parameters.
+
+        Points of the grid resulting in the same canonical parameters (see ``canonical_dict``)
+        are only returned once.
+
+        Usage::
+
+            parameters.expand_grid({'clscale': [1, 0.5], 'setnumber': {'radius': [0.1, 0.2]}})
+
+        :param grid: dictionary mapping command line options to lists of values; the values of
+            ``setnumber`` and ``setstring`` are dictionaries mapping names to lists of values
+        :param type grid: dict
+        :returns: list of validated parameter dictionaries
+        """
+        axes = []
+        for key, values in grid.items():
+            if isinstance(values, dict):
+                axes.extend(((key, name), name_values) for name, name_values in values.items())
+            else:
+                axes.append(((key,), values))
+
+        points = []
+        seen = set()
+        for combination in itertools.product(*(values for _, values in axes)):
+            pm_dict = json.loads(json.dumps(self.get_dict()))
+            for (path, _), value in zip(axes, combination):
+                if len(path) == 2:
+                    pm_dict.setdefault(path[0], {})[path[1]] = value
+                else:
+                    pm_dict[path[0]] = value
+            pm_dict = self.validate(pm_dict)
+            key = json.dumps(self._canonicalize(pm_dict), sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                points.append(pm_dict)
+        return points
+
+    def _get_objects_to_hash(self):
+        """Return a list of objects which should be included in the hash.
+
+        The attributes are replaced by their canonical form (see ``canonical_dict``), such that
+        equivalent parameters share the same hash and can be used for caching.
+        """
+        objects = super()._get_objects_to_hash()
+        objects[1] = self.canonical_dict()
+        return objects
+
+    def parent_mesh_script(self, parent_mesh):
+        """Return a .geo script merging an existing mesh and optimizing it.
+
+        gmsh only applies the optimization options of the command line while generating a mesh. A parent
+        mesh is therefore optimized by ``OptimizeMesh`` commands of a script, which is processed without
+        meshing (see ``cmdline_params``).
+
+        :param parent_mesh: Name of the existing mesh
+        :param type parent_mesh: str
+        :returns: content of the script
+        """
+        pm_dict = self.get_dict()
+        lines = ['Merge "{}";'.format(parent_mesh)]
+        lines += ['OptimizeMesh "{}";'.format(method) for key, method in OPTIMIZE_METHODS if pm_dict.get(key)]
+        return '\n'.join(lines) + '\n'
 
-    def cmdline_params(self, geofile):
+    def cmdline_params(self, geofile, output_filename=None, parent_mesh=None):
         """Synthesize command line parameters.
 
         e.g. ['geofile', '-2']
 
-        :param geofile: Name of geo file
+        A parent mesh is not meshed again: it is refined (``refine``), or otherwise processed with ``-0``,
+        in which case ``parent_mesh`` is the script of ``parent_mesh_script`` and the optimization options
+        are left out of the command line.
+
+        :param geofile: Name of geo file (None if only the parent mesh is processed)
         :param type geofile: str
+        :param parent_mesh: Name of an existing mesh (or of the script optimizing it), which is merged
+            after the geofile
+        :param type parent_mesh: str
+        :param output_filename: Name of the output file, passed as ``-o`` unless set in the parameters
+            (otherwise gmsh names the output after the geofile)
+        :param type output_filename: str
 
         """
-        parameters = [geofile]
+        parameters = [filename for filename in (geofile, parent_mesh) if filename is not None]
 
         pm_dict = self.get_dict()
+        optimize_only = parent_mesh is not None and not pm_dict.get('refine')
+        if optimize_only:
+            pm_dict = {key: value for key, value in pm_dict.items() if key not in dict(OPTIMIZE_METHODS)}
+            parameters.append('-0')
         for key, value in pm_dict.items():
-            if isinstance(value, bool) and value:
-                parameters.append("-"+str(key))
-            elif isinstance(value, (int, str)):
+            if isinstance(value, bool):
+                # switches which are turned off are left out (bool is a subclass of int)
+                if value:
+                    parameters.append("-"+str(key))
+            elif isinstance(value, dict):
+                # repeated options, e.g. '-setnumber radius 0.1 -setnumber thickness 0.01'
+                for name, name_value in value.items():
+                    parameters += ["-"+str(key), name, name_value]
+            elif isinstance(value, (int, float, str)):
                 parameters.append("-"+str(key))
                 parameters.append(value)
 
+        if output_filename is not None and 'o' not in pm_dict:
+            parameters += ['-o', output_filename]
+
         return [str(p) for p in parameters]
 
     def __str__(self):
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Array-backed representation of a gmsh mesh.
+
+Register data types via the "aiida.data" entry point in setup.json.
+"""
+from aiida.orm import ArrayData
+
+
+class GmshMeshData(ArrayData):  # pylint: disable=too-many-ancestors
+    """
+    Nodes, elements and physical groups of a gmsh mesh stored as numpy arrays.
+
+    Arrays:
+
+     * ``nodes``: node coordinates (float64, shape (num_nodes, 3))
+     * ``node_tags``: node tags (int64, shape (num_nodes,))
+     * ``elements_<type>``: connectivity of all elements of gmsh element type ``<type>`` given as node tags
+     * ``element_tags_<type>``: element tags
+     * ``physical_tags_<type>``: physical tags of each element, shape (num_elements, max. number of physical groups
+       per element), padded with 0 for elements in fewer (or no) physical groups
+
+    The names of the physical groups are stored in the ``physical_names`` attribute.
+    """
+
+    @classmethod
+    def from_msh(cls, handle, **kwargs):
+        """Create a new node from a MSH file.
+
+        :param handle: file handle opened in binary mode
+        :returns: unstored :py:class:`GmshMeshData`
+        """
+        from aiida_gmsh.msh import read_mesh
+
+        return cls.from_mesh(read_mesh(handle), **kwargs)
+
+    @classmethod
+    def from_mesh(cls, mesh, **kwargs):
+        """Create a new node from a mesh read by :py:func:`aiida_gmsh.msh.read_mesh`.
+
+        :param mesh: dictionary returned by ``read_mesh``
+        :returns: unstored :py:class:`GmshMeshData`
+        """
+        node = cls(**kwargs)
+        node.set_array('nodes', mesh['nodes'])
+        node.set_array('node_tags', mesh['node_tags'])
+        for element_type, connectivity in mesh['elements'].items():
+            node.set_array('elements_{}'.format(element_type), connectivity)
+            node.set_array('element_tags_{}'.format(element_type), mesh['element_tags'][element_type])
+            node.set_array('physical_tags_{}'.format(element_type), mesh['physical_tags'][element_type])
+        node.set_attribute('element_types', sorted(mesh['elements']))
+        node.set_physical_names(mesh['physical_names'])
+        return node
+
+    def set_physical_names(self, physical_names):
+        """Set the names of the physical groups.
+
+        :param physical_names: dictionary mapping physical tags to tuples (dimension, name)
+        """
+        self.set_attribute('physical_names', {str(tag): [dim, name] for tag, (dim, name) in physical_names.items()})
+
+    @property
+    def physical_names(self):
+        """Dictionary mapping physical tags to tuples (dimension, name)."""
+        return {int(tag): tuple(value) for tag, value in self.get_attribute('physical_names', {}).items()}
+
+    @property
+    def element_types(self):
+        """List of gmsh element types contained in the mesh."""
+        return self.get_attribute('element_types', [])
+
+    @property
+    def num_nodes(self):
+        """Number of nodes."""
+        return self.get_shape('node_tags')[0]
+
+    @property
+    def num_elements(self):
+        """Number of elements (of all types)."""
+        return sum(self.get_shape('element_tags_{}'.format(element_type))[0] for element_type in self.element_types)
+
+    def get_nodes(self):
+        """Return the node coordinates."""
+        return self.get_array('nodes')
+
+    def get_elements(self, element_type, indices=False):
+        """Return the connectivity of all elements of the given type.
+
+        :param element_type: gmsh element type
+        :param type element_type: int
+        :param indices: if True, return indices into the array of nodes instead of node tags
+        :param type indices: bool
+        """
+        from aiida_gmsh.msh import tags_to_indices
+
+        connectivity = self.get_array('elements_{}'.format(element_type))
+        if indices:
+            connectivity = tags_to_indices(self.get_array('node_tags'), connectivity)
+        return connectivity
+
+    def get_physical_tags(self, element_type):
+        """Return the physical tags of all elements of the given type (one row per element, padded with 0)."""
+        return self.get_array('physical_tags_{}'.format(element_type))
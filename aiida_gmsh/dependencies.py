@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Files referenced by .geo files and a content-addressed store for large files on remote computers.
+
+Files referenced by ``Include``, ``Merge`` and ``ShapeFromFile`` statements of the geofile are passed to
+``GmshCalculation`` through the ``dependencies`` input namespace, either as
+
+ * ``SinglefileData``, which is copied into the working directory of every calculation, or
+ * ``RemoteData`` pointing to a file on the computer of the calculation, which is symlinked (or copied) on
+   the remote computer without being transferred.
+
+Each dependency is placed at the path with which the geofile references a file of the same name,
+e.g. for ``Merge "cad/part.step";`` a dependency with filename ``part.step`` is placed at ``cad/part.step``.
+Included .geo files are scanned for references as well.
+
+Large CAD files are uploaded only once with ``get_remote_dependency``, which stores them under
+``<store>/<sha256[:2]>/<sha256>/<filename>`` on the computer and returns the same ``RemoteData`` for all
+subsequent calls with the same content.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from aiida.orm import RemoteData, SinglefileData
+
+from aiida_gmsh.repository import repository_path
+
+# size of the chunks in which files are hashed
+CHUNK_SIZE = 4 * 1024 * 1024
+
+_COMMENTS = re.compile(r'/\*.*?\*/|//[^\n]*', re.DOTALL)
+_REFERENCES = re.compile(r'\b(Include|Merge|ShapeFromFile)\s*\(?\s*"([^"]+)"')
+
+
+def parse_references(content):
+    """Return the files referenced by the ``Include``, ``Merge`` and ``ShapeFromFile`` statements of a .geo file.
+
+    References with absolute paths (files on the remote computer) and references in comments are ignored.
+
+    :param content: content of the .geo file
+    :returns: list of tuples (statement, normalized relative path) in order of appearance
+    """
+    references = []
+    for statement, path in _REFERENCES.findall(_COMMENTS.sub('', content)):
+        path = posixpath.normpath(path)
+        if not posixpath.isabs(path) and (statement, path) not in references:
+            references.append((statement, path))
+    return references
+
+
+def get_dependency_filename(node):
+    """Return the filename of a dependency.
+
+    :param node: ``SinglefileData`` or ``RemoteData`` pointing to a file
+    """
+    if isinstance(node, RemoteData):
+        return posixpath.basename(node.get_remote_path())
+    return node.filename
+
+
+def resolve_dependencies(geofile, dependencies):
+    """Determine the path of each dependency in the working directory of the calculation.
+
+    Dependencies which are not referenced are placed at their filename.
+
+    :param geofile: the .geo file (``SinglefileData``)
+    :param dependencies: dictionary mapping labels to ``SinglefileData`` or ``RemoteData``
+    :returns: dictionary mapping labels to paths relative to the working directory
+    :raises ValueError: if a referenced file is not among the dependencies, if several dependencies have
+        the filename of a referenced file or if a reference points outside of the working directory
+    """
+    labels_by_filename = {}
+    for label, node in dependencies.items():
+        labels_by_filename.setdefault(get_dependency_filename(node), []).append(label)
+
+    paths = {}
+    missing = []
+    pending = [('', geofile.get_content())]
+    while pending:
+        directory, content = pending.pop()
+        for statement, reference in parse_references(content):
+            path = posixpath.normpath(posixpath.join(directory, reference))
+            if path.startswith('..'):
+                raise ValueError("Reference '{}' points outside of the working directory".format(reference))
+            labels = labels_by_filename.get(posixpath.basename(path), [])
+            if not labels:
+                missing.append(path)
+                continue
+            if len(labels) > 1:
+                raise ValueError("Dependencies {} all provide '{}'".format(', '.join(sorted(labels)), path))
+            label = labels[0]
+            if label in paths:
+                continue
+            paths[label] = path
+            node = dependencies[label]
+            if isinstance(node, SinglefileData) and (statement == 'Include' or path.endswith('.geo')):
+                pending.append((posixpath.dirname(path), node.get_content()))
+
+    if missing:
+        raise ValueError('The geofile references files which are not in dependencies: {}'.format(', '.join(missing)))
+
+    for label, node in dependencies.items():
+        paths.setdefault(label, get_dependency_filename(node))
+    return paths
+
+
+def _sha256(handle):
+    """Return the SHA-256 checksum of a file opened in binary mode."""
+    checksum = hashlib.sha256()
+    for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+        checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def get_remote_dependency(source, computer, store, user=None):
+    """Return a ``RemoteData`` for a file in the content-addressed store on a computer.
+
+    The file is uploaded only if it is not in the store yet. Uploads are written to a temporary name and
+    renamed when complete, such that concurrent uploads of the same file do not produce partial files.
+
+    :param source: local path of the file or a stored ``SinglefileData`` node
+    :param computer: the computer of the calculations using the dependency
+    :param store: absolute path of the store on the computer, e.g. ``/scratch/user/aiida-gmsh-store``
+    :param user: user whose credentials are used for the upload (defaults to the default user)
+    :returns: stored ``RemoteData`` whose remote path is the file in the store
+    """
+    from aiida.orm import Computer, QueryBuilder  # pylint: disable=import-outside-toplevel
+
+    if isinstance(source, SinglefileData):
+        filename = source.filename
+        with source.open(filename, 'rb') as handle:
+            checksum = _sha256(handle)
+    else:
+        filename = os.path.basename(source)
+        with open(source, 'rb') as handle:
+            checksum = _sha256(handle)
+    remote_path = posixpath.join(store, checksum[:2], checksum, filename)
+
+    qb = QueryBuilder()
+    qb.append(Computer, filters={'id': computer.pk}, tag='computer')
+    qb.append(RemoteData, with_computer='computer', filters={'attributes.remote_path': remote_path})
+    existing = qb.first()
+    if existing is not None:
+        return existing[0]
+
+    with computer.get_transport(user) as transport:
+        # the file may have been uploaded already (e.g. from another AiiDA profile)
+        if not transport.path_exists(remote_path):
+            transport.makedirs(posixpath.dirname(remote_path), ignore_existing=True)
+            partial_path = '{}.{}.partial'.format(remote_path, os.getpid())
+            if isinstance(source, SinglefileData):
+                with repository_path(source, filename) as path:
+                    transport.putfile(path, partial_path)
+            else:
+                transport.putfile(source, partial_path)
+            transport.rename(partial_path, remote_path)
+
+    node = RemoteData(computer=computer, remote_path=remote_path)
+    node.label = filename
+    node.description = 'sha256: {}'.format(checksum)
+    return node.store()
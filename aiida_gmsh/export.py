@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk export of meshes generated by GmshCalculation.
+
+The ``mshfile`` of each calculation is streamed from the repository into a directory tree::
+
+    <directory>/<pk>/mesh.msh[.gz|.zst]
+    <directory>/<pk>/parameters.json
+    <directory>/manifest.json
+
+Files are copied by a pool of threads. The nodes are queried before the copies are started, the threads
+only stream the files from the repository through ``SinglefileData.open()``.
+Optionally, meshes are converted to another format with `meshio <https://github.com/nschloe/meshio>`_
+(``pip install aiida-gmsh[convert]``).
+"""
+import collections
+import concurrent.futures
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+from aiida.common import timezone
+from aiida.orm import CalcJobNode, Group, QueryBuilder, SinglefileData
+from aiida.plugins import DataFactory
+
+from aiida_gmsh.caching import PROCESS_TYPE
+from aiida_gmsh.repository import repository_path
+
+# size of the chunks in which files are copied
+CHUNK_SIZE = 4 * 1024 * 1024
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+# ``source`` is the ``SinglefileData`` node of the mesh
+ExportItem = collections.namedtuple('ExportItem', ['pk', 'uuid', 'source', 'filename', 'parameters'])
+
+
+def get_export_items(group=None, pks=None, filters=None):
+    """Return the meshes of all successful ``GmshCalculation`` nodes matching the query.
+
+    :param group: only export calculations in this group
+    :param pks: only export calculations with these pks
+    :param filters: filters on the ``GmshParameters`` input, e.g. ``{'attributes.3': True}``
+    :returns: list of :py:class:`ExportItem`
+    """
+    calc_filters = {'process_type': PROCESS_TYPE, 'attributes.exit_status': 0}
+    if pks:
+        calc_filters['id'] = {'in': list(pks)}
+
+    qb = QueryBuilder()
+    if group is not None:
+        qb.append(Group, filters={'id': group.pk}, tag='group')
+        qb.append(CalcJobNode, filters=calc_filters, with_group='group', tag='calc', project=['id', 'uuid'])
+    else:
+        qb.append(CalcJobNode, filters=calc_filters, tag='calc', project=['id', 'uuid'])
+    qb.append(SinglefileData, with_incoming='calc', edge_filters={'label': 'mshfile'}, project=['*'])
+    qb.append(DataFactory('gmsh'), with_outgoing='calc', edge_filters={'label': 'parameters'}, filters=filters or {},
+              project=['attributes'])
+    qb.order_by({'calc': {'id': 'asc'}})
+
+    items = []
+    for pk, uuid, mshfile, parameters in qb.iterall():
+        items.append(ExportItem(pk, uuid, mshfile, mshfile.filename, parameters))
+    return items
+
+
+class _HashingWriter:
+    """File-like wrapper computing the SHA-256 checksum and size of all data written."""
+
+    def __init__(self, handle):
+        self._handle = handle
+        self.checksum = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.checksum.update(data)
+        self.size += len(data)
+        return self._handle.write(data)
+
+    def flush(self):
+        self._handle.flush()
+
+
+def _copy(source, target, compression=None):
+    """Stream ``source`` to ``target`` in chunks, optionally compressing it.
+
+    :param source: file handle opened in binary mode
+    :returns: tuple (size, sha256) of the written file
+    """
+    with open(target, 'wb') as dst:
+        writer = _HashingWriter(dst)
+        if compression == 'gzip':
+            with gzip.GzipFile(fileobj=writer, mode='wb', compresslevel=6) as compressed:
+                shutil.copyfileobj(source, compressed, CHUNK_SIZE)
+        elif compression == 'zstd':
+            import zstandard  # pylint: disable=import-outside-toplevel
+            with zstandard.ZstdCompressor().stream_writer(writer, closefd=False) as compressed:
+                shutil.copyfileobj(source, compressed, CHUNK_SIZE)
+        else:
+            shutil.copyfileobj(source, writer, CHUNK_SIZE)
+    return writer.size, writer.checksum.hexdigest()
+
+
+def export_item(item, directory, compression=None, convert=None):
+    """Export a single mesh and its parameters.
+
+    :param item: :py:class:`ExportItem`
+    :param directory: root directory of the export
+    :param compression: compress the mesh ('gzip' or 'zstd')
+    :param convert: convert the mesh to the format given by this file extension (e.g. 'vtu') using meshio
+    :returns: entry of the manifest
+    """
+    target_dir = os.path.join(directory, str(item.pk))
+    os.makedirs(target_dir, exist_ok=True)
+
+    filename = item.filename
+    converted = None
+    if convert is not None:
+        import meshio  # pylint: disable=import-outside-toplevel
+        filename = '{}.{}'.format(os.path.splitext(item.filename)[0], convert)
+        converted = os.path.join(target_dir, filename)
+        with repository_path(item.source, item.filename) as path:
+            meshio.write(converted, meshio.read(path, file_format='gmsh'))
+        if compression is None:
+            with open(converted, 'rb') as handle:
+                checksum = hashlib.sha256()
+                for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+                    checksum.update(chunk)
+            size, sha256 = os.path.getsize(converted), checksum.hexdigest()
+
+    if converted is None or compression is not None:
+        filename += COMPRESSION_SUFFIXES.get(compression, '')
+        with open(converted, 'rb') if converted is not None else item.source.open(item.filename, 'rb') as source:
+            size, sha256 = _copy(source, os.path.join(target_dir, filename), compression)
+        if converted is not None:
+            os.remove(converted)
+
+    with open(os.path.join(target_dir, 'parameters.json'), 'w') as handle:
+        json.dump(item.parameters, handle, indent=2, sort_keys=True)
+
+    return {
+        'pk': item.pk,
+        'uuid': item.uuid,
+        'mesh': os.path.join(str(item.pk), filename),
+        'parameters': os.path.join(str(item.pk), 'parameters.json'),
+        'size': size,
+        'sha256': sha256,
+    }
+
+
+def bulk_export(items, directory, compression=None, convert=None, max_workers=4):
+    """Export meshes and parameters with a pool of threads and write the manifest.
+
+    Items failing to export are listed in the manifest with the error message.
+
+    :param items: list of :py:class:`ExportItem` (see ``get_export_items``)
+    :param directory: root directory of the export (created if it does not exist)
+    :param compression: compress the meshes ('gzip' or 'zstd')
+    :param convert: convert the meshes to the format given by this file extension (e.g. 'vtu') using meshio
+    :param max_workers: number of threads
+    :returns: the manifest
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    entries = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(export_item, item, directory, compression, convert): item for item in items}
+        for future in concurrent.futures.as_completed(futures):
+            item = futures[future]
+            try:
+                entries.append(future.result())
+            except Exception as exc:  # pylint: disable=broad-except
+                entries.append({'pk': item.pk, 'uuid': item.uuid, 'error': '{}: {}'.format(type(exc).__name__, exc)})
+
+    manifest = {
+        'created': timezone.now().isoformat(),
+        'compression': compression,
+        'format': convert or 'msh',
+        'items': sorted(entries, key=lambda entry: entry['pk']),
+    }
+    with open(os.path.join(directory, 'manifest.json'), 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+    return manifest
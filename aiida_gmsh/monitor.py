@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Monitoring of running ``GmshCalculation``s (``verdi data gmsh monitor``).
+
+The log of gmsh in the remote working directory is tailed through the transport of the computer,
+reading only the output written since the previous poll. The current stage, node and element counts and
+the memory usage (reported with the ``cpu`` option of ``GmshParameters``) are extracted from the new lines.
+
+A calculation is aborted if it violates one of the :py:class:`MonitorRules`:
+
+ * the log did not grow for ``stall_seconds`` (e.g. gmsh hangs in an optimization pass),
+ * the mesh has more than ``max_elements`` elements,
+ * gmsh uses more than ``max_memory_mb`` of memory.
+
+To abort a calculation, the monitor writes the reason to ``ABORT_FILENAME`` in the remote working directory
+and kills the scheduler job. AiiDA then retrieves and parses the calculation as usual, and the parser
+returns the exit code ``ERROR_ABORTED_BY_MONITOR`` instead of waiting for the walltime to expire.
+"""
+import collections
+import json
+import os
+import posixpath
+import re
+import tempfile
+import time
+
+from aiida_gmsh.timings import COUNTS_PATTERN, MEMORY_PATTERN, stage_name
+
+# file written to the remote working directory when a calculation is aborted
+ABORT_FILENAME = '_aiida_gmsh_abort.json'
+
+MonitorRules = collections.namedtuple('MonitorRules', ['stall_seconds', 'max_elements', 'max_memory_mb'])
+
+# start of a stage, e.g. "Info    : Meshing 3D..." or "Info    : Optimizing mesh (Netgen)..."
+_STAGE = re.compile(r'Info\s*:\s*(?P<stage>[A-Z][^\[]*?)\.\.\.\s*$')
+# intermediate sizes of the mesh, e.g. "Info    : Done tetrahedrizing 1242 nodes" or "12345 tetrahedra created"
+_NODES = re.compile(r'(\d+) (?:nodes|vertices|points)\b')
+_ELEMENTS = re.compile(r'(\d+) (?:elements|tetrahedra|tets|triangles|quadrangles|hexahedra)\b')
+
+
+class LogProgress:
+    """Progress of gmsh as reported in its log, updated with the output written since the last update."""
+
+    def __init__(self):
+        self.stage = None
+        self.num_nodes = None
+        self.num_elements = None
+        self.peak_memory_mb = None
+        self.num_bytes = 0
+        self._partial = ''
+
+    def update(self, text):
+        """Update the progress with new output of gmsh.
+
+        :param text: output appended to the log since the last update (may end with an incomplete line)
+        """
+        self.num_bytes += len(text.encode())
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            match = _STAGE.search(line)
+            if match:
+                self.stage = stage_name(match.group('stage'))
+
+            match = COUNTS_PATTERN.search(line)
+            if match:
+                self.num_nodes, self.num_elements = int(match.group(1)), int(match.group(2))
+            else:
+                for pattern, key in ((_NODES, 'num_nodes'), (_ELEMENTS, 'num_elements')):
+                    counts = [int(count) for count in pattern.findall(line)]
+                    if counts:
+                        setattr(self, key, max(counts + [getattr(self, key) or 0]))
+
+            for memory in MEMORY_PATTERN.findall(line):
+                self.peak_memory_mb = max(float(memory), self.peak_memory_mb or 0.)
+
+    def get_dict(self):
+        """Return the progress as dictionary."""
+        return {
+            'stage': self.stage,
+            'num_nodes': self.num_nodes,
+            'num_elements': self.num_elements,
+            'peak_memory_mb': self.peak_memory_mb,
+        }
+
+
+def check_rules(progress, rules, idle_seconds):
+    """Check the progress of a calculation against the rules.
+
+    :param progress: :py:class:`LogProgress`
+    :param rules: :py:class:`MonitorRules`, rules set to None are not checked
+    :param idle_seconds: seconds since the log last grew
+    :returns: the reason for aborting the calculation, or None if no rule is violated
+    """
+    if rules.stall_seconds is not None and idle_seconds > rules.stall_seconds:
+        return 'no progress for {:.0f} s (stage: {})'.format(idle_seconds, progress.stage)
+    if rules.max_elements is not None and (progress.num_elements or 0) > rules.max_elements:
+        return '{} elements exceed the limit of {}'.format(progress.num_elements, rules.max_elements)
+    if rules.max_memory_mb is not None and (progress.peak_memory_mb or 0) > rules.max_memory_mb:
+        return 'memory usage of {} Mb exceeds the limit of {} Mb'.format(progress.peak_memory_mb, rules.max_memory_mb)
+    return None
+
+
+def get_job_info(pks):
+    """Return the state, remote working directory and job id of calculations.
+
+    The values are queried from the database (not from cached nodes), such that changes made by the daemon
+    are seen.
+
+    :param pks: pks of ``CalcJobNode``s
+    :returns: dictionary mapping pks to tuples (terminated, remote workdir, job id)
+    """
+    from aiida.orm import CalcJobNode, QueryBuilder  # pylint: disable=import-outside-toplevel
+
+    qb = QueryBuilder()
+    qb.append(CalcJobNode,
+              filters={'id': {
+                  'in': list(pks)
+              }},
+              project=['id', 'attributes.process_state', 'attributes.remote_workdir', 'attributes.job_id'])
+    return {
+        pk: (process_state in ('finished', 'excepted', 'killed'), workdir, job_id)
+        for pk, process_state, workdir, job_id in qb.iterall()
+    }
+
+
+class CalculationMonitor:
+    """Monitor of a single ``GmshCalculation``."""
+
+    def __init__(self, node, rules, clock=time.monotonic):
+        """
+        :param node: the ``CalcJobNode`` of the calculation
+        :param rules: :py:class:`MonitorRules`
+        """
+        self.node = node
+        self.rules = rules
+        self.progress = LogProgress()
+        self.reason = None
+        self.idle_seconds = 0.
+        self._clock = clock
+        self._last_change = None
+
+    def poll(self, transport, workdir, job_id):
+        """Read the new output of gmsh and abort the calculation if it violates a rule.
+
+        :param transport: open transport of the computer of the calculation
+        :param workdir: remote working directory (None if the calculation was not uploaded yet)
+        :param job_id: id of the scheduler job
+        :returns: the reason for aborting the calculation, or None
+        """
+        from aiida.common.escaping import escape_for_bash  # pylint: disable=import-outside-toplevel
+
+        if workdir is None or job_id is None:
+            return None
+        path = posixpath.join(workdir, self.node.get_option('log_filename'))
+        if not transport.path_exists(path):
+            # the job did not start yet
+            return None
+
+        retval, stdout, stderr = transport.exec_command_wait('tail -c +{} {}'.format(
+            self.progress.num_bytes + 1, escape_for_bash(path)))
+        if retval != 0:
+            raise IOError("Reading '{}' failed: {}".format(path, stderr))
+
+        now = self._clock()
+        if stdout or self._last_change is None:
+            self._last_change = now
+        if stdout:
+            self.progress.update(stdout)
+        self.idle_seconds = now - self._last_change
+
+        reason = check_rules(self.progress, self.rules, self.idle_seconds)
+        if reason is not None:
+            self.abort(transport, workdir, job_id, reason)
+        return reason
+
+    def abort(self, transport, workdir, job_id, reason):
+        """Write the reason to ``ABORT_FILENAME`` in the remote working directory and kill the scheduler job."""
+        content = {'reason': reason, 'progress': self.progress.get_dict()}
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as handle:
+            json.dump(content, handle)
+        try:
+            transport.putfile(handle.name, posixpath.join(workdir, ABORT_FILENAME))
+        finally:
+            os.remove(handle.name)
+
+        scheduler = self.node.computer.get_scheduler()
+        scheduler.set_transport(transport)
+        scheduler.kill(job_id)
+        self.reason = reason
+
+
+def monitor(nodes, rules, interval=60., report=None, sleep=time.sleep):
+    """Monitor calculations until all of them terminated.
+
+    :param nodes: ``CalcJobNode``s of ``GmshCalculation``s
+    :param rules: :py:class:`MonitorRules`
+    :param interval: seconds between polls
+    :param report: function called with the :py:class:`CalculationMonitor` of each running calculation after
+        every poll
+    :returns: list of :py:class:`CalculationMonitor`, the ``reason`` of aborted calculations is set
+    """
+    monitors = {node.pk: CalculationMonitor(node, rules) for node in nodes}
+    while True:
+        info = get_job_info(list(monitors))
+        active = [
+            monitor_ for pk, monitor_ in monitors.items()
+            if monitor_.reason is None and pk in info and not info[pk][0]
+        ]
+        if not active:
+            return list(monitors.values())
+
+        by_computer = collections.defaultdict(list)
+        for monitor_ in active:
+            by_computer[monitor_.node.computer.uuid].append(monitor_)
+        for computer_monitors in by_computer.values():
+            with computer_monitors[0].node.computer.get_transport() as transport:
+                for monitor_ in computer_monitors:
+                    _, workdir, job_id = info[monitor_.node.pk]
+                    monitor_.poll(transport, workdir, job_id)
+                    if report is not None:
+                        report(monitor_)
+        sleep(interval)
@@ -0,0 +1,740 @@
+# -*- coding: utf-8 -*-
+"""
+Reader for gmsh's MSH file format (version 4.1, ASCII and binary).
+
+The reader streams through the file section by section and converts the ``$Nodes`` and
+``$Elements`` sections block by block (one block per model entity) into NumPy arrays, such that
+the memory needed for parsing is bounded by the size of a single block.
+
+Binary files can also be memory-mapped (see ``load_memmap``), in which case the blocks are
+exposed as views into the file without copying any data.
+
+See http://gmsh.info/doc/texinfo/gmsh.html#MSH-file-format for a description of the format.
+"""
+import collections
+import io
+import struct
+
+import numpy as np
+
+# Number of nodes per element type
+# (see http://gmsh.info/doc/texinfo/gmsh.html#MSH-file-format)
+ELEMENT_TYPES = {
+    1: ('line', 2),
+    2: ('triangle', 3),
+    3: ('quad', 4),
+    4: ('tetra', 4),
+    5: ('hexahedron', 8),
+    6: ('prism', 6),
+    7: ('pyramid', 5),
+    8: ('line3', 3),
+    9: ('triangle6', 6),
+    10: ('quad9', 9),
+    11: ('tetra10', 10),
+    12: ('hexahedron27', 27),
+    13: ('prism18', 18),
+    14: ('pyramid14', 14),
+    15: ('vertex', 1),
+    16: ('quad8', 8),
+    17: ('hexahedron20', 20),
+    18: ('prism15', 15),
+    19: ('pyramid13', 13),
+    20: ('triangle9', 9),
+    21: ('triangle10', 10),
+    22: ('triangle12', 12),
+    23: ('triangle15', 15),
+    24: ('triangle15i', 15),
+    25: ('triangle21', 21),
+    26: ('line4', 4),
+    27: ('line5', 5),
+    28: ('line6', 6),
+    29: ('tetra20', 20),
+    30: ('tetra35', 35),
+    31: ('tetra56', 56),
+    92: ('hexahedron64', 64),
+    93: ('hexahedron125', 125),
+}
+
+# attribute of SinglefileData nodes containing the metadata returned by ``read_metadata``
+METADATA_ATTRIBUTE = 'msh_metadata'
+
+NodeBlock = collections.namedtuple('NodeBlock', ['entity_dim', 'entity_tag', 'tags', 'coordinates'])
+ElementBlock = collections.namedtuple('ElementBlock',
+                                      ['entity_dim', 'entity_tag', 'element_type', 'tags', 'connectivity'])
+BlockHeader = collections.namedtuple('BlockHeader', ['entity_dim', 'entity_tag', 'kind', 'count', 'offset'])
+Entity = collections.namedtuple('Entity', ['dim', 'tag', 'bounding_box', 'physical_tags'])
+PartitionedEntity = collections.namedtuple('PartitionedEntity',
+                                           ['dim', 'tag', 'parent', 'partitions', 'bounding_box', 'physical_tags'])
+MappedMesh = collections.namedtuple('MappedMesh', ['node_blocks', 'element_blocks', 'physical_names', 'entities'])
+
+
+class MshError(ValueError):
+    """Raised if a file does not comply with the MSH file format."""
+
+
+def nodes_per_element(element_type):
+    """Return the number of nodes of an element type.
+
+    :param element_type: gmsh element type
+    :param type element_type: int
+    :raises MshError: if the element type is not known
+    """
+    try:
+        return ELEMENT_TYPES[element_type][1]
+    except KeyError as exc:
+        raise MshError('Unknown element type {}'.format(element_type)) from exc
+
+
+class MshReader:
+    """
+    Streaming reader for MSH 4.1 files.
+
+    Usage::
+
+        with open('mesh.msh', 'rb') as handle:
+            reader = MshReader(handle)
+            for section in reader.sections():
+                if section == 'Nodes':
+                    for block in reader.iter_node_blocks():
+                        ...
+
+    Sections which are not read by the caller are skipped. Node and element tags are returned
+    as int64 arrays, coordinates as float64 arrays (independent of the data size and endianness
+    of binary files).
+    """
+
+    def __init__(self, handle):
+        """
+        Initialize reader and read the ``$MeshFormat`` section.
+
+        :param handle: file handle opened in binary mode
+        """
+        self._handle = handle
+        self._section = None
+        self._consumed = False
+        self._header = None
+        self._tokens = []
+        self.version, self.binary, self.data_size = self._read_mesh_format()
+
+    def _readline(self):
+        """Return the next line (stripped), raise ``MshError`` at the end of the file."""
+        line = self._handle.readline()
+        if not line:
+            raise MshError('Unexpected end of file')
+        return line.strip()
+
+    def _read_mesh_format(self):
+        """Read the ``$MeshFormat`` section.
+
+        For binary files, the endianness marker is validated and the dtypes used to read the
+        binary data are set up.
+        """
+        if self._readline() != b'$MeshFormat':
+            raise MshError('File does not start with $MeshFormat')
+        try:
+            version, file_type, data_size = self._readline().split()
+        except ValueError as exc:
+            raise MshError('Invalid $MeshFormat section') from exc
+        if version != b'4.1':
+            raise MshError('Unsupported MSH version {}, expected 4.1'.format(version.decode()))
+        if file_type not in (b'0', b'1'):
+            raise MshError('Invalid file type {}'.format(file_type.decode()))
+        if data_size not in (b'4', b'8'):
+            raise MshError('Unsupported data size {}'.format(data_size.decode()))
+
+        binary = file_type == b'1'
+        byteorder = '<'
+        if binary:
+            marker = self._handle.read(4)
+            if marker == struct.pack('<i', 1):
+                byteorder = '<'
+            elif marker == struct.pack('>i', 1):
+                byteorder = '>'
+            else:
+                raise MshError('Invalid endianness marker in binary file')
+        self._int = np.dtype(byteorder + 'i4')
+        self._size_t = np.dtype('{}u{}'.format(byteorder, data_size.decode()))
+        self._double = np.dtype(byteorder + 'f8')
+
+        self._expect_end('MeshFormat')
+        return version.decode(), binary, int(data_size)
+
+    def _expect_end(self, name):
+        """Read the end marker of section ``name``."""
+        line = self._readline()
+        while not line:
+            # binary data is terminated by a newline
+            line = self._readline()
+        if line != '$End{}'.format(name).encode():
+            raise MshError('Expected $End{}'.format(name))
+
+    def _read_ints(self, count):
+        """Read ``count`` whitespace separated integers, which may span several lines."""
+        values = []
+        while len(values) < count:
+            values.extend(int(value) for value in self._readline().split())
+        if len(values) != count:
+            raise MshError('Expected {} values, found {}'.format(count, len(values)))
+        return values
+
+    def _read_array(self, num_lines, dtype):
+        """Read ``num_lines`` lines into a flat array."""
+        text = b''.join(self._handle.readline() for _ in range(num_lines))
+        return np.fromstring(text, dtype=dtype, sep=' ')  # pylint: disable=deprecated-method
+
+    def _read_binary(self, dtype, count):
+        """Read ``count`` binary values of type ``dtype``."""
+        size = dtype.itemsize * count
+        data = self._handle.read(size)
+        if len(data) != size:
+            raise MshError('Unexpected end of file')
+        return np.frombuffer(data, dtype=dtype)
+
+    def sections(self):
+        """Iterate over the names of the remaining sections.
+
+        After a name is yielded, the reader is positioned at the beginning of the section content.
+        If the section is not read by the caller, it is skipped.
+        """
+        while True:
+            line = self._handle.readline()
+            if not line:
+                return
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith(b'$'):
+                raise MshError('Expected section, found {!r}'.format(line[:80]))
+            self._section = line[1:].decode()
+            self._consumed = False
+            self._header = None
+            yield self._section
+            if not self._consumed:
+                self._skip_section()
+
+    def _skip_section(self):
+        """Skip the remaining content of the current section."""
+        if self._section in ('Nodes', 'Elements') and self._header is None:
+            # skip block by block, binary data may contain arbitrary bytes
+            for _ in self.iter_block_headers():
+                pass
+            return
+        end = '$End{}'.format(self._section).encode()
+        while self._readline() != end:
+            pass
+        self._consumed = True
+
+    def _finish_section(self):
+        """Read the end marker of the current section."""
+        self._expect_end(self._section)
+        self._consumed = True
+
+    def _read_values(self, dtype, count):
+        """Read ``count`` values of type ``dtype`` (ASCII values may span several lines)."""
+        if self.binary:
+            return self._read_binary(dtype, count).tolist()
+        convert = float if dtype.kind == 'f' else int
+        while len(self._tokens) < count:
+            self._tokens.extend(self._readline().split())
+        values = [convert(value) for value in self._tokens[:count]]
+        del self._tokens[:count]
+        return values
+
+    def read_physical_names(self):
+        """Read the ``$PhysicalNames`` section (which is ASCII in binary files as well).
+
+        :returns: dictionary mapping physical tags to tuples (dimension, name)
+        """
+        physical_names = {}
+        num_names = int(self._readline())
+        for _ in range(num_names):
+            dim, tag, name = self._readline().decode().split(maxsplit=2)
+            physical_names[int(tag)] = (int(dim), name.strip('"'))
+        self._finish_section()
+        return physical_names
+
+    def read_entities(self):
+        """Read the ``$Entities`` section.
+
+        :returns: dictionary mapping (dim, tag) to :py:class:`Entity`
+        """
+        entities = {}
+        counts = self._read_binary(self._size_t, 4) if self.binary else self._read_ints(4)
+        for dim, count in enumerate(counts):
+            for _ in range(int(count)):
+                # points have a single coordinate, all other entities a bounding box
+                if self.binary:
+                    entity = self._read_binary_entity(dim)
+                else:
+                    entity = self._read_ascii_entity(dim)
+                entities[(dim, entity.tag)] = entity
+        self._finish_section()
+        return entities
+
+    def _read_ascii_entity(self, dim):
+        """Read a single entity of dimension ``dim`` from an ASCII file."""
+        values = self._readline().split()
+        num_coordinates = 3 if dim == 0 else 6
+        coordinates = [float(value) for value in values[1:1 + num_coordinates]]
+        if dim == 0:
+            coordinates = coordinates + coordinates
+        num_physicals = int(values[1 + num_coordinates])
+        physical_tags = [int(value) for value in values[2 + num_coordinates:2 + num_coordinates + num_physicals]]
+        return Entity(dim, int(values[0]), coordinates, physical_tags)
+
+    def _read_binary_entity(self, dim):
+        """Read a single entity of dimension ``dim`` from a binary file."""
+        tag = int(self._read_binary(self._int, 1)[0])
+        coordinates = self._read_binary(self._double, 3 if dim == 0 else 6).tolist()
+        if dim == 0:
+            coordinates = coordinates + coordinates
+        num_physicals = int(self._read_binary(self._size_t, 1)[0])
+        physical_tags = self._read_binary(self._int, num_physicals).tolist()
+        if dim > 0:
+            num_bounding = int(self._read_binary(self._size_t, 1)[0])
+            self._read_binary(self._int, num_bounding)
+        return Entity(dim, tag, coordinates, physical_tags)
+
+    def read_partitioned_entities(self):
+        """Read the ``$PartitionedEntities`` section of a partitioned mesh.
+
+        The node and element blocks of a partitioned mesh refer to the partitioned entities, which replace the
+        entities of the ``$Entities`` section (e.g. for the lookup of physical tags).
+
+        :returns: dictionary mapping (dim, tag) of the partitioned entities to :py:class:`PartitionedEntity`
+        """
+        entities = {}
+        self._read_values(self._size_t, 1)  # number of partitions
+        num_ghosts = self._read_values(self._size_t, 1)[0]
+        self._read_values(self._int, 2 * num_ghosts)
+        counts = self._read_values(self._size_t, 4)
+        for dim, count in enumerate(counts):
+            for _ in range(count):
+                tag, parent_dim, parent_tag = self._read_values(self._int, 3)
+                num_partitions = self._read_values(self._size_t, 1)[0]
+                partitions = self._read_values(self._int, num_partitions)
+                coordinates = self._read_values(self._double, 3 if dim == 0 else 6)
+                if dim == 0:
+                    coordinates = coordinates + coordinates
+                num_physicals = self._read_values(self._size_t, 1)[0]
+                physical_tags = self._read_values(self._int, num_physicals)
+                if dim > 0:
+                    num_bounding = self._read_values(self._size_t, 1)[0]
+                    self._read_values(self._int, num_bounding)
+                entities[(dim, tag)] = PartitionedEntity(dim, tag, (parent_dim, parent_tag), partitions, coordinates,
+                                                         physical_tags)
+        if self._tokens:
+            raise MshError('Unexpected values at the end of $PartitionedEntities')
+        self._finish_section()
+        return entities
+
+    def read_section_header(self):
+        """Read the header of the ``$Nodes`` or ``$Elements`` section.
+
+        The header is only read once per section, i.e. the blocks may be iterated afterwards.
+
+        :returns: tuple (num_blocks, num_items, min_tag, max_tag)
+        """
+        if self._header is None:
+            if self.binary:
+                self._header = tuple(int(value) for value in self._read_binary(self._size_t, 4))
+            else:
+                self._header = tuple(self._read_ints(4))
+        return self._header
+
+    def _read_block_header(self):
+        """Read the header of a block: (entity_dim, entity_tag, parametric or element type, count)."""
+        if self.binary:
+            entity_dim, entity_tag, kind = (int(value) for value in self._read_binary(self._int, 3))
+            return entity_dim, entity_tag, kind, int(self._read_binary(self._size_t, 1)[0])
+        return tuple(self._read_ints(4))
+
+    def _block_layout(self, entity_dim, kind, count):
+        """Return dtypes and shapes of the arrays stored in a block of the current section."""
+        if self._section == 'Nodes':
+            num_columns = 3 + (entity_dim if kind else 0)
+            return [(self._size_t, (count,)), (self._double, (count, num_columns))]
+        return [(self._size_t, (count, 1 + nodes_per_element(kind)))]
+
+    def iter_block_headers(self):
+        """Iterate over the block headers of the ``$Nodes`` or ``$Elements`` section, skipping the data.
+
+        :returns: generator of :py:class:`BlockHeader`, where ``offset`` is the position of the
+            block data in the file
+        """
+        num_blocks = self.read_section_header()[0]
+        for _ in range(num_blocks):
+            entity_dim, entity_tag, kind, count = self._read_block_header()
+            offset = self._handle.tell()
+            if self.binary:
+                size = sum(dtype.itemsize * int(np.prod(shape)) for dtype, shape in self._block_layout(entity_dim, kind, count))
+                self._handle.seek(size, io.SEEK_CUR)
+            else:
+                num_lines = 2 * count if self._section == 'Nodes' else count
+                for _ in range(num_lines):
+                    self._handle.readline()
+            yield BlockHeader(entity_dim, entity_tag, kind, count, offset)
+        self._finish_section()
+
+    def scan_block_headers(self):
+        """Return the block headers of the ``$Nodes`` or ``$Elements`` section without consuming the section.
+
+        The handle is rewound to the first block afterwards, such that the blocks can be read, e.g. into
+        arrays preallocated from the counts of the block headers. Requires a seekable handle.
+
+        :returns: list of :py:class:`BlockHeader`
+        """
+        header = self.read_section_header()
+        position = self._handle.tell()
+        headers = list(self.iter_block_headers())
+        self._handle.seek(position)
+        self._header = header
+        self._consumed = False
+        return headers
+
+    def map_block(self, buffer, header):
+        """Return views into ``buffer`` (the content of a binary file) for the data of a block.
+
+        :param buffer: content of the file, e.g. a :py:class:`numpy.memmap` of dtype uint8
+        :param header: :py:class:`BlockHeader` of a block in the current section
+        :returns: :py:class:`NodeBlock` or :py:class:`ElementBlock`
+        """
+        views = []
+        offset = header.offset
+        for dtype, shape in self._block_layout(header.entity_dim, header.kind, header.count):
+            size = dtype.itemsize * int(np.prod(shape))
+            views.append(buffer[offset:offset + size].view(dtype).reshape(shape))
+            offset += size
+        if self._section == 'Nodes':
+            tags, coordinates = views
+            return NodeBlock(header.entity_dim, header.entity_tag, tags, coordinates[:, :3])
+        data, = views
+        return ElementBlock(header.entity_dim, header.entity_tag, header.kind, data[:, 0], data[:, 1:])
+
+    def _read_block(self, entity_dim, kind, count):
+        """Read the arrays stored in a block of the current section."""
+        arrays = []
+        for dtype, shape in self._block_layout(entity_dim, kind, count):
+            size = int(np.prod(shape))
+            if self.binary:
+                array = self._read_binary(dtype, size)
+            else:
+                array = self._read_array(shape[0], np.float64 if dtype.kind == 'f' else np.int64)
+                if array.size != size:
+                    raise MshError('Invalid block in ${}'.format(self._section))
+            arrays.append(array.astype(np.float64 if dtype.kind == 'f' else np.int64, copy=False).reshape(shape))
+        return arrays
+
+    def iter_node_blocks(self):
+        """Iterate over the blocks of the ``$Nodes`` section.
+
+        :returns: generator of :py:class:`NodeBlock`
+        """
+        num_blocks = self.read_section_header()[0]
+        for _ in range(num_blocks):
+            entity_dim, entity_tag, parametric, num_nodes = self._read_block_header()
+            tags, coordinates = self._read_block(entity_dim, parametric, num_nodes)
+            yield NodeBlock(entity_dim, entity_tag, tags, coordinates[:, :3])
+        self._finish_section()
+
+    def iter_element_blocks(self):
+        """Iterate over the blocks of the ``$Elements`` section.
+
+        :returns: generator of :py:class:`ElementBlock`
+        """
+        num_blocks = self.read_section_header()[0]
+        for _ in range(num_blocks):
+            entity_dim, entity_tag, element_type, num_elements = self._read_block_header()
+            data, = self._read_block(entity_dim, element_type, num_elements)
+            yield ElementBlock(entity_dim, entity_tag, element_type, data[:, 0], data[:, 1:])
+        self._finish_section()
+
+
+def tags_to_indices(node_tags, connectivity, order=None):
+    """Convert connectivity given as node tags into indices into the array of nodes.
+
+    :param node_tags: node tags (in the order of the array of nodes)
+    :param connectivity: connectivity array (node tags)
+    :param order: ``np.argsort(node_tags)``, to be passed when converting many arrays with the same nodes
+    :returns: connectivity array (indices)
+    """
+    if order is None:
+        order = np.argsort(node_tags)
+    return order[np.searchsorted(node_tags, connectivity, sorter=order)]
+
+
+def read_mesh(handle):
+    """Read nodes, elements and physical groups of a MSH 4.1 file.
+
+    :param handle: file handle opened in binary mode
+    :returns: dictionary with keys
+
+     * ``nodes``: coordinates (float64 array of shape (num_nodes, 3))
+     * ``node_tags``: node tags (int64 array of shape (num_nodes,))
+     * ``elements``: dictionary mapping element types to connectivity arrays (node tags)
+     * ``element_tags``: dictionary mapping element types to element tags
+     * ``physical_tags``: dictionary mapping element types to the physical tags of each element, int64 arrays
+       of shape (num_elements, max. number of physical groups per element); elements belonging to fewer
+       (or no) physical groups are padded with 0
+     * ``physical_names``: dictionary mapping physical tags to tuples (dimension, name)
+
+    The arrays are preallocated from the block headers, such that besides the result only a single block
+    is held in memory. Requires a seekable handle.
+    """
+    reader = MshReader(handle)
+    physical_names = {}
+    entities = {}
+    nodes = node_tags = None
+    elements = None
+
+    for section in reader.sections():
+        if section == 'PhysicalNames':
+            physical_names = reader.read_physical_names()
+        elif section == 'Entities':
+            entities = reader.read_entities()
+        elif section == 'PartitionedEntities':
+            entities = reader.read_partitioned_entities()
+        elif section == 'Nodes':
+            nodes, node_tags = read_nodes(reader)
+        elif section == 'Elements':
+            elements = _read_elements(reader, entities)
+
+    if nodes is None:
+        raise MshError('File does not contain a $Nodes section')
+
+    result = {
+        'nodes': nodes,
+        'node_tags': node_tags,
+        'elements': {},
+        'element_tags': {},
+        'physical_tags': {},
+        'physical_names': physical_names,
+    }
+    for element_type, (tags, connectivity, physical_tags) in sorted((elements or {}).items()):
+        result['element_tags'][element_type] = tags
+        result['elements'][element_type] = connectivity
+        result['physical_tags'][element_type] = physical_tags
+
+    return result
+
+
+def read_header(handle):
+    """Read the metadata at the beginning of a MSH 4.1 file, up to the header of the ``$Nodes`` section.
+
+    The file may be truncated (e.g. only the first megabyte of the file), in which case the metadata
+    found before the end of the file is returned.
+
+    :param handle: file handle opened in binary mode
+    :returns: dictionary with keys
+
+     * ``version``, ``binary``, ``data_size``: format of the file
+     * ``physical_names``: dictionary mapping physical tags to tuples (dimension, name)
+     * ``num_entities``: number of points, curves, surfaces and volumes (None if not found)
+     * ``num_nodes``: number of nodes (None if not found)
+    :raises MshError: if the file does not start with a valid ``$MeshFormat`` section
+    """
+    reader = MshReader(handle)
+    header = {
+        'version': reader.version,
+        'binary': reader.binary,
+        'data_size': reader.data_size,
+        'physical_names': {},
+        'num_entities': None,
+        'num_nodes': None,
+    }
+    try:
+        for section in reader.sections():
+            if section == 'PhysicalNames':
+                header['physical_names'] = reader.read_physical_names()
+            elif section == 'Entities':
+                entities = reader.read_entities()
+                header['num_entities'] = [sum(1 for dim, _ in entities if dim == entity_dim) for entity_dim in range(4)]
+            elif section == 'Nodes':
+                header['num_nodes'] = reader.read_section_header()[1]
+                break
+    except (ValueError, IndexError):
+        # truncated file (MshError is a ValueError)
+        pass
+    return header
+
+
+def read_counts(handle):
+    """Count the nodes and elements of a MSH 4.1 file, in total and per partition.
+
+    Only the headers of the blocks are read, the node and element data is skipped.
+
+    :param handle: file handle opened in binary mode
+    :returns: dictionary with keys
+
+     * ``num_nodes``, ``num_elements``: total number of nodes and elements
+     * ``partitions``: dictionary mapping partition tags to dictionaries with the ``num_nodes`` and
+       ``num_elements`` of the partition (empty if the mesh is not partitioned). Nodes and elements of
+       entities on the interface between partitions are counted for each of these partitions.
+    """
+    reader = MshReader(handle)
+    entities = {}
+    counts = {'num_nodes': 0, 'num_elements': 0, 'partitions': {}}
+    for section in reader.sections():
+        if section == 'PartitionedEntities':
+            entities = reader.read_partitioned_entities()
+        elif section in ('Nodes', 'Elements'):
+            key = 'num_nodes' if section == 'Nodes' else 'num_elements'
+            counts[key] = reader.read_section_header()[1]
+            for block in reader.iter_block_headers():
+                entity = entities.get((block.entity_dim, block.entity_tag))
+                for partition in entity.partitions if entity else []:
+                    partition_counts = counts['partitions'].setdefault(partition, {'num_nodes': 0, 'num_elements': 0})
+                    partition_counts[key] += block.count
+    return counts
+
+
+def read_metadata(handle):
+    """Read the metadata of a MSH 4.1 file without parsing nodes and elements.
+
+    Only the ``$PhysicalNames`` and ``$Entities`` sections and the headers of the blocks of the ``$Nodes``
+    and ``$Elements`` sections are read, the node and element data is skipped. The result is JSON
+    serializable, e.g. to be stored as attributes of a node.
+
+    :param handle: file handle opened in binary mode
+    :returns: dictionary with keys
+
+     * ``version``, ``binary``: format of the file
+     * ``dimension``: highest dimension of the elements (None if the mesh has no elements)
+     * ``num_nodes``, ``num_elements``: total number of nodes and elements
+     * ``num_elements_per_type``: dictionary mapping element types (as strings) to the number of elements
+     * ``bounding_box``: [xmin, ymin, zmin, xmax, ymax, zmax] of all entities (None if there are no entities)
+     * ``physical_names``: sorted list of the names of the physical groups
+    :raises MshError: if the file is not a valid MSH 4.1 file
+    """
+    reader = MshReader(handle)
+    metadata = {
+        'version': reader.version,
+        'binary': reader.binary,
+        'dimension': None,
+        'num_nodes': 0,
+        'num_elements': 0,
+        'num_elements_per_type': {},
+        'bounding_box': None,
+        'physical_names': [],
+    }
+    for section in reader.sections():
+        if section == 'PhysicalNames':
+            metadata['physical_names'] = sorted({name for _, name in reader.read_physical_names().values()})
+        elif section == 'Entities':
+            boxes = np.array([entity.bounding_box for entity in reader.read_entities().values()], dtype=np.float64)
+            if boxes.size:
+                metadata['bounding_box'] = boxes[:, :3].min(axis=0).tolist() + boxes[:, 3:].max(axis=0).tolist()
+        elif section == 'Nodes':
+            metadata['num_nodes'] = reader.read_section_header()[1]
+        elif section == 'Elements':
+            metadata['num_elements'] = reader.read_section_header()[1]
+            per_type = metadata['num_elements_per_type']
+            for block in reader.iter_block_headers():
+                per_type[str(block.kind)] = per_type.get(str(block.kind), 0) + block.count
+                if metadata['dimension'] is None or block.entity_dim > metadata['dimension']:
+                    metadata['dimension'] = block.entity_dim
+    return metadata
+
+
+def read_nodes(reader):
+    """Read the ``$Nodes`` section into preallocated arrays.
+
+    :param reader: :py:class:`MshReader` positioned at the beginning of the ``$Nodes`` section
+    :returns: tuple (coordinates, node tags)
+    """
+    num_nodes = reader.read_section_header()[1]
+    nodes = np.empty((num_nodes, 3), dtype=np.float64)
+    node_tags = np.empty(num_nodes, dtype=np.int64)
+    start = 0
+    for block in reader.iter_node_blocks():
+        stop = start + block.tags.size
+        if stop > num_nodes:
+            raise MshError('Found more nodes than announced in the $Nodes header')
+        node_tags[start:stop] = block.tags
+        nodes[start:stop] = block.coordinates
+        start = stop
+    if start != num_nodes:
+        raise MshError('Found {} nodes, expected {}'.format(start, num_nodes))
+    return nodes, node_tags
+
+
+def _get_physical_tags(entities, entity_dim, entity_tag):
+    """Return the physical tags of an entity (empty if the entity is unknown)."""
+    entity = entities.get((entity_dim, entity_tag))
+    return entity.physical_tags if entity else []
+
+
+def _read_elements(reader, entities):
+    """Read the ``$Elements`` section into arrays preallocated from the block headers.
+
+    :returns: dictionary mapping element types to tuples (tags, connectivity, physical tags)
+    """
+    num_elements = reader.read_section_header()[1]
+    counts = collections.Counter()
+    num_groups = collections.Counter()
+    for header in reader.scan_block_headers():
+        counts[header.kind] += header.count
+        num_physicals = len(_get_physical_tags(entities, header.entity_dim, header.entity_tag))
+        num_groups[header.kind] = max(num_groups[header.kind], num_physicals, 1)
+    if sum(counts.values()) != num_elements:
+        raise MshError('Found {} elements, expected {}'.format(sum(counts.values()), num_elements))
+
+    elements = {
+        element_type: (
+            np.empty(count, dtype=np.int64),
+            np.empty((count, nodes_per_element(element_type)), dtype=np.int64),
+            np.zeros((count, num_groups[element_type]), dtype=np.int64),
+        ) for element_type, count in counts.items()
+    }
+    offsets = collections.Counter()
+    for block in reader.iter_element_blocks():
+        tags, connectivity, physical_tags = elements[block.element_type]
+        start = offsets[block.element_type]
+        stop = start + block.tags.size
+        tags[start:stop] = block.tags
+        connectivity[start:stop] = block.connectivity
+        block_physical_tags = _get_physical_tags(entities, block.entity_dim, block.entity_tag)
+        physical_tags[start:stop, :len(block_physical_tags)] = block_physical_tags
+        offsets[block.element_type] = stop
+    return elements
+
+
+def load_memmap(source):
+    """Memory-map a binary MSH 4.1 file.
+
+    Node and element blocks are returned as :py:class:`numpy.memmap` views into the file, i.e. no data is
+    copied. Note that tags are unsigned integers of the data size of the file (usually uint64).
+
+    :param source: path of the file or a ``SinglefileData`` node (mapped directly from the repository, see
+        :py:func:`aiida_gmsh.repository.repository_path`)
+    :returns: :py:class:`MappedMesh`
+    :raises MshError: if the file is not a binary MSH 4.1 file
+    """
+    if hasattr(source, 'filename'):
+        from aiida_gmsh.repository import repository_path  # pylint: disable=import-outside-toplevel
+        with repository_path(source, source.filename) as path:
+            return load_memmap(path)
+
+    path = source
+    node_blocks = []
+    element_blocks = []
+    physical_names = {}
+    entities = {}
+    with open(path, 'rb') as handle:
+        reader = MshReader(handle)
+        if not reader.binary:
+            raise MshError('Only binary MSH files can be memory-mapped')
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        for section in reader.sections():
+            if section == 'PhysicalNames':
+                physical_names = reader.read_physical_names()
+            elif section == 'Entities':
+                entities = reader.read_entities()
+            elif section == 'PartitionedEntities':
+                entities = reader.read_partitioned_entities()
+            elif section == 'Nodes':
+                node_blocks = [reader.map_block(buffer, header) for header in reader.iter_block_headers()]
+            elif section == 'Elements':
+                element_blocks = [reader.map_block(buffer, header) for header in reader.iter_block_headers()]
+
+    return MappedMesh(node_blocks, element_blocks, physical_names, entities)
@@ -4,13 +4,82 @@ Parsers provided by aiida_gmsh.
 
 Register parsers via the "aiida.parsers" entry point in setup.json.
 """
+import contextlib
+import gzip
+import json
+import os
+import posixpath
+import re
+import time
+
 from aiida.engine import ExitCode
 from aiida.parsers.parser import Parser
-from aiida.plugins import CalculationFactory
+from aiida.plugins import CalculationFactory, DataFactory
 from aiida.common import exceptions
-from aiida.orm import SinglefileData
+from aiida.common.log import LOG_LEVEL_REPORT
+from aiida.orm import Dict, RemoteData, SinglefileData
+from aiida.repository import FileType
+
+# size of the chunks in which output files are streamed into the repository
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# suffixes of output files compressed on the remote computer
+COMPRESSED_SUFFIXES = ('', '.gz', '.zst')
+
+
+@contextlib.contextmanager
+def open_decompressed(handle, filename):
+    """Wrap a handle of a (possibly compressed) file for streamed reading of the decompressed content.
+
+    :param handle: file handle opened in binary mode
+    :param filename: name of the file; files ending in ``.gz`` and ``.zst`` are decompressed
+    :returns: file handle in binary mode
+    """
+    if filename.endswith('.gz'):
+        with gzip.open(handle, 'rb') as decompressed:
+            yield decompressed
+    elif filename.endswith('.zst'):
+        import zstandard  # pylint: disable=import-outside-toplevel
+        with zstandard.ZstdDecompressor().stream_reader(handle) as decompressed:
+            yield decompressed
+    else:
+        yield handle
+
+
+class ChunkedReader:
+    """File-like wrapper reading a stream in chunks of at most ``chunk_size`` bytes.
+
+    The number of bytes read is counted in ``bytes_read``.
+    """
 
-GmshCalculation = CalculationFactory('gmsh')
+    def __init__(self, handle, chunk_size=CHUNK_SIZE):
+        self._handle = handle
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        """Read at most ``min(size, chunk_size)`` bytes."""
+        if size is None or size < 0 or size > self.chunk_size:
+            size = self.chunk_size
+        data = self._handle.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def get_repository_size(node, path=None):
+    """Return the total size of all files below ``path`` in the repository of ``node`` in bytes.
+
+    The sizes are determined through the public ``node.open()`` by seeking to the end of each file.
+    """
+    size = 0
+    for obj in node.list_objects(path):
+        name = obj.name if path is None else posixpath.join(path, obj.name)
+        if obj.file_type == FileType.DIRECTORY:
+            size += get_repository_size(node, name)
+        else:
+            with node.open(name, 'rb') as handle:
+                size += handle.seek(0, os.SEEK_END)
+    return size
 
 
 class GmshParser(Parser):
@@ -28,7 +97,7 @@ class GmshParser(Parser):
         :param type node: :class:`aiida.orm.ProcessNode`
         """
         super().__init__(node)
-        if not issubclass(node.process_class, GmshCalculation):
+        if not issubclass(node.process_class, CalculationFactory('gmsh')):
             raise exceptions.ParsingError('Can only parse GmshCalculation')
 
     def parse(self, **kwargs):
@@ -39,21 +108,275 @@ class GmshParser(Parser):
         """
         output_filename = self.node.get_option('output_filename')
 
+        # with the retrieve_temporary option, the output file is not part of the retrieved folder
+        temporary_folder = None
+        if self.node.get_option('retrieve_temporary'):
+            temporary_folder = kwargs.get('retrieved_temporary_folder')
+            if temporary_folder is None:
+                self.logger.error('No temporary folder passed to the parser')
+                return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
+            files_retrieved = os.listdir(temporary_folder)
+        else:
+            files_retrieved = self.retrieved.list_object_names()
+
+        # timings are also reported for failed runs
+        log = None
+        log_filename = self.node.get_option('log_filename')
+        if log_filename and log_filename in self.retrieved.list_object_names():
+            from aiida_gmsh.timings import parse_log
+            log = parse_log(self.retrieved.get_object_content(log_filename))
+            self.out('timings', Dict(dict=log))
+
+        from aiida_gmsh.monitor import ABORT_FILENAME
+        if ABORT_FILENAME in self.retrieved.list_object_names():
+            with self.retrieved.open(ABORT_FILENAME) as handle:
+                abort = json.load(handle)
+            self.logger.error('Aborted by the monitor: {} (progress: {})'.format(abort['reason'], abort['progress']))
+            return self.exit_codes.ERROR_ABORTED_BY_MONITOR.format(reason=abort['reason'])
+
+        if self.node.get_option('keep_remote'):
+            return self._parse_remote(output_filename, files_retrieved, temporary_folder, log)
+        if self.node.inputs.parameters.get_dict().get('part_split'):
+            return self._parse_partitions(output_filename, files_retrieved, temporary_folder)
+
         # Check that folder content is as expected
-        # FIXME output .msh is not retrieved 
-        files_retrieved = self.retrieved.list_object_names()
-        files_expected = [output_filename]
-        # Note: set(A) <= set(B) checks whether A is a subset of B
-        if not set(files_expected) <= set(files_retrieved):
-            breakpoint()
+        # (the output file may have been compressed on the remote computer)
+        files_expected = [output_filename + suffix for suffix in COMPRESSED_SUFFIXES]
+        retrieved_filename = next((name for name in files_expected if name in files_retrieved), None)
+        if retrieved_filename is None:
             self.logger.error("Found files '{}', expected to find '{}'".format(
-                files_retrieved, files_expected))
+                files_retrieved, output_filename))
             return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
 
-        # add output file
-        self.logger.info("Parsing '{}'".format(output_filename))
-        with self.retrieved.open(output_filename, 'rb') as handle:
-            output_node = SinglefileData(file=handle)
+        output_node = self._store_file(retrieved_filename, output_filename, temporary_folder)
         self.out('mshfile', output_node)
 
+        if output_filename.endswith('.msh'):
+            from aiida_gmsh.msh import METADATA_ATTRIBUTE, MshError, read_mesh, read_metadata
+
+            parse_mesh = self.node.get_option('parse_mesh')
+            compute_quality = self.node.get_option('compute_quality')
+            try:
+                # the metadata is read from the headers only and makes meshes queryable (verdi data gmsh meshes)
+                with output_node.open(mode='rb') as handle:
+                    output_node.set_attribute(METADATA_ATTRIBUTE, read_metadata(handle))
+                if parse_mesh or compute_quality:
+                    self.logger.info("Parsing mesh from '{}'".format(output_filename))
+                    with output_node.open(mode='rb') as handle:
+                        mesh = read_mesh(handle)
+            except MshError as exc:
+                self.logger.error("Invalid mesh in '{}': {}".format(output_filename, exc))
+                return self.exit_codes.ERROR_INVALID_MESH
+
+            if parse_mesh:
+                self.out('mesh', DataFactory('gmsh.mesh').from_mesh(mesh))
+            if compute_quality:
+                from aiida_gmsh.quality import mesh_quality
+                self.out('quality', Dict(dict=mesh_quality(mesh)))
+            if self.node.inputs.parameters.get_dict().get('part'):
+                from aiida_gmsh.msh import read_counts
+                with output_node.open(mode='rb') as handle:
+                    self.out('partition_counts', Dict(dict=self._partition_counts(read_counts(handle)['partitions'])))
+
+        return ExitCode(0)
+
+    def _parse_remote(self, output_filename, files_retrieved, temporary_folder=None, log=None):
+        """Attach the mesh left in the remote working directory (``keep_remote`` option).
+
+        Format, size, checksum, physical groups and the numbers of nodes and elements of the mesh are read from
+        the retrieved header and stats files. The numbers of nodes and elements are only taken from the log of gmsh
+        if they are missing in the stats file (e.g. for other formats than .msh).
+        """
+        from aiida_gmsh.msh import MshError, read_header
+
+        header_filename = output_filename + '.header'
+        stats_filename = output_filename + '.stats'
+        if header_filename not in files_retrieved or stats_filename not in files_retrieved:
+            self.logger.error("Found files '{}', expected to find '{}' and '{}'".format(
+                files_retrieved, header_filename, stats_filename))
+            return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
+
+        with self._open_retrieved(stats_filename, temporary_folder) as handle:
+            stats = dict(line.decode().split(maxsplit=1) for line in handle if line.strip())
+        mesh_stats = {
+            'filename': output_filename,
+            'size': int(stats['size']),
+            'sha256': stats['sha256'].strip(),
+        }
+        for key in ('num_nodes', 'num_elements'):
+            count = stats.get(key, '').strip()
+            mesh_stats[key] = int(count) if count.isdigit() else (log[key] if log else None)
+
+        if output_filename.endswith('.msh'):
+            try:
+                with self._open_retrieved(header_filename, temporary_folder) as handle:
+                    header = read_header(handle)
+            except MshError as exc:
+                self.logger.error("Invalid mesh in '{}': {}".format(output_filename, exc))
+                return self.exit_codes.ERROR_INVALID_MESH
+            mesh_stats.update({
+                'version': header['version'],
+                'binary': header['binary'],
+                'num_entities': header['num_entities'],
+                'physical_names': {str(tag): [dim, name] for tag, (dim, name) in header['physical_names'].items()},
+            })
+            if mesh_stats['num_nodes'] is None:
+                mesh_stats['num_nodes'] = header['num_nodes']
+
+        remote_mesh = RemoteData(
+            computer=self.node.computer, remote_path=os.path.join(self.node.get_remote_workdir(), output_filename))
+        remote_mesh.set_attribute('size', mesh_stats['size'])
+        remote_mesh.set_attribute('sha256', mesh_stats['sha256'])
+        self.out('remote_mesh', remote_mesh)
+        self.out('mesh_stats', Dict(dict=mesh_stats))
+        return ExitCode(0)
+
+    def _parse_partitions(self, output_filename, files_retrieved, temporary_folder=None):
+        """Store the files of a mesh split into partitions (``part_split`` option).
+
+        The file of partition ``n`` is attached as ``partitions.partition_<n>``, and the node and element
+        counts of all partitions are collected in the ``partition_counts`` output.
+        """
+        from aiida_gmsh.msh import MshError, read_counts
+
+        stem, ext = os.path.splitext(output_filename)
+        pattern = re.compile(r'{}_(\d+){}({})$'.format(
+            re.escape(stem), re.escape(ext), '|'.join(re.escape(suffix) for suffix in COMPRESSED_SUFFIXES)))
+        partition_files = {}
+        for name in files_retrieved:
+            match = pattern.match(name)
+            if match:
+                partition_files[int(match.group(1))] = name
+        if not partition_files:
+            self.logger.error("Found files '{}', expected to find partitions of '{}'".format(
+                files_retrieved, output_filename))
+            return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
+
+        counts = {}
+        for partition in sorted(partition_files):
+            filename = '{}_{}{}'.format(stem, partition, ext)
+            output_node = self._store_file(partition_files[partition], filename, temporary_folder)
+            self.out('partitions.partition_{}'.format(partition), output_node)
+            if ext != '.msh':
+                continue
+            try:
+                with output_node.open(mode='rb') as handle:
+                    partition_counts = read_counts(handle)
+            except MshError as exc:
+                self.logger.error("Invalid mesh in '{}': {}".format(filename, exc))
+                return self.exit_codes.ERROR_INVALID_MESH
+            counts[partition] = {
+                'num_nodes': partition_counts['num_nodes'],
+                'num_elements': partition_counts['num_elements'],
+            }
+
+        if counts:
+            self.out('partition_counts', Dict(dict=self._partition_counts(counts)))
+        return ExitCode(0)
+
+    @staticmethod
+    def _partition_counts(counts):
+        """Return the content of the ``partition_counts`` output.
+
+        :param counts: dictionary mapping partition tags to dictionaries with ``num_nodes`` and ``num_elements``
+        """
+        return {
+            'num_partitions': len(counts),
+            'partitions': {
+                'partition_{}'.format(partition): partition_counts
+                for partition, partition_counts in sorted(counts.items())
+            },
+        }
+
+    def _store_file(self, retrieved_filename, filename, temporary_folder=None):
+        """Stream a retrieved file into a new ``SinglefileData``, decompressing it if necessary.
+
+        :param retrieved_filename: name of the retrieved (possibly compressed) file
+        :param filename: name of the file in the ``SinglefileData``
+        :param temporary_folder: absolute path of the temporary folder, if the file was retrieved temporarily
+        :returns: the ``SinglefileData`` node
+        """
+        self.logger.info("Parsing '{}'".format(retrieved_filename))
+        start = time.perf_counter()
+        with self._open_retrieved(retrieved_filename, temporary_folder) as handle:
+            with open_decompressed(handle, retrieved_filename) as decompressed:
+                reader = ChunkedReader(decompressed)
+                output_node = SinglefileData(file=reader, filename=filename)
+        self._report_ingestion(filename, reader.bytes_read, time.perf_counter() - start)
+        return output_node
+
+    def _open_retrieved(self, filename, temporary_folder=None):
+        """Open a retrieved file in binary mode.
+
+        :param filename: name of the file
+        :param temporary_folder: absolute path of the temporary folder, if the file was retrieved temporarily
+        """
+        if temporary_folder is not None:
+            return open(os.path.join(temporary_folder, filename), 'rb')
+        return self.retrieved.open(filename, 'rb')
+
+    def _report_ingestion(self, filename, num_bytes, seconds):
+        """Report the size and throughput of the ingested output file and the size of the retrieved folder."""
+        retrieved_size = get_repository_size(self.retrieved)
+        megabytes = num_bytes / 1024**2
+        self.logger.log(
+            LOG_LEVEL_REPORT, "Stored '{}' ({:.1f} MB) in {:.2f} s ({:.1f} MB/s), retrieved folder: {:.1f} MB".format(
+                filename, megabytes, seconds, megabytes / max(seconds, 1e-9), retrieved_size / 1024**2))
+
+
+class GmshBatchParser(Parser):
+    """
+    Parser class for parsing output of a batch calculation.
+    """
+
+    def __init__(self, node):
+        """
+        Initialize Parser instance
+
+        Checks that the ProcessNode being passed was produced by a GmshBatchCalculation.
+
+        :param node: ProcessNode of calculation
+        :param type node: :class:`aiida.orm.ProcessNode`
+        """
+        super().__init__(node)
+        if not issubclass(node.process_class, CalculationFactory('gmsh.batch')):
+            raise exceptions.ParsingError('Can only parse GmshBatchCalculation')
+
+    def parse(self, **kwargs):
+        """
+        Parse outputs, store results in database.
+
+        Items which failed are reported in the ``exit_statuses`` output, but do not fail the calculation
+        as long as at least one item succeeded.
+
+        :returns: an exit code, if parsing fails (or nothing if parsing succeeds)
+        """
+        output_filename = self.node.get_option('output_filename')
+        prefix = 'geofiles__'
+        keys = [label[len(prefix):] for label in self.node.get_incoming(link_label_filter=prefix + '%').all_link_labels()]
+
+        files_retrieved = self.retrieved.list_object_names()
+        if not set(keys) & set(files_retrieved):
+            self.logger.error("Found files '{}', expected to find item folders '{}'".format(files_retrieved, keys))
+            return self.exit_codes.ERROR_MISSING_OUTPUT_FILES
+
+        exit_statuses = {}
+        for key in sorted(keys):
+            item_files = self.retrieved.list_object_names(key) if key in files_retrieved else []
+            if 'exit_status' not in item_files:
+                exit_statuses[key] = None
+                continue
+            exit_statuses[key] = int(self.retrieved.get_object_content('{}/exit_status'.format(key)).strip())
+            if exit_statuses[key] == 0 and output_filename in item_files:
+                with self.retrieved.open('{}/{}'.format(key, output_filename), 'rb') as handle:
+                    self.out('mshfiles.{}'.format(key), SinglefileData(file=handle))
+
+        self.out('exit_statuses', Dict(dict=exit_statuses))
+
+        failed = [key for key, status in exit_statuses.items() if status != 0]
+        if len(failed) == len(keys):
+            return self.exit_codes.ERROR_ALL_ITEMS_FAILED
+        if failed:
+            self.logger.warning('Meshing failed for items: {}'.format(', '.join(failed)))
+
         return ExitCode(0)
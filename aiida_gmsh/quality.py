@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Element quality metrics for triangle and tetrahedral meshes.
+
+All metrics are computed with vectorized NumPy kernels over the connectivity arrays.
+The elements are processed in chunks of fixed size, such that the memory needed is bounded
+while statistics and histograms are accumulated in a single pass over the elements.
+
+Metrics (1 for the equilateral element):
+
+ * ``sicn``: signed inverse condition number of the Jacobian relative to the equilateral element
+   (negative for inverted elements)
+ * ``gamma``: ratio of inscribed to circumscribed radius (normalized)
+ * ``aspect_ratio``: ratio of the longest to the shortest edge (>= 1)
+"""
+import numpy as np
+
+from aiida_gmsh.msh import ELEMENT_TYPES, tags_to_indices
+
+# number of elements processed at a time (small chunks keep the temporary arrays in the CPU cache)
+CHUNK_SIZE = 2**14
+
+# bin edges of the histograms, values outside the range are counted in the first/last bin
+HISTOGRAM_BINS = {
+    'sicn': np.linspace(-1., 1., 21).round(2),
+    'gamma': np.linspace(0., 1., 11).round(2),
+    'aspect_ratio': np.array([1., 1.5, 2., 3., 5., 10., 100.]),
+}
+
+# inverse of the Jacobian of the equilateral reference triangle/tetrahedron (unit edge length)
+_W_TRIANGLE = np.array([[1., 0.5], [0., np.sqrt(3.) / 2.]])
+_W_TETRA = np.array([[1., 0.5, 0.5], [0., np.sqrt(3.) / 2., np.sqrt(3.) / 6.], [0., 0., np.sqrt(2. / 3.)]])
+_W_INV_TRIANGLE = np.linalg.inv(_W_TRIANGLE)
+_W_INV_TETRA = np.linalg.inv(_W_TETRA)
+
+# local node indices of the edges
+_EDGES = {
+    2: [(0, 1), (1, 2), (2, 0)],
+    4: [(0, 1), (1, 2), (2, 0), (0, 3), (1, 3), (2, 3)],
+}
+
+
+# Vectors are tuples of the three coordinate arrays (structure of arrays), which keeps all operations
+# on contiguous one-dimensional arrays.
+
+def _sub(vec1, vec2):
+    return tuple(a - b for a, b in zip(vec1, vec2))
+
+
+def _dot(vec1, vec2):
+    return vec1[0] * vec2[0] + vec1[1] * vec2[1] + vec1[2] * vec2[2]
+
+
+def _cross(vec1, vec2):
+    return (vec1[1] * vec2[2] - vec1[2] * vec2[1], vec1[2] * vec2[0] - vec1[0] * vec2[2],
+            vec1[0] * vec2[1] - vec1[1] * vec2[0])
+
+
+def _norm(vec):
+    return np.sqrt(_dot(vec, vec))
+
+
+def _combine(vectors, coefficients):
+    """Linear combination of vectors, skipping zero coefficients."""
+    return tuple(
+        sum(coefficient * vec[i] for vec, coefficient in zip(vectors, coefficients) if coefficient != 0.)
+        for i in range(3))
+
+
+def _jacobian(edges, w_inv):
+    """Columns of the Jacobian relative to the reference element (edges @ w_inv)."""
+    return [_combine(edges, w_inv[:, j]) for j in range(w_inv.shape[1])]
+
+
+def _gather(coordinates, connectivity):
+    """Return the node coordinates of all elements as list (one per local node) of vectors."""
+    return [tuple(coordinate[connectivity[:, j]] for coordinate in coordinates) for j in range(connectivity.shape[1])]
+
+
+def _aspect_ratio(points, element_type):
+    """Ratio of the longest to the shortest edge."""
+    lengths = [_norm(_sub(points[j], points[i])) for i, j in _EDGES[element_type]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.maximum.reduce(lengths) / np.minimum.reduce(lengths)
+
+
+def triangle_quality(points, signed=True):
+    """Quality metrics of triangles.
+
+    :param points: node coordinates of the triangles, list of three vectors (tuples of coordinate arrays)
+    :param signed: if True, triangles with a normal pointing in negative z-direction are inverted
+        (only meaningful for planar meshes in the xy-plane)
+    :returns: dictionary mapping metric names to arrays of shape (num_elements,)
+    """
+    edge1 = _sub(points[1], points[0])
+    edge2 = _sub(points[2], points[0])
+    normal = _cross(edge1, edge2)
+    area2 = _norm(normal)
+    if signed:
+        area2 = np.where(normal[2] < 0, -area2, area2)
+
+    # Jacobian relative to the equilateral triangle, the columns are vectors in 3D
+    jacobian = _jacobian([edge1, edge2], _W_INV_TRIANGLE)
+    frobenius2 = sum(_dot(column, column) for column in jacobian)
+    determinant = area2 / np.linalg.det(_W_TRIANGLE)
+
+    lengths = [_norm(edge1), _norm(_sub(points[2], points[1])), _norm(edge2)]
+    semi_perimeter = (lengths[0] + lengths[1] + lengths[2]) / 2.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sicn = 2. * determinant / frobenius2
+        # 2 * r_in / r_circ with r_in = A / s and r_circ = abc / (4 A)
+        gamma = 2. * area2**2 / (semi_perimeter * lengths[0] * lengths[1] * lengths[2])
+
+    return {
+        'sicn': np.nan_to_num(sicn),
+        'gamma': np.nan_to_num(gamma),
+        'aspect_ratio': _aspect_ratio(points, 2),
+    }
+
+
+def tetra_quality(points):
+    """Quality metrics of tetrahedra.
+
+    :param points: node coordinates of the tetrahedra, list of four vectors (tuples of coordinate arrays)
+    :returns: dictionary mapping metric names to arrays of shape (num_elements,)
+    """
+    edge1 = _sub(points[1], points[0])
+    edge2 = _sub(points[2], points[0])
+    edge3 = _sub(points[3], points[0])
+    cross12, cross23, cross31 = _cross(edge1, edge2), _cross(edge2, edge3), _cross(edge3, edge1)
+    volume6 = _dot(edge1, cross23)
+
+    # Jacobian relative to the equilateral tetrahedron and its cofactor matrix
+    columns = _jacobian([edge1, edge2, edge3], _W_INV_TETRA)
+    cofactor = [_cross(columns[1], columns[2]), _cross(columns[2], columns[0]), _cross(columns[0], columns[1])]
+    frobenius = np.sqrt(sum(_dot(column, column) for column in columns))
+    cofactor_frobenius = np.sqrt(sum(_dot(column, column) for column in cofactor))
+    determinant = volume6 / np.linalg.det(_W_TETRA)
+
+    # inscribed radius 3 V / (sum of face areas)
+    face_areas = (_norm(cross12) + _norm(cross23) + _norm(cross31) +
+                  _norm(_cross(_sub(points[2], points[1]), _sub(points[3], points[1])))) / 2.
+    # circumcenter relative to the first node
+    center = tuple(
+        _dot(edge1, edge1) * cross23[i] + _dot(edge2, edge2) * cross31[i] + _dot(edge3, edge3) * cross12[i]
+        for i in range(3))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sicn = 3. * determinant / (frobenius * cofactor_frobenius)
+        r_in = np.abs(volume6) / (2. * face_areas)
+        r_circ = _norm(center) / (2. * np.abs(volume6))
+        gamma = 3. * r_in / r_circ
+
+    return {
+        'sicn': np.nan_to_num(sicn),
+        'gamma': np.nan_to_num(gamma),
+        'aspect_ratio': _aspect_ratio(points, 4),
+    }
+
+
+def _histogram(values, edges):
+    """Count values per bin, values outside the range are counted in the first/last bin."""
+    indices = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+    return np.bincount(indices, minlength=len(edges) - 1)
+
+
+def compute_quality(nodes, elements, chunk_size=CHUNK_SIZE):
+    """Compute quality statistics of all triangles and tetrahedra.
+
+    Other element types are ignored.
+
+    :param nodes: node coordinates (array of shape (num_nodes, 3))
+    :param elements: dictionary mapping gmsh element types to connectivity arrays given as indices into ``nodes``
+    :param chunk_size: number of elements processed at a time
+    :returns: dictionary mapping element type names (e.g. ``tetra``) to statistics
+    """
+    # the orientation of triangles is only meaningful for planar meshes
+    signed = nodes.shape[0] == 0 or np.ptp(nodes[:, 2]) == 0
+    coordinates = [np.ascontiguousarray(nodes[:, i]) for i in range(3)]
+
+    statistics = {}
+    for element_type, connectivity in sorted(elements.items()):
+        if element_type not in _EDGES:
+            continue
+        num_elements = connectivity.shape[0]
+        minima = {name: np.inf for name in HISTOGRAM_BINS}
+        maxima = {name: -np.inf for name in HISTOGRAM_BINS}
+        sums = {name: 0. for name in HISTOGRAM_BINS}
+        counts = {name: np.zeros(len(edges) - 1, dtype=np.int64) for name, edges in HISTOGRAM_BINS.items()}
+        num_inverted = 0
+        num_degenerate = 0
+
+        for start in range(0, num_elements, chunk_size):
+            points = _gather(coordinates, connectivity[start:start + chunk_size])
+            if element_type == 2:
+                metrics = triangle_quality(points, signed=signed)
+            else:
+                metrics = tetra_quality(points)
+            num_inverted += int(np.count_nonzero(metrics['sicn'] < 0))
+            finite = np.isfinite(metrics['aspect_ratio'])
+            num_degenerate += int(np.count_nonzero(~finite))
+            metrics['aspect_ratio'] = metrics['aspect_ratio'][finite]
+            for name, values in metrics.items():
+                if values.size:
+                    minima[name] = min(minima[name], float(values.min()))
+                    maxima[name] = max(maxima[name], float(values.max()))
+                    sums[name] += float(values.sum())
+                counts[name] += _histogram(values, HISTOGRAM_BINS[name])
+
+        result = {'num_elements': num_elements, 'num_inverted': num_inverted, 'num_degenerate': num_degenerate}
+        for name, edges in HISTOGRAM_BINS.items():
+            num_values = num_elements - num_degenerate if name == 'aspect_ratio' else num_elements
+            result[name] = {
+                'min': minima[name] if num_values else None,
+                'max': maxima[name] if num_values else None,
+                'mean': sums[name] / num_values if num_values else None,
+                'histogram': {'bins': edges.tolist(), 'counts': counts[name].tolist()},
+            }
+        statistics[ELEMENT_TYPES[element_type][0]] = result
+
+    return statistics
+
+
+def mesh_quality(mesh):
+    """Compute quality statistics of a mesh read by :py:func:`aiida_gmsh.msh.read_mesh`.
+
+    :param mesh: dictionary returned by ``read_mesh``
+    :returns: see ``compute_quality``
+    """
+    elements = {
+        element_type: tags_to_indices(mesh['node_tags'], connectivity)
+        for element_type, connectivity in mesh['elements'].items()
+        if element_type in _EDGES
+    }
+    return compute_quality(mesh['nodes'], elements)
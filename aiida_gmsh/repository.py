@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Access to files in the repository of AiiDA nodes.
+
+Large meshes are memory-mapped, hashed or copied directly from the repository instead of being read into
+memory. AiiDA 1.x stores the files of a node in a folder on disk, but the public API of ``Node`` only exposes
+file handles (``node.open()``). :py:func:`repository_path` is the single place relying on the private
+repository API to get the path of a file; if that API is not available (e.g. with the object store of
+AiiDA 2.x), the file is copied to a temporary file through ``node.open()`` instead.
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+
+CHUNK_SIZE = 2**20
+
+
+def _get_repository_folder(node):
+    """Return the repository folder of a node, or None if the private API of AiiDA 1.x is not available."""
+    try:
+        return node._repository._get_base_folder()  # pylint: disable=protected-access
+    except AttributeError:
+        return None
+
+
+@contextlib.contextmanager
+def repository_path(node, filename):
+    """Yield the absolute path of a file in the repository of a node.
+
+    The file is not copied if the repository of the node is a folder on disk (AiiDA 1.x). Otherwise, it is
+    copied to a temporary file through the public ``node.open()``, which is removed on exit. The file must
+    therefore only be read, and only inside the context (memory maps of the file stay valid on POSIX systems).
+
+    :param node: a stored or unstored ``Node``
+    :param filename: name of the file in the repository of the node
+    """
+    folder = _get_repository_folder(node)
+    if folder is not None:
+        yield folder.get_abs_path(filename)
+        return
+
+    handle, path = tempfile.mkstemp(suffix='_' + os.path.basename(filename))
+    try:
+        with os.fdopen(handle, 'wb') as target, node.open(filename, 'rb') as source:
+            shutil.copyfileobj(source, target, CHUNK_SIZE)
+        yield path
+    finally:
+        os.remove(path)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Throttled submission of many ``GmshCalculation``s (``verdi data gmsh submit-sweep``).
+
+Submitting thousands of calculations at once floods the daemon and the scheduler queue. ``run_sweep``
+keeps at most ``max_in_flight`` calculations running: it polls the states of the submitted
+calculations and backfills with new submissions as calculations terminate.
+
+Each sweep item (a geofile combined with a point of the parameter grid) is identified by a key, which
+does not depend on the order of the items. Submissions and terminations are appended to a journal
+(JSON lines) as they happen, such that an interrupted sweep is resumed by running it again with the
+same journal: calculations which terminated are not resubmitted and calculations which are still
+running are waited for. Geofiles given as paths are stored once before the sweep (see
+:py:func:`store_geofiles`), and the nodes stored by the interrupted run are reused when it is resumed.
+"""
+import collections
+import hashlib
+import json
+import os
+import time
+
+# states of the sweep items in the journal
+SUBMITTED = 'submitted'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+CHUNK_SIZE = 2**20
+
+# attribute of the geofiles stored by ``store_geofiles`` containing the SHA-256 checksum of the content
+CHECKSUM_ATTRIBUTE = 'sha256'
+
+SweepItem = collections.namedtuple('SweepItem', ['key', 'geofile', 'parameters'])
+
+SweepProgress = collections.namedtuple(
+    'SweepProgress', ['total', 'submitted', 'running', 'finished', 'failed', 'rate', 'eta'])
+
+
+def get_sweep_items(geofiles, parameters, grid=None):
+    """Combine every geofile with every point of the parameter grid.
+
+    :param geofiles: dictionary mapping labels (e.g. file names or UUIDs) to stored ``SinglefileData``
+    :param parameters: ``GmshParameters`` shared by all items
+    :param grid: dictionary mapping command line options to lists of values (see ``GmshParameters.expand_grid``)
+    :returns: list of :py:class:`SweepItem`, the key of an item is ``<label>:<checksum of the parameters>``
+    """
+    if grid:
+        points = parameters.expand_grid(grid)
+    else:
+        points = [parameters.validate(parameters.get_dict())]
+
+    items = []
+    for label in sorted(geofiles):
+        for point in points:
+            # pylint: disable=protected-access
+            canonical = json.dumps(parameters._canonicalize(point), sort_keys=True)
+            key = '{}:{}'.format(label, hashlib.sha256(canonical.encode()).hexdigest()[:16])
+            items.append(SweepItem(key, geofiles[label], point))
+    return items
+
+
+def _checksum(handle):
+    """Return the SHA-256 checksum of a file opened in binary mode."""
+    checksum = hashlib.sha256()
+    for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+        checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def store_geofiles(paths):
+    """Store geofiles as ``SinglefileData``, reusing nodes of files with the same name and content.
+
+    All calculations of a geofile then share its node, and resuming a sweep does not store the geofiles again.
+    The checksum of the content is stored in the ``CHECKSUM_ATTRIBUTE`` of the nodes, such that existing nodes
+    are found by a query instead of reading their files.
+
+    :param paths: dictionary mapping labels to paths of geofiles
+    :returns: dictionary mapping the labels to stored ``SinglefileData``
+    """
+    from aiida.orm import QueryBuilder, SinglefileData  # pylint: disable=import-outside-toplevel
+
+    nodes = {}
+    for label, path in paths.items():
+        with open(path, 'rb') as handle:
+            checksum = _checksum(handle)
+
+        qb = QueryBuilder()
+        qb.append(SinglefileData,
+                  filters={
+                      'attributes.filename': os.path.basename(path),
+                      'attributes.{}'.format(CHECKSUM_ATTRIBUTE): checksum
+                  },
+                  subclassing=False)
+        existing = qb.first()
+        if existing is not None:
+            nodes[label] = existing[0]
+        else:
+            node = SinglefileData(file=path)
+            node.set_attribute(CHECKSUM_ATTRIBUTE, checksum)
+            nodes[label] = node.store()
+    return nodes
+
+
+def read_journal(path):
+    """Read the journal of a sweep.
+
+    :param path: path of the journal (need not exist)
+    :returns: dictionary mapping keys to dictionaries with the ``pk`` and ``state`` of the latest entry
+    """
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path) as handle:
+        for line in handle:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # line truncated by an interruption while writing
+                continue
+            entries[entry['key']] = {'pk': entry['pk'], 'state': entry['state']}
+    return entries
+
+
+class _Journal:
+    """Append-only journal of a sweep, every entry is flushed to disk when written."""
+
+    def __init__(self, path):
+        self.entries = read_journal(path)
+        self._handle = open(path, 'a')  # pylint: disable=consider-using-with
+
+    def write(self, key, pk, state):
+        self.entries[key] = {'pk': pk, 'state': state}
+        self._handle.write(json.dumps({'key': key, 'pk': pk, 'state': state}) + '\n')
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+
+    def close(self):
+        self._handle.close()
+
+
+def submit_calculation(item, code, options=None, group=None):
+    """Submit the ``GmshCalculation`` of a sweep item to the daemon.
+
+    :param item: :py:class:`SweepItem`, the geofile must be a stored ``SinglefileData``
+    :param code: the gmsh code
+    :param options: dictionary of ``metadata.options``
+    :param group: add the calculation to this group
+    :returns: pk of the calculation
+    """
+    from aiida.engine import submit  # pylint: disable=import-outside-toplevel
+    from aiida.plugins import CalculationFactory, DataFactory  # pylint: disable=import-outside-toplevel
+
+    node = submit(CalculationFactory('gmsh'),
+                  code=code,
+                  geofile=item.geofile,
+                  parameters=DataFactory('gmsh')(dict=item.parameters),
+                  metadata={'options': options or {}, 'label': item.key})
+    if group is not None:
+        group.add_nodes(node)
+    return node.pk
+
+
+def get_process_states(pks):
+    """Return the sweep states of processes.
+
+    :param pks: pks of process nodes
+    :returns: dictionary mapping the pk of each process to ``SUBMITTED`` (not terminated yet), ``FINISHED``
+        (finished with exit status 0) or ``FAILED``
+    """
+    from aiida.orm import ProcessNode, QueryBuilder  # pylint: disable=import-outside-toplevel
+
+    states = {}
+    if not pks:
+        return states
+    qb = QueryBuilder()
+    qb.append(ProcessNode,
+              filters={'id': {
+                  'in': list(pks)
+              }},
+              project=['id', 'attributes.process_state', 'attributes.exit_status'])
+    for pk, process_state, exit_status in qb.iterall():
+        if process_state == 'finished':
+            states[pk] = FINISHED if exit_status == 0 else FAILED
+        elif process_state in ('excepted', 'killed'):
+            states[pk] = FAILED
+        else:
+            states[pk] = SUBMITTED
+    return states
+
+
+def run_sweep(items, submit, journal_path, max_in_flight=50, poll_interval=10., retry_failed=False,
+              get_states=get_process_states, report=None, sleep=time.sleep, clock=time.monotonic):
+    """Submit the calculations of all sweep items, with at most ``max_in_flight`` running at a time.
+
+    :param items: list of :py:class:`SweepItem`
+    :param submit: function submitting the calculation of an item and returning its pk,
+        e.g. ``functools.partial(submit_calculation, code=code)``
+    :param journal_path: path of the journal; items in the journal are not submitted again
+    :param max_in_flight: maximum number of calculations which are submitted but not terminated
+    :param poll_interval: seconds between polls of the states of the calculations
+    :param retry_failed: resubmit items whose calculation failed in a previous run
+    :param get_states: function mapping a list of pks to their states (see ``get_process_states``)
+    :param report: function called with a :py:class:`SweepProgress` after every poll
+    :returns: the final :py:class:`SweepProgress`
+    """
+    journal = _Journal(journal_path)
+    try:
+        done = {FINISHED} if retry_failed else {FINISHED, FAILED}
+        keys = {item.key for item in items}
+        pending = collections.deque()
+        in_flight = {}
+        for item in items:
+            entry = journal.entries.get(item.key, {'state': None})
+            if entry['state'] == SUBMITTED:
+                in_flight[entry['pk']] = item.key
+            elif entry['state'] not in done:
+                pending.append(item)
+
+        start = clock()
+        terminated_in_run = 0
+        while True:
+            states = get_states(list(in_flight))
+            for pk, key in list(in_flight.items()):
+                # processes which do not exist (anymore) are treated as failed
+                state = states.get(pk, FAILED)
+                if state != SUBMITTED:
+                    journal.write(key, pk, state)
+                    del in_flight[pk]
+                    terminated_in_run += 1
+
+            while pending and len(in_flight) < max_in_flight:
+                item = pending.popleft()
+                pk = submit(item)
+                journal.write(item.key, pk, SUBMITTED)
+                in_flight[pk] = item.key
+
+            progress = _get_progress(journal.entries, keys, len(in_flight), terminated_in_run, clock() - start)
+            if report is not None:
+                report(progress)
+            if not in_flight:
+                return progress
+            sleep(poll_interval)
+    finally:
+        journal.close()
+
+
+def _get_progress(entries, keys, running, terminated_in_run, elapsed):
+    """Compute the progress of a sweep from the journal entries of its items."""
+    counts = collections.Counter(entry['state'] for key, entry in entries.items() if key in keys)
+    rate = terminated_in_run / elapsed if elapsed > 0 else 0.
+    remaining = len(keys) - counts[FINISHED] - counts[FAILED]
+    eta = remaining / rate if rate > 0 else None
+    return SweepProgress(
+        total=len(keys),
+        submitted=sum(counts.values()),
+        running=running,
+        finished=counts[FINISHED],
+        failed=counts[FAILED],
+        rate=rate,
+        eta=eta,
+    )
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Extract timings and memory usage from the log written by gmsh to stdout.
+
+gmsh reports the resources used by each stage when it is done, e.g.::
+
+    Info    : Done meshing 2D (Wall 0.0112s, CPU 0.011093s)
+    Info    : Done optimizing mesh (Wall 0.0209s, CPU 0.0208s)
+    Info    : Stopped on Mon Mar  1 10:00:00 2021 (From start: Wall 0.13s, CPU 0.2s)
+
+With the ``-cpu`` command line option, the resources are reported for all operations,
+including the memory usage (``Mem 12.5Mb``).
+
+The patterns of the log shared with the monitoring of running calculations (:py:mod:`aiida_gmsh.monitor`)
+are public: ``COUNTS_PATTERN`` (size of the mesh), ``MEMORY_PATTERN`` (memory usage) and
+:py:func:`stage_name` (normalized names of the stages).
+"""
+import re
+
+_DONE = re.compile(r'Done (?P<stage>[^(]+?)\s*\((?P<resources>[^)]*Wall[^)]*)\)')
+_FROM_START = re.compile(r'From start: (?P<resources>[^)]*)')
+_WALL = re.compile(r'Wall ([\d.eE+-]+)s')
+_CPU = re.compile(r'CPU ([\d.eE+-]+)s')
+# memory usage in Mb, e.g. "Mem 12.5Mb"
+MEMORY_PATTERN = re.compile(r'Mem(?:ory)?\D*?([\d.]+)\s*Mb', re.IGNORECASE)
+# size of the mesh, e.g. "Info    : 5283 nodes 30127 elements"
+COUNTS_PATTERN = re.compile(r'Info\s*:\s*(\d+) nodes (\d+) elements')
+# parts of the description which differ between runs (file names and sizes)
+_VARIABLE = re.compile(r"\s*'[^']*'|\s*\d+ (?:nodes|elements|vertices)")
+
+
+def stage_name(text):
+    """Normalize the description of a stage, e.g. "meshing 1D" -> "meshing_1d"."""
+    return re.sub(r'\W+', '_', _VARIABLE.sub('', text).strip().lower()).strip('_')
+
+
+def _resources(text):
+    """Return wall and CPU time of a resources string like "Wall 0.1s, CPU 0.2s"."""
+    wall = _WALL.search(text)
+    cpu = _CPU.search(text)
+    return {
+        'wall': float(wall.group(1)) if wall else None,
+        'cpu': float(cpu.group(1)) if cpu else None,
+    }
+
+
+def parse_log(content):
+    """Parse the log of gmsh.
+
+    Stages occurring several times (e.g. optimization passes) are accumulated.
+
+    :param content: content of the log
+    :param type content: str
+    :returns: dictionary with keys
+
+     * ``stages``: dictionary mapping stages (e.g. ``meshing_3d``, ``optimizing_mesh``, ``writing``) to
+       dictionaries with the ``wall`` and ``cpu`` time in seconds and the number of occurrences ``count``
+     * ``total``: wall and CPU time from the start of gmsh (if reported)
+     * ``peak_memory_mb``: maximum memory usage reported in Mb (``-cpu`` option) or None
+     * ``num_nodes``, ``num_elements``: size of the mesh (as last reported)
+     * ``num_warnings``, ``num_errors``: number of warnings and errors
+    """
+    result = {
+        'stages': {},
+        'total': {'wall': None, 'cpu': None},
+        'peak_memory_mb': None,
+        'num_nodes': None,
+        'num_elements': None,
+        'num_warnings': 0,
+        'num_errors': 0,
+    }
+    stages = result['stages']
+
+    for line in content.splitlines():
+        if line.startswith('Warning'):
+            result['num_warnings'] += 1
+        elif line.startswith('Error'):
+            result['num_errors'] += 1
+
+        match = _DONE.search(line)
+        if match:
+            resources = _resources(match.group('resources'))
+            stage = stages.setdefault(stage_name(match.group('stage')), {'wall': 0., 'cpu': 0., 'count': 0})
+            stage['wall'] += resources['wall'] or 0.
+            stage['cpu'] += resources['cpu'] or 0.
+            stage['count'] += 1
+
+        match = _FROM_START.search(line)
+        if match:
+            result['total'] = _resources(match.group('resources'))
+
+        for memory in MEMORY_PATTERN.findall(line):
+            result['peak_memory_mb'] = max(float(memory), result['peak_memory_mb'] or 0.)
+
+        match = COUNTS_PATTERN.search(line)
+        if match:
+            result['num_nodes'], result['num_elements'] = int(match.group(1)), int(match.group(2))
+
+    return result
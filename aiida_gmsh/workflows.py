@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Workflows provided by aiida_gmsh.
+
+Register workflows via the "aiida.workflows" entry point in setup.json.
+"""
+from aiida.engine import WorkChain, calcfunction, while_
+from aiida.orm import Dict, Int, List, SinglefileData, Str
+from aiida.plugins import CalculationFactory, DataFactory
+
+from aiida_gmsh.msh import METADATA_ATTRIBUTE
+
+
+@calcfunction
+def summarize_convergence(refinement_factors, **mshfiles):
+    """Collect node and element counts of all refinement levels.
+
+    The counts are taken from the metadata of the meshes (see ``read_metadata``), i.e. the meshes need not be
+    parsed into ``GmshMeshData`` (``parse_mesh`` option).
+
+    :param refinement_factors: refinement factor of each level
+    :param mshfiles: ``SinglefileData`` of the meshes of the levels, labelled ``level_<index>``
+    :returns: Dict with one entry per level which succeeded
+    """
+    levels = []
+    for index, factor in enumerate(refinement_factors.get_list()):
+        label = 'level_{}'.format(index)
+        metadata = mshfiles[label].get_attribute(METADATA_ATTRIBUTE, None) if label in mshfiles else None
+        if metadata is None:
+            continue
+        levels.append({
+            'label': label,
+            'refinement_factor': factor,
+            'num_nodes': metadata['num_nodes'],
+            'num_elements': metadata['num_elements'],
+            'num_elements_per_type': metadata['num_elements_per_type'],
+        })
+    return Dict(dict={'levels': levels})
+
+
+class GmshConvergenceWorkChain(WorkChain):
+    """
+    Mesh a geometry for a series of refinement factors.
+
+    The levels are meshed by ``GmshCalculation``s running in parallel, in batches of at most
+    ``max_concurrent`` calculations: the next batch is submitted when all calculations of the previous batch
+    finished. The refinement factor of each level is passed to gmsh via the ``refinement_parameter``
+    (``clscale`` by default), overriding the value in ``gmsh.parameters``.
+    """
+
+    @classmethod
+    def define(cls, spec):
+        """Define inputs, outputs and outline of the workchain."""
+        # yapf: disable
+        super().define(spec)
+        spec.expose_inputs(CalculationFactory('gmsh'), namespace='gmsh')
+        spec.input('refinement_factors', valid_type=List, help='Refinement factor of each level.')
+        spec.input('refinement_parameter', valid_type=Str, default=lambda: Str('clscale'),
+            validator=lambda value, _: None if value.value in ('clscale', 'clmin', 'clmax')
+            else 'refinement_parameter has to be one of clscale, clmin, clmax.',
+            help='Command line option of gmsh which is set to the refinement factor.')
+        spec.input('max_concurrent', valid_type=Int, default=lambda: Int(4),
+            help='Maximum number of calculations running at the same time.')
+        spec.outline(
+            cls.setup,
+            while_(cls.has_pending_levels)(
+                cls.submit_levels,
+                cls.inspect_levels,
+            ),
+            cls.results,
+        )
+        spec.output_namespace('mshfiles', valid_type=SinglefileData, dynamic=True,
+            help='The generated mesh of each level which succeeded.')
+        spec.output('summary', valid_type=Dict, help='Node and element counts of each level.')
+
+        spec.exit_code(400, 'ERROR_ALL_LEVELS_FAILED', message='The calculations of all levels failed.')
+        spec.exit_code(401, 'ERROR_SOME_LEVELS_FAILED', message='The calculations of some levels failed.')
+
+    def setup(self):
+        """Set up the list of levels to mesh."""
+        self.ctx.pending = ['level_{}'.format(index) for index in range(len(self.inputs.refinement_factors))]
+        self.ctx.submitted = []
+        self.ctx.running = []
+        self.ctx.failed = []
+
+    def has_pending_levels(self):
+        """Return whether there are levels which have not been submitted yet."""
+        return bool(self.ctx.pending)
+
+    def submit_levels(self):
+        """Submit the next ``max_concurrent`` pending levels and wait for all of them to finish."""
+        GmshCalculation = CalculationFactory('gmsh')
+        GmshParameters = DataFactory('gmsh')
+        factors = self.inputs.refinement_factors.get_list()
+        parameters = self.inputs.gmsh.parameters.get_dict()
+
+        calculations = {}
+        for label in self.ctx.pending[:self.inputs.max_concurrent.value]:
+            index = int(label.split('_')[-1])
+            inputs = self.exposed_inputs(GmshCalculation, namespace='gmsh')
+            inputs['parameters'] = GmshParameters(dict={**parameters, self.inputs.refinement_parameter.value: factors[index]})
+            inputs['metadata'] = {**inputs.get('metadata', {}), 'call_link_label': label}
+            calculations[label] = self.submit(GmshCalculation, **inputs)
+            self.report('submitted {}<{}> for {} = {}'.format(
+                GmshCalculation.__name__, calculations[label].pk, self.inputs.refinement_parameter.value, factors[index]))
+
+        self.ctx.pending = self.ctx.pending[len(calculations):]
+        self.ctx.submitted.extend(calculations)
+        self.ctx.running = list(calculations)
+        return self.to_context(**calculations)
+
+    def inspect_levels(self):
+        """Check the calculations of the levels of the last batch."""
+        for label in self.ctx.running:
+            calculation = self.ctx[label]
+            if not calculation.is_finished_ok:
+                self.report('{}<{}> of {} failed with exit status {}'.format(
+                    calculation.process_label, calculation.pk, label, calculation.exit_status))
+                self.ctx.failed.append(label)
+        self.ctx.running = []
+
+    def results(self):
+        """Attach the meshes and the summary of all levels."""
+        mshfiles = {}
+        for label in self.ctx.submitted:
+            calculation = self.ctx[label]
+            if calculation.is_finished_ok and 'mshfile' in calculation.outputs:
+                mshfiles[label] = calculation.outputs.mshfile
+                self.out('mshfiles.{}'.format(label), calculation.outputs.mshfile)
+
+        if len(self.ctx.failed) == len(self.ctx.submitted):
+            return self.exit_codes.ERROR_ALL_LEVELS_FAILED
+
+        self.out('summary', summarize_convergence(self.inputs.refinement_factors, **mshfiles))
+
+        if self.ctx.failed:
+            return self.exit_codes.ERROR_SOME_LEVELS_FAILED
+        return None
+
+
+@calcfunction
+def expand_parameter_grid(parameters, grid):
+    """Expand a grid of command line options around the given parameters.
+
+    :param parameters: base ``GmshParameters``
+    :param grid: Dict mapping command line options to lists of values (see ``GmshParameters.expand_grid``)
+    :returns: ``GmshParameters`` of the unique points of the grid, labelled ``point_<index>``
+    """
+    GmshParameters = DataFactory('gmsh')
+    return {
+        'point_{}'.format(index): GmshParameters(dict=point)
+        for index, point in enumerate(parameters.expand_grid(grid.get_dict()))
+    }
+
+
+class GmshSweepWorkChain(WorkChain):
+    """
+    Mesh a parametrized geometry for all points of a parameter grid.
+
+    The grid typically sweeps ONELAB parameters of the geometry, e.g.
+    ``{'setnumber': {'radius': [0.1, 0.2], 'thickness': [0.01, 0.02]}}``, which have to be defined with
+    ``DefineConstant`` in the geofile (plain assignments override ``-setnumber``). Identical points are meshed
+    only once and all points are meshed by a single ``GmshBatchCalculation``, which uploads the
+    template geofile once.
+    """
+
+    @classmethod
+    def define(cls, spec):
+        """Define inputs, outputs and outline of the workchain."""
+        # yapf: disable
+        GmshParameters = DataFactory('gmsh')
+        super().define(spec)
+        spec.expose_inputs(CalculationFactory('gmsh.batch'), namespace='batch',
+            exclude=('geofiles', 'parameters', 'item_parameters'))
+        spec.input('geofile', valid_type=SinglefileData, help='The template .geo file.')
+        spec.input('parameters', valid_type=GmshParameters, help='Command line parameters shared by all points.')
+        spec.input('grid', valid_type=Dict, help='Lists of values of the command line options to sweep.')
+        spec.outline(
+            cls.expand_grid,
+            cls.run_batch,
+            cls.results,
+        )
+        spec.output_namespace('points', valid_type=GmshParameters, dynamic=True,
+            help='Command line parameters of each point of the grid.')
+        spec.output_namespace('mshfiles', valid_type=SinglefileData, dynamic=True,
+            help='The generated mesh of each point which succeeded.')
+        spec.output('exit_statuses', valid_type=Dict, help='Exit status of gmsh for each point.')
+
+        spec.exit_code(410, 'ERROR_BATCH_FAILED', message='The batch calculation failed.')
+
+    def expand_grid(self):
+        """Compute the unique points of the grid."""
+        self.ctx.points = expand_parameter_grid(self.inputs.parameters, self.inputs.grid)
+        self.out_many({'points.{}'.format(label): point for label, point in self.ctx.points.items()})
+        self.report('expanded grid to {} unique points'.format(len(self.ctx.points)))
+
+    def run_batch(self):
+        """Submit a single batch calculation for all points."""
+        GmshBatchCalculation = CalculationFactory('gmsh.batch')
+        inputs = self.exposed_inputs(GmshBatchCalculation, namespace='batch')
+        inputs['geofiles'] = {label: self.inputs.geofile for label in self.ctx.points}
+        inputs['item_parameters'] = self.ctx.points
+        calculation = self.submit(GmshBatchCalculation, **inputs)
+        self.report('submitted {}<{}>'.format(GmshBatchCalculation.__name__, calculation.pk))
+        return self.to_context(batch=calculation)
+
+    def results(self):
+        """Attach the meshes and exit statuses of all points."""
+        calculation = self.ctx.batch
+        if 'exit_statuses' not in calculation.outputs:
+            self.report('{}<{}> failed with exit status {}'.format(
+                calculation.process_label, calculation.pk, calculation.exit_status))
+            return self.exit_codes.ERROR_BATCH_FAILED
+
+        self.out('exit_statuses', calculation.outputs.exit_statuses)
+        for link in calculation.get_outgoing(link_label_filter='mshfiles__%').all():
+            self.out('mshfiles.{}'.format(link.link_label[len('mshfiles__'):]), link.node)
+
+        if not calculation.is_finished_ok:
+            return self.exit_codes.ERROR_BATCH_FAILED
+        return None
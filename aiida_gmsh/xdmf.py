@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Conversion of MSH files to XDMF/HDF5, e.g. for FEniCS.
+
+The mesh is streamed block by block from the MSH file (see :py:class:`aiida_gmsh.msh.MshReader`) into
+chunked and optionally compressed HDF5 datasets::
+
+    /geometry           node coordinates, shape (num_nodes, gdim)
+    /cells/topology     connectivity of the elements of the highest dimension (node indices)
+    /cells/physical     physical tag of each cell (0 if not part of a physical group)
+    /facets/topology    connectivity of the elements of dimension cell dimension - 1
+    /facets/physical    physical tag of each facet
+
+The XDMF file describes the grids ``cells`` and ``facets``, which share the geometry. With dolfinx, e.g.::
+
+    with XDMFFile(comm, 'mesh.xdmf', 'r') as xdmf:
+        mesh = xdmf.read_mesh(name='cells')
+        cell_tags = xdmf.read_meshtags(mesh, name='cells')
+
+Besides the chunk cache of HDF5, the memory needed for the conversion is bounded by the size of a single
+block and the node tags (16 bytes per node) needed to convert node tags to indices. Elements of lower
+dimensions than the facets are skipped without being written. Requires a seekable handle and h5py (``pip install aiida-gmsh[xdmf]``).
+"""
+import collections
+import os
+
+import numpy as np
+
+from aiida_gmsh.msh import MshError, MshReader, nodes_per_element, tags_to_indices
+
+# number of rows per chunk of the HDF5 datasets
+CHUNK_ROWS = 2**16
+
+# gmsh element type: (XDMF topology type, dimension, permutation from gmsh to XDMF node ordering)
+TOPOLOGY_TYPES = {
+    1: ('Polyline', 1, None),
+    2: ('Triangle', 2, None),
+    3: ('Quadrilateral', 2, None),
+    4: ('Tetrahedron', 3, None),
+    5: ('Hexahedron', 3, None),
+    6: ('Wedge', 3, None),
+    7: ('Pyramid', 3, None),
+    8: ('Edge_3', 1, None),
+    9: ('Triangle_6', 2, None),
+    11: ('Tetrahedron_10', 3, [0, 1, 2, 3, 4, 5, 6, 7, 9, 8]),
+}
+
+XDMF_TEMPLATE = """<?xml version="1.0"?>
+<Xdmf Version="3.0" xmlns:xi="http://www.w3.org/2001/XInclude">
+  <Domain>
+{grids}  </Domain>
+</Xdmf>
+"""
+
+GRID_TEMPLATE = """    <Grid Name="{name}" GridType="Uniform">
+      <Topology TopologyType="{topology_type}" NumberOfElements="{num_elements}"{nodes_per_element}>
+        <DataItem Dimensions="{num_elements} {num_columns}" NumberType="Int" Precision="8" Format="HDF">{h5file}:/{name}/topology</DataItem>
+      </Topology>
+      <Geometry GeometryType="{geometry_type}">
+        <DataItem Dimensions="{num_nodes} {gdim}" NumberType="Float" Precision="8" Format="HDF">{h5file}:/geometry</DataItem>
+      </Geometry>
+      <Attribute Name="{name}" AttributeType="Scalar" Center="Cell">
+        <DataItem Dimensions="{num_elements}" NumberType="Int" Precision="4" Format="HDF">{h5file}:/{name}/physical</DataItem>
+      </Attribute>
+    </Grid>
+"""
+
+
+def write_xdmf(handle, h5_path, xdmf_path, gdim=3, compression='gzip', compression_opts=4, chunk_rows=CHUNK_ROWS):
+    """Convert a MSH 4.1 file (ASCII or binary) to XDMF/HDF5.
+
+    :param handle: file handle of the MSH file opened in binary mode
+    :param h5_path: path of the HDF5 file to write
+    :param xdmf_path: path of the XDMF file to write (refers to the HDF5 file by its basename)
+    :param gdim: geometric dimension (2 drops the z coordinates)
+    :param compression: compression filter of the HDF5 datasets ('gzip', 'lzf' or None)
+    :param compression_opts: compression level (only used for 'gzip')
+    :param chunk_rows: number of rows per chunk of the HDF5 datasets
+    :returns: dictionary with the ``num_nodes``, and the XDMF topology type and number of elements of the
+        ``cells`` and ``facets`` (None if the mesh has no facets)
+    :raises MshError: if the file is not a valid MSH 4.1 file or contains element types not supported by XDMF
+    """
+    import h5py  # pylint: disable=import-outside-toplevel
+
+    if gdim not in (2, 3):
+        raise ValueError('gdim has to be 2 or 3, got {}'.format(gdim))
+    filters = {'compression': compression}
+    if compression == 'gzip':
+        filters['compression_opts'] = compression_opts
+
+    reader = MshReader(handle)
+    entities = {}
+    node_tags = order = None
+    # dimension: element type of the cells and facets
+    element_types = {}
+    grids = {}
+
+    with h5py.File(h5_path, 'w') as h5file:
+        for section in reader.sections():
+            if section == 'Entities':
+                entities = reader.read_entities()
+            elif section == 'PartitionedEntities':
+                entities = reader.read_partitioned_entities()
+            elif section == 'Nodes':
+                num_nodes = reader.read_section_header()[1]
+                geometry = h5file.create_dataset('geometry', shape=(num_nodes, gdim), dtype=np.float64,
+                                                 chunks=(max(1, min(chunk_rows, num_nodes)), gdim), **filters)
+                node_tags = np.empty(num_nodes, dtype=np.int64)
+                start = 0
+                for block in reader.iter_node_blocks():
+                    stop = start + block.tags.size
+                    if stop > num_nodes:
+                        raise MshError('Found more nodes than announced in the $Nodes header')
+                    node_tags[start:stop] = block.tags
+                    geometry[start:stop] = block.coordinates[:, :gdim]
+                    start = stop
+                if start != num_nodes:
+                    raise MshError('Found {} nodes, expected {}'.format(start, num_nodes))
+                order = np.argsort(node_tags)
+            elif section == 'Elements':
+                if node_tags is None:
+                    raise MshError('The $Elements section precedes the $Nodes section')
+                # the dimensions of the cells and facets are decided from the block headers, such that only the
+                # datasets which are kept are written, with their final shapes
+                headers = [header for header in reader.scan_block_headers() if header.kind != 15]  # 15: points
+                if not headers:
+                    raise MshError('File does not contain any elements')
+                cell_dim = max(header.entity_dim for header in headers)
+                grids = {'cells': cell_dim, 'facets': cell_dim - 1}
+                names = {dim: name for name, dim in grids.items()}
+                counts = collections.Counter()
+                for header in headers:
+                    if header.entity_dim not in names:
+                        continue
+                    if header.kind not in TOPOLOGY_TYPES:
+                        raise MshError('Element type {} is not supported by XDMF'.format(header.kind))
+                    if element_types.setdefault(header.entity_dim, header.kind) != header.kind:
+                        raise MshError('Mixed element types of dimension {} are not supported'.format(header.entity_dim))
+                    counts[header.entity_dim] += header.count
+                for dim, element_type in element_types.items():
+                    shape = (counts[dim], nodes_per_element(element_type))
+                    rows = max(1, min(chunk_rows, counts[dim]))
+                    h5file.create_dataset(names[dim] + '/topology', shape=shape, dtype=np.int64, chunks=(rows, shape[1]),
+                                          **filters)
+                    h5file.create_dataset(names[dim] + '/physical', shape=shape[:1], dtype=np.int32, chunks=(rows,),
+                                          **filters)
+
+                offsets = collections.Counter()
+                for block in reader.iter_element_blocks():
+                    if block.element_type == 15 or block.entity_dim not in element_types:
+                        continue
+                    permutation = TOPOLOGY_TYPES[block.element_type][2]
+                    connectivity = block.connectivity if permutation is None else block.connectivity[:, permutation]
+                    entity = entities.get((block.entity_dim, block.entity_tag))
+                    physical_tags = entity.physical_tags if entity else []
+                    if len(physical_tags) > 1:
+                        # XDMF mesh tags hold a single value per cell
+                        raise MshError('Entity {} of dimension {} belongs to several physical groups {}, which is not '
+                                       'supported by XDMF'.format(block.entity_tag, block.entity_dim, physical_tags))
+                    physical_tag = physical_tags[0] if physical_tags else 0
+
+                    name = names[block.entity_dim]
+                    start = offsets[name]
+                    stop = start + block.tags.size
+                    h5file[name + '/topology'][start:stop] = tags_to_indices(node_tags, connectivity, order)
+                    h5file[name + '/physical'][start:stop] = physical_tag
+                    offsets[name] = stop
+
+        if not element_types:
+            raise MshError('File does not contain any elements')
+        shapes = {name: h5file[name + '/topology'].shape for name, dim in grids.items() if dim in element_types}
+
+    summary = {'num_nodes': int(node_tags.size)}
+    content = ''
+    for name, dim in grids.items():
+        summary[name] = None
+        if dim not in element_types:
+            continue
+        topology_type = TOPOLOGY_TYPES[element_types[dim]][0]
+        num_elements, num_columns = shapes[name]
+        summary[name] = {'topology_type': topology_type, 'num_elements': int(num_elements)}
+        content += GRID_TEMPLATE.format(
+            name=name,
+            topology_type=topology_type,
+            num_elements=num_elements,
+            num_columns=num_columns,
+            nodes_per_element=' NodesPerElement="{}"'.format(num_columns) if topology_type == 'Polyline' else '',
+            geometry_type='XYZ' if gdim == 3 else 'XY',
+            num_nodes=node_tags.size,
+            gdim=gdim,
+            h5file=os.path.basename(h5_path),
+        )
+    with open(xdmf_path, 'w') as xdmf_file:
+        xdmf_file.write(XDMF_TEMPLATE.format(grids=content))
+
+    return summary
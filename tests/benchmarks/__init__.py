@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the plugin's hot paths.
+
+The benchmarks require pytest-benchmark (``pip install -e .[testing,benchmark]``) and are skipped otherwise.
+See the developer guide for how to save and compare baseline results.
+"""
+import os
+
+import pytest
+
+BENCHMARK_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# the largest meshes (10M elements) are only benchmarked if this environment variable is set
+LARGE = bool(os.environ.get('AIIDA_GMSH_BENCHMARK_LARGE'))
+
+MESH_SIZES = [
+    10_000,
+    100_000,
+    1_000_000,
+    pytest.param(10_000_000, marks=pytest.mark.skipif(not LARGE, reason='set AIIDA_GMSH_BENCHMARK_LARGE=1')),
+]
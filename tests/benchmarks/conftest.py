@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""pytest fixtures and configuration for the benchmarks."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from . import BENCHMARK_DIR
+
+# results of the machine (not committed), one folder per machine and python version
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+
+def pytest_configure(config):
+    """Store results in ``RESULTS_DIR`` instead of ``.benchmarks`` in the current directory.
+
+    Only applies if the benchmarks are selected on the command line (``pytest tests/benchmarks``), since the
+    options of pytest-benchmark are read before the configuration of other folders is loaded. Runs giving their
+    own storage are left unchanged. Runs are only compared against saved results on request
+    (``--benchmark-compare``), since timings are specific to the machine they were recorded on.
+    """
+    options = config.option
+    if not hasattr(options, 'benchmark_storage'):
+        # pytest-benchmark is not installed
+        return
+    if options.benchmark_storage == 'file://./.benchmarks':
+        # the default of pytest-benchmark
+        options.benchmark_storage = 'file://{}'.format(RESULTS_DIR)
+
+
+@pytest.fixture(scope='function', autouse=True)
+def clear_database_auto():
+    """Do not clear the database in between benchmarks, such that expensive fixtures can be shared."""
+
+
+@pytest.fixture(scope='function')
+def gmsh_stand_in_code(aiida_local_code_factory):
+    """Get a code running the stand-in for the gmsh executable."""
+    return aiida_local_code_factory(executable=os.path.join(BENCHMARK_DIR, 'gmsh_stand_in.py'), entry_point='gmsh', label='gmsh-stand-in')
+
+
+@pytest.fixture(scope='session')
+def synthetic_msh(tmp_path_factory):
+    """Return a function writing (and caching) a synthetic triangle mesh with about ``num_elements`` elements.
+
+    The meshes are written by the stand-in for gmsh. The function takes the number of elements and a flag for
+    binary output and returns the path of the file.
+    """
+    directory = tmp_path_factory.mktemp('msh')
+
+    def get_msh(num_elements, binary):
+        path = directory / 'mesh_{}_{}.msh'.format(num_elements, 'binary' if binary else 'ascii')
+        if not path.exists():
+            command = [sys.executable, os.path.join(BENCHMARK_DIR, 'gmsh_stand_in.py'), '-2', '-setnumber', 'elements',
+                       str(num_elements), '-o', str(path)] + (['-bin'] if binary else [])
+            subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        return str(path)
+
+    return get_msh
+
+
+@pytest.fixture(scope='function')
+def generate_calc_job_node(aiida_localhost):
+    """Return a function creating a stored GmshCalculation node with a ``retrieved`` folder.
+
+    The function takes a dictionary mapping names in the retrieved folder to paths of files and the
+    options of the calculation.
+    """
+    from aiida.common import LinkType
+    from aiida.orm import CalcJobNode, FolderData
+
+    def generate(files, **options):
+        node = CalcJobNode(computer=aiida_localhost)
+        node.process_type = 'aiida.calculations:gmsh'
+        node.set_options({
+            'resources': {'num_machines': 1, 'num_mpiprocs_per_machine': 1},
+            'output_filename': 'mesh.msh',
+            'log_filename': 'gmsh.log',
+            'parse_mesh': True,
+            **options,
+        })
+        node.store()
+
+        retrieved = FolderData()
+        for name, path in files.items():
+            retrieved.put_object_from_file(path, name)
+        retrieved.add_incoming(node, link_type=LinkType.CREATE, link_label='retrieved')
+        retrieved.store()
+        return node
+
+    return generate
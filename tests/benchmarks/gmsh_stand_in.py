@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Stand-in for the gmsh executable used by the benchmarks.
+
+Instead of meshing the geofile, writes a structured triangle mesh of the unit square with (about) the number
+of elements given by ``-setnumber elements <N>`` (default 10000) to the file given by ``-o`` and prints a
+gmsh-like log. ``-bin`` selects binary output.
+
+Usage::
+
+    gmsh_stand_in.py unit_square.geo -2 -setnumber elements 100000 -bin -o mesh.msh
+"""
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from synthetic import unit_square_mesh, write_msh  # pylint: disable=wrong-import-position
+
+
+def main(argv):
+    """Write the synthetic mesh."""
+    output_filename = 'mesh.msh'
+    num_elements = 10000
+    binary = '-bin' in argv
+    for i, arg in enumerate(argv):
+        if arg == '-o':
+            output_filename = argv[i + 1]
+        elif arg == '-setnumber' and argv[i + 1] == 'elements':
+            num_elements = int(float(argv[i + 2]))
+
+    start = time.perf_counter()
+    print("Info    : Running '{}' [Gmsh stand-in]".format(' '.join(['gmsh'] + argv)))
+    nodes, elements = unit_square_mesh(max(1, int(math.ceil(math.sqrt(num_elements / 2)))))
+    print('Info    : Done meshing 2D (Wall {0:g}s, CPU {0:g}s)'.format(time.perf_counter() - start))
+    print('Info    : {} nodes {} elements'.format(nodes.shape[0], elements[2].shape[0]))
+    with open(output_filename, 'wb') as handle:
+        write_msh(handle, nodes, elements, binary=binary)
+    print("Info    : Done writing '{0}' (Wall {1:g}s, CPU {1:g}s)".format(output_filename, time.perf_counter() - start))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks for calculations
+
+"""
+import os
+
+import pytest
+from aiida.common.folders import SandboxFolder
+from aiida.engine import run_get_node
+from aiida.engine.utils import instantiate_process
+from aiida.manage.manager import get_manager
+from aiida.orm import SinglefileData
+from aiida.plugins import CalculationFactory, DataFactory
+
+from .. import TEST_DIR
+
+pytest.importorskip('pytest_benchmark')
+
+
+def get_inputs(code, num_elements=10000):
+    """Return the inputs of a GmshCalculation."""
+    GmshParameters = DataFactory('gmsh')
+    return {
+        'code': code,
+        'parameters': GmshParameters({'2': True, 'setnumber': {'elements': num_elements}}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, 'input_files', 'unit_square.geo')),
+        'metadata': {
+            'options': {
+                'max_wallclock_seconds': 60,
+            },
+        },
+    }
+
+
+def test_prepare_for_submission(benchmark, gmsh_stand_in_code):
+    """Benchmark GmshCalculation.prepare_for_submission."""
+    process = instantiate_process(get_manager().get_runner(), CalculationFactory('gmsh'), **get_inputs(gmsh_stand_in_code))
+
+    def prepare():
+        with SandboxFolder() as folder:
+            return process.prepare_for_submission(folder)
+
+    calcinfo = benchmark(prepare)
+    assert calcinfo.retrieve_list == ['mesh.msh', 'gmsh.log']
+
+
+def test_run(benchmark, gmsh_stand_in_code):
+    """Benchmark running a GmshCalculation end-to-end with the stand-in for gmsh."""
+
+    def run():
+        return run_get_node(CalculationFactory('gmsh'), **get_inputs(gmsh_stand_in_code))
+
+    result, node = benchmark.pedantic(run, rounds=5, iterations=1)
+    assert node.is_finished_ok
+    assert result['mesh'].num_elements == 10082
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks for the command line interface
+
+"""
+import os
+
+import pytest
+from click.testing import CliRunner
+from aiida.plugins import DataFactory
+
+from aiida_gmsh.cli import list_
+
+pytest.importorskip('pytest_benchmark')
+
+NUM_NODES = int(os.environ.get('AIIDA_GMSH_BENCHMARK_NODES', 100_000))
+
+
+@pytest.fixture(scope='module')
+def stored_parameters(aiida_profile):  # pylint: disable=unused-argument
+    """Store NUM_NODES GmshParameters nodes (shared by all benchmarks of this module)."""
+    GmshParameters = DataFactory('gmsh')
+    for i in range(NUM_NODES):
+        GmshParameters({'2': True, 'clscale': 1. / (i + 1)}).store()
+    yield NUM_NODES
+    aiida_profile.reset_db()
+
+
+def test_data_gmsh_list(benchmark, stored_parameters):
+    """Benchmark 'verdi data gmsh list' over many stored nodes."""
+    runner = CliRunner()
+    result = benchmark.pedantic(runner.invoke, args=(list_,), kwargs={'catch_exceptions': False}, rounds=3, iterations=1)
+    assert result.output.count('\n') >= stored_parameters
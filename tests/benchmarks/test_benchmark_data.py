@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks for data types
+
+"""
+import pytest
+from aiida.plugins import DataFactory
+
+pytest.importorskip('pytest_benchmark')
+
+PARAMETERS = {
+    '3': True,
+    'order': 2,
+    'clscale': 0.5,
+    'nt': 4,
+    'algo': 'hxt',
+    'setnumber': {'radius{}'.format(i): 0.1 * i for i in range(10)},
+    'setstring': {'material': 'steel'},
+}
+
+
+def test_parameters_construction(benchmark):
+    """Benchmark constructing (and validating) GmshParameters."""
+    GmshParameters = DataFactory('gmsh')
+    parameters = benchmark(GmshParameters, PARAMETERS)
+    assert parameters['bin'] is True
+
+
+def test_parameters_validation(benchmark):
+    """Benchmark validating a dictionary of command line options."""
+    parameters = DataFactory('gmsh')(PARAMETERS)
+    result = benchmark(parameters.validate, PARAMETERS)
+    assert result['nt'] == 4
+
+
+def test_cmdline_params(benchmark):
+    """Benchmark synthesizing the command line parameters."""
+    parameters = DataFactory('gmsh')(PARAMETERS)
+    result = benchmark(parameters.cmdline_params, 'geometry.geo', output_filename='mesh.msh')
+    assert result[-2:] == ['-o', 'mesh.msh']
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks for the import time of the plugin
+
+The import times are measured in a fresh interpreter using ``python -X importtime``.
+"""
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+MODULES = [
+    'aiida_gmsh.calculations',
+    'aiida_gmsh.cli',
+    'aiida_gmsh.data',
+    'aiida_gmsh.parsers',
+    'aiida_gmsh.workflows',
+]
+
+# modules which must not be imported as a side effect of importing a plugin module
+FORBIDDEN = {
+    'aiida_gmsh.calculations': ['aiida_gmsh.parsers', 'aiida_gmsh.workflows'],
+    'aiida_gmsh.cli': ['aiida.cmdline.commands.cmd_data', 'aiida_gmsh.calculations', 'aiida.orm.querybuilder'],
+    'aiida_gmsh.data': ['aiida_gmsh.calculations', 'aiida.engine'],
+    'aiida_gmsh.parsers': ['aiida_gmsh.calculations', 'aiida_gmsh.data'],
+    'aiida_gmsh.workflows': ['aiida_gmsh.calculations', 'aiida_gmsh.parsers'],
+}
+
+
+def import_times(module):
+    """Import a module in a fresh interpreter.
+
+    :returns: dictionary mapping all imported modules to their cumulative import time in microseconds
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import(benchmark, module):
+    """Benchmark importing a module of the plugin and check that it does not import heavy modules."""
+    times = benchmark.pedantic(import_times, args=(module,), rounds=5, iterations=1)
+    benchmark.extra_info['cumulative_import_time_us'] = times[module]
+
+    imported = [name for name in FORBIDDEN[module] if name in times]
+    assert not imported, 'importing {} also imports {}'.format(module, ', '.join(imported))
+
+
+@pytest.mark.skipif(shutil.which('verdi') is None, reason='verdi executable not found')
+def test_verdi_data_gmsh_help(benchmark):
+    """Benchmark the latency of 'verdi data gmsh --help'."""
+
+    def run():
+        return subprocess.run(['verdi', 'data', 'gmsh', '--help'], stdout=subprocess.PIPE, universal_newlines=True,
+                              check=True)
+
+    result = benchmark.pedantic(run, rounds=5, iterations=1)
+    assert 'bulk-export' in result.stdout
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks for reading and comparing MSH files
+
+These benchmarks do not need an AiiDA profile.
+"""
+import os
+
+import pytest
+
+from aiida_gmsh.compare import compare, fingerprint
+from aiida_gmsh.msh import read_mesh
+
+from . import MESH_SIZES
+
+pytest.importorskip('pytest_benchmark')
+
+
+def _read(function, path):
+    with open(path, 'rb') as handle:
+        return function(handle)
+
+
+@pytest.mark.parametrize('binary', [False, True], ids=['ascii', 'binary'])
+@pytest.mark.parametrize('num_elements', MESH_SIZES)
+def test_read_mesh(benchmark, synthetic_msh, num_elements, binary):
+    """Benchmark reading a synthetic mesh into arrays."""
+    path = synthetic_msh(num_elements, binary)
+    mesh = benchmark.pedantic(_read, args=(read_mesh, path), rounds=3 if num_elements >= 1_000_000 else 10,
+                              iterations=1)
+    assert mesh['elements'][2].shape[0] >= num_elements
+
+    benchmark.extra_info['num_elements'] = mesh['elements'][2].shape[0]
+    benchmark.extra_info['megabytes'] = os.path.getsize(path) / 1024**2
+
+
+@pytest.mark.parametrize('num_elements', MESH_SIZES)
+def test_fingerprint(benchmark, synthetic_msh, num_elements):
+    """Benchmark the fingerprint used by 'verdi data gmsh diff' on binary meshes."""
+    path = synthetic_msh(num_elements, binary=True)
+    result = benchmark.pedantic(_read, args=(fingerprint, path), rounds=3 if num_elements >= 1_000_000 else 10,
+                                iterations=1)
+    assert result['elements']['2']['count'] >= num_elements
+
+
+@pytest.mark.parametrize('num_elements', MESH_SIZES)
+def test_compare(benchmark, synthetic_msh, num_elements):
+    """Benchmark comparing a binary mesh with its ASCII version within the tolerance ('verdi data gmsh diff')."""
+    paths = synthetic_msh(num_elements, binary=True), synthetic_msh(num_elements, binary=False)
+
+    def run():
+        with open(paths[0], 'rb') as first, open(paths[1], 'rb') as second:
+            return compare(first, second)
+
+    differences = benchmark.pedantic(run, rounds=3 if num_elements >= 1_000_000 else 10, iterations=1)
+    assert differences == []
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks for parsers
+
+"""
+import os
+
+import pytest
+from aiida.plugins import ParserFactory
+
+from . import MESH_SIZES
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.mark.parametrize('binary', [False, True], ids=['ascii', 'binary'])
+@pytest.mark.parametrize('num_elements', MESH_SIZES)
+def test_parse(benchmark, generate_calc_job_node, synthetic_msh, num_elements, binary):
+    """Benchmark GmshParser.parse on synthetic meshes (storing the mesh and parsing it into GmshMeshData)."""
+    GmshParser = ParserFactory('gmsh')
+    path = synthetic_msh(num_elements, binary)
+    node = generate_calc_job_node({'mesh.msh': path})
+
+    def parse():
+        parser = GmshParser(node)
+        return parser.parse(), parser.outputs
+
+    exit_code, outputs = benchmark.pedantic(parse, rounds=3 if num_elements >= 1_000_000 else 10, iterations=1)
+    assert exit_code.status == 0
+
+    # report the throughput in the JSON output of pytest-benchmark
+    benchmark.extra_info['num_elements'] = outputs['mesh'].num_elements
+    benchmark.extra_info['megabytes'] = os.path.getsize(path) / 1024**2
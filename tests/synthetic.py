@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+""" Synthetic meshes for tests and benchmarks.
+
+"""
+import numpy as np
+
+# dimension of the supported element types
+ELEMENT_DIMS = {1: 1, 2: 2, 4: 3}
+
+
+def unit_square_mesh(n):
+    """Structured triangle mesh of the unit square with 2 * n**2 triangles.
+
+    :returns: tuple (nodes, elements) where elements maps gmsh element types to connectivity (node tags)
+    """
+    x = np.linspace(0., 1., n + 1)
+    X, Y = np.meshgrid(x, x)
+    nodes = np.column_stack([X.ravel(), Y.ravel(), np.zeros(X.size)])
+    tags = np.arange(1, nodes.shape[0] + 1).reshape(n + 1, n + 1)
+    p0, p1, p2, p3 = tags[:-1, :-1].ravel(), tags[:-1, 1:].ravel(), tags[1:, 1:].ravel(), tags[1:, :-1].ravel()
+    triangles = np.concatenate([np.column_stack([p0, p1, p2]), np.column_stack([p0, p2, p3])])
+    return nodes, {2: triangles}
+
+
+def unit_cube_mesh(n):
+    """Structured tetrahedral mesh of the unit cube with 6 * n**3 tetrahedra.
+
+    :returns: tuple (nodes, elements) where elements maps gmsh element types to connectivity (node tags)
+    """
+    x = np.linspace(0., 1., n + 1)
+    X, Y, Z = np.meshgrid(x, x, x, indexing='ij')
+    nodes = np.column_stack([X.ravel(), Y.ravel(), Z.ravel()])
+    tags = np.arange(1, nodes.shape[0] + 1).reshape(n + 1, n + 1, n + 1)
+    corners = [tags[i:i + n, j:j + n, k:k + n].ravel() for i in (0, 1) for j in (0, 1) for k in (0, 1)]
+    # split each cube along its diagonal (corner 0 to corner 7) into six positively oriented tetrahedra
+    paths = [(4, 6), (6, 2), (2, 3), (3, 1), (1, 5), (5, 4)]
+    tetrahedra = np.concatenate([np.column_stack([corners[0], corners[a], corners[b], corners[7]]) for a, b in paths])
+    return nodes, {4: tetrahedra}
+
+
+def write_msh(handle, nodes, elements, binary=False, physical_name='domain'):
+    """Write a MSH 4.1 file with a single entity per element dimension.
+
+    All elements belong to physical group 1 called ``physical_name``.
+
+    :param handle: file handle opened in binary mode
+    :param nodes: node coordinates (node tags are 1, ..., num_nodes)
+    :param elements: dictionary mapping gmsh element types to connectivity (node tags)
+    """
+    dims = sorted({ELEMENT_DIMS[element_type] for element_type in elements})
+    top_dim = dims[-1]
+    num_nodes = nodes.shape[0]
+    num_elements = sum(connectivity.shape[0] for connectivity in elements.values())
+    lower, upper = nodes.min(axis=0), nodes.max(axis=0)
+    counts = [0, 0, 0, 0]
+    for dim in dims:
+        counts[dim] = 1
+
+    handle.write(b'$MeshFormat\n4.1 %d 8\n' % int(binary))
+    if binary:
+        handle.write(np.array([1], dtype='<i4').tobytes() + b'\n')
+    handle.write(b'$EndMeshFormat\n')
+    handle.write(b'$PhysicalNames\n1\n%d 1 "%s"\n$EndPhysicalNames\n' % (top_dim, physical_name.encode()))
+
+    handle.write(b'$Entities\n')
+    if binary:
+        handle.write(np.array(counts, dtype='<u8').tobytes())
+        for dim in dims:
+            physical = [1] if dim == top_dim else []
+            handle.write(np.array([1], dtype='<i4').tobytes())
+            handle.write(np.concatenate([lower, upper]).astype('<f8').tobytes())
+            handle.write(np.array([len(physical)], dtype='<u8').tobytes() + np.array(physical, dtype='<i4').tobytes())
+            handle.write(np.array([0], dtype='<u8').tobytes())
+        handle.write(b'\n')
+    else:
+        handle.write(b'%d %d %d %d\n' % tuple(counts))
+        for dim in dims:
+            physical = '1 1' if dim == top_dim else '0'
+            handle.write('1 {} {} {} {} {} {} {} 0\n'.format(*lower, *upper, physical).encode())
+    handle.write(b'$EndEntities\n')
+
+    handle.write(b'$Nodes\n')
+    tags = np.arange(1, num_nodes + 1)
+    if binary:
+        handle.write(np.array([1, num_nodes, 1, num_nodes], dtype='<u8').tobytes())
+        handle.write(np.array([top_dim, 1, 0], dtype='<i4').tobytes() + np.array([num_nodes], dtype='<u8').tobytes())
+        handle.write(tags.astype('<u8').tobytes())
+        handle.write(nodes.astype('<f8').tobytes())
+        handle.write(b'\n')
+    else:
+        handle.write(b'1 %d 1 %d\n%d 1 0 %d\n' % (num_nodes, num_nodes, top_dim, num_nodes))
+        np.savetxt(handle, tags, fmt='%d')
+        np.savetxt(handle, nodes, fmt='%.16g')
+    handle.write(b'$EndNodes\n')
+
+    handle.write(b'$Elements\n')
+    if binary:
+        handle.write(np.array([len(elements), num_elements, 1, num_elements], dtype='<u8').tobytes())
+    else:
+        handle.write(b'%d %d 1 %d\n' % (len(elements), num_elements, num_elements))
+    start = 1
+    for element_type, connectivity in sorted(elements.items()):
+        count = connectivity.shape[0]
+        data = np.column_stack([np.arange(start, start + count), connectivity])
+        if binary:
+            handle.write(np.array([ELEMENT_DIMS[element_type], 1, element_type], dtype='<i4').tobytes())
+            handle.write(np.array([count], dtype='<u8').tobytes() + data.astype('<u8').tobytes())
+        else:
+            handle.write(b'%d 1 %d %d\n' % (ELEMENT_DIMS[element_type], element_type, count))
+            np.savetxt(handle, data, fmt='%d')
+        start += count
+    if binary:
+        handle.write(b'\n')
+    handle.write(b'$EndElements\n')
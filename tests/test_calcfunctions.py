@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+""" Tests for in-process meshing
+
+"""
+import os
+import pytest
+from aiida.plugins import DataFactory
+from aiida.orm import SinglefileData
+
+from aiida_gmsh.calcfunctions import mesh_geofile, run_mesh, should_mesh_in_process
+from . import TEST_DIR
+
+pytest.importorskip('gmsh')
+
+
+def test_mesh_geofile():
+    """Test meshing in-process with the gmsh Python API"""
+    GmshParameters = DataFactory('gmsh')
+    parameters = GmshParameters({"2": True})
+    input_geo = SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square.geo"))
+
+    result, node = mesh_geofile.run_get_node(input_geo, parameters)
+    assert node.is_finished_ok
+    assert result['mshfile'].filename == 'mesh.msh'
+    assert '$MeshFormat' in result['mshfile'].get_content()
+    assert result['mesh'].num_nodes == 25
+
+
+def test_run_mesh(gmsh_code):
+    """Test choosing between in-process meshing and GmshCalculation"""
+    GmshParameters = DataFactory('gmsh')
+    assert should_mesh_in_process(GmshParameters({"2": True}))
+    assert not should_mesh_in_process(GmshParameters({"3": True}))
+    assert should_mesh_in_process(GmshParameters({"3": True}), expected_num_elements=1000)
+    assert not should_mesh_in_process(GmshParameters({"2": True}), expected_num_elements=10**6)
+
+    input_geo = SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square.geo"))
+    in_process = run_mesh(input_geo, GmshParameters({"2": True}), code=gmsh_code)
+    calcjob = run_mesh(input_geo, GmshParameters({"2": True}), code=gmsh_code, expected_num_elements=10**6,
+                       metadata={'options': {'parse_mesh': True}})
+    assert in_process['mesh'].num_nodes == calcjob['mesh'].num_nodes
@@ -3,9 +3,12 @@
 
 """
 import os
+import pytest
 from aiida.plugins import DataFactory, CalculationFactory
-from aiida.engine import run
-from aiida.orm import SinglefileData
+from aiida.engine import run, run_get_node
+from aiida.orm import Dict, SinglefileData
+
+from aiida_gmsh.calcfunctions import convert_to_xdmf, fetch_remote_mesh
 
 from . import TEST_DIR
 
@@ -28,13 +31,13 @@ def test_process(gmsh_code):
         'geofile': input_geo,
         'metadata': {
             'options': {
-                'max_wallclock_seconds': 30
+                'max_wallclock_seconds': 30,
+                'parse_mesh': True
             },
         },
     }
 
     result = run(CalculationFactory('gmsh'), **inputs)
-    breakpoint()
     mshfile_content = result['mshfile'].get_content()
 
     # funny enough, could use aiida-diff here to compare against reference msh file
@@ -44,3 +47,291 @@ def test_process(gmsh_code):
     assert '$PhysicalNames' in mshfile_content
     assert '2 1 "surface"' in mshfile_content
     assert '$EndPhysicalNames' in mshfile_content
+
+    mesh = result['mesh']
+    assert mesh.physical_names == {1: (2, 'surface')}
+    # NTransfinite = 5 points per direction
+    assert mesh.num_nodes == 25
+    assert mesh.get_elements(2).shape == (32, 3)
+    assert (mesh.get_physical_tags(2) == 1).all()
+
+    timings = result['timings'].get_dict()
+    assert 'meshing_2d' in timings['stages']
+    assert timings['num_nodes'] == 25
+
+    # by default, only the metadata of the mesh is stored
+    del inputs['metadata']['options']['parse_mesh']
+    result = run(CalculationFactory('gmsh'), **inputs)
+    assert 'mesh' not in result
+    assert result['mshfile'].get_attribute('msh_metadata')['num_nodes'] == 25
+
+
+def test_batch(gmsh_code):
+    """Test meshing several geofiles in a single calculation."""
+    GmshParameters = DataFactory('gmsh')
+    input_geo = SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square.geo"))
+
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({"2": True}),
+        'item_parameters': {
+            'second_order': GmshParameters({"2": True, "order": 2}),
+        },
+        'geofiles': {
+            'first_order': input_geo,
+            'second_order': input_geo,
+        },
+        'metadata': {
+            'options': {
+                'max_wallclock_seconds': 30,
+                'max_concurrent': 2,
+            },
+        },
+    }
+
+    result = run(CalculationFactory('gmsh.batch'), **inputs)
+
+    assert result['exit_statuses'].get_dict() == {'first_order': 0, 'second_order': 0}
+    assert sorted(result['mshfiles']) == ['first_order', 'second_order']
+    assert '$MeshFormat' in result['mshfiles']['second_order'].get_content()
+
+    inputs['metadata']['options']['resources'] = {'num_machines': 2, 'num_mpiprocs_per_machine': 1}
+    with pytest.raises(ValueError, match='num_machines'):
+        run(CalculationFactory('gmsh.batch'), **inputs)
+
+
+def test_threads(gmsh_code):
+    """Test that gmsh uses all cores allocated per MPI process."""
+    GmshParameters = DataFactory('gmsh')
+
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({"3": True, "algo": "hxt"}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square.geo")),
+        'metadata': {
+            'dry_run': True,
+            'store_provenance': False,
+            'options': {
+                'resources': {
+                    'num_machines': 1,
+                    'num_mpiprocs_per_machine': 1,
+                    'num_cores_per_mpiproc': 4,
+                },
+            },
+        },
+    }
+
+    _, node = run_get_node(CalculationFactory('gmsh'), **inputs)
+
+    with open(os.path.join(node.dry_run_info['folder'], '_aiidasubmit.sh')) as handle:
+        script = handle.read()
+    assert 'export OMP_NUM_THREADS=4' in script
+    assert "'-algo' 'hxt'" in script
+    assert "'-nt' '4'" in script
+
+
+def test_compression(gmsh_code):
+    """Test retrieving a gzip-compressed mesh."""
+    GmshParameters = DataFactory('gmsh')
+
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({"2": True}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square.geo")),
+        'metadata': {
+            'options': {
+                'max_wallclock_seconds': 30,
+                'parse_mesh': True,
+                'compression': 'gzip',
+            },
+        },
+    }
+
+    result, node = run_get_node(CalculationFactory('gmsh'), **inputs)
+
+    files_retrieved = node.outputs.retrieved.list_object_names()
+    assert 'mesh.msh.gz' in files_retrieved
+    assert 'mesh.msh' not in files_retrieved
+    assert result['mshfile'].filename == 'mesh.msh'
+    assert '$MeshFormat' in result['mshfile'].get_content()
+    assert result['mesh'].num_nodes == 25
+
+
+def test_retrieve_temporary(gmsh_code):
+    """Test that the mesh is not stored in the retrieved folder when retrieved temporarily."""
+    GmshParameters = DataFactory('gmsh')
+
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({"2": True}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square.geo")),
+        'metadata': {
+            'options': {
+                'max_wallclock_seconds': 30,
+                'parse_mesh': True,
+                'retrieve_temporary': True,
+            },
+        },
+    }
+
+    result, node = run_get_node(CalculationFactory('gmsh'), **inputs)
+
+    assert 'mesh.msh' not in node.outputs.retrieved.list_object_names()
+    assert '$MeshFormat' in result['mshfile'].get_content()
+    assert result['mesh'].num_nodes == 25
+
+
+def test_partitions(gmsh_code):
+    """Test retrieving a mesh split into partitions."""
+    GmshParameters = DataFactory('gmsh')
+
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({"2": True, "part": 2, "part_split": True}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square.geo")),
+        'metadata': {
+            'options': {
+                'max_wallclock_seconds': 30,
+            },
+        },
+    }
+
+    result, node = run_get_node(CalculationFactory('gmsh'), **inputs)
+
+    assert node.is_finished_ok
+    assert 'mshfile' not in result
+    assert sorted(result['partitions']) == ['partition_1', 'partition_2']
+    assert result['partitions']['partition_1'].filename == 'mesh_1.msh'
+    counts = result['partition_counts'].get_dict()
+    assert counts['num_partitions'] == 2
+    assert all(partition['num_elements'] > 0 for partition in counts['partitions'].values())
+
+
+def test_convert_to_xdmf(gmsh_code):
+    """Test converting the output of a calculation to XDMF/HDF5."""
+    pytest.importorskip('h5py')
+    GmshParameters = DataFactory('gmsh')
+
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({"2": True}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square.geo")),
+        'metadata': {
+            'options': {
+                'max_wallclock_seconds': 30,
+            },
+        },
+    }
+
+    result = run(CalculationFactory('gmsh'), **inputs)
+    converted = convert_to_xdmf(result['mshfile'], Dict(dict={'gdim': 2}))
+
+    assert sorted(converted['xdmf'].list_object_names()) == ['mesh.h5', 'mesh.xdmf']
+    summary = converted['xdmf_summary'].get_dict()
+    assert summary['num_nodes'] == 25
+    assert summary['cells']['topology_type'] == 'Triangle'
+
+
+def test_keep_remote(gmsh_code):
+    """Test leaving the mesh on the remote computer and fetching it later."""
+    GmshParameters = DataFactory('gmsh')
+
+    inputs = {
+        'code': gmsh_code,
+        # the counts do not depend on the verbosity of the log
+        'parameters': GmshParameters({"2": True, "v": 0}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square.geo")),
+        'metadata': {
+            'options': {
+                'max_wallclock_seconds': 30,
+                'keep_remote': True,
+            },
+        },
+    }
+
+    result, node = run_get_node(CalculationFactory('gmsh'), **inputs)
+
+    assert node.is_finished_ok
+    assert 'mshfile' not in result
+    assert 'mesh.msh' not in node.outputs.retrieved.list_object_names()
+    stats = result['mesh_stats'].get_dict()
+    assert stats['num_nodes'] == 25
+    assert stats['num_elements'] == 32
+    assert stats['version'] == '4.1'
+    assert stats['physical_names'] == {'1': [2, 'surface']}
+    assert result['remote_mesh'].get_remote_path().endswith('mesh.msh')
+
+    fetched = fetch_remote_mesh(result['remote_mesh'])
+    assert '$MeshFormat' in fetched['mshfile'].get_content()
+
+
+def test_parent_mesh(gmsh_code):
+    """Test refining the mesh of a previous calculation without regenerating it."""
+    GmshParameters = DataFactory('gmsh')
+
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({"2": True}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square.geo")),
+        'metadata': {
+            'options': {
+                'max_wallclock_seconds': 30,
+                'parse_mesh': True
+            },
+        },
+    }
+    parent = run(CalculationFactory('gmsh'), **inputs)
+
+    inputs.pop('geofile')
+    inputs['parameters'] = GmshParameters({'refine': True})
+    inputs['parent_mesh'] = parent['mshfile']
+    result, node = run_get_node(CalculationFactory('gmsh'), **inputs)
+
+    assert node.is_finished_ok
+    mesh = result['mesh']
+    # every triangle is split into four
+    assert mesh.get_elements(2).shape == (4 * 32, 3)
+    assert mesh.num_nodes == 81
+    assert mesh.physical_names == {1: (2, 'surface')}
+
+    with pytest.raises(ValueError):
+        run(CalculationFactory('gmsh'), code=gmsh_code, parameters=GmshParameters({'refine': True}))
+
+
+def test_parent_mesh_optimize(gmsh_code):
+    """Test optimizing the mesh of a previous calculation without meshing it again."""
+    GmshParameters = DataFactory('gmsh')
+
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({"3": True}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_cube.geo")),
+        'metadata': {
+            'options': {
+                'max_wallclock_seconds': 30,
+                'parse_mesh': True
+            },
+        },
+    }
+    parent, parent_node = run_get_node(CalculationFactory('gmsh'), **inputs)
+    assert 'Meshing 3D' in parent_node.outputs.retrieved.get_object_content('gmsh.log')
+
+    inputs.pop('geofile')
+    inputs['parameters'] = GmshParameters({'optimize': True})
+    inputs['parent_mesh'] = parent['mshfile']
+    result, node = run_get_node(CalculationFactory('gmsh'), **inputs)
+
+    assert node.is_finished_ok
+    assert 'Meshing 3D' not in node.outputs.retrieved.get_object_content('gmsh.log')
+    mesh, parent_mesh = result['mesh'], parent['mesh']
+    assert mesh.element_types == parent_mesh.element_types
+    for element_type in parent_mesh.element_types:
+        assert (mesh.get_array('element_tags_{}'.format(element_type)) == parent_mesh.get_array(
+            'element_tags_{}'.format(element_type))).all()
+    assert mesh.num_elements == parent_mesh.num_elements
+    assert mesh.physical_names == {1: (3, 'volume')}
+
+    # the parent is not meshed again
+    inputs['parameters'] = GmshParameters({'3': True, 'optimize_netgen': True})
+    with pytest.raises(ValueError):
+        run(CalculationFactory('gmsh'), **inputs)
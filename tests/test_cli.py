@@ -2,10 +2,18 @@
 """ Tests for command line interface.
 
 """
+import gzip
+import json
+import os
+
 from click.testing import CliRunner
-from aiida.plugins import DataFactory
+from aiida.engine import run_get_node
+from aiida.orm import SinglefileData
+from aiida.plugins import CalculationFactory, DataFactory
+
+from aiida_gmsh.cli import list_, export, bulk_export, meshes, diff, cache_list, cache_purge
 
-from aiida_gmsh.cli import list_, export
+from . import TEST_DIR
 
 # pylint: disable=attribute-defined-outside-init
 class TestDataCli:
@@ -26,6 +34,25 @@ class TestDataCli:
         result = self.runner.invoke(list_, catch_exceptions=False)
         assert str(self.parameters.pk) in result.output
 
+    def test_data_gmsh_list_options(self):
+        """Test filtering, pagination and machine-readable output of 'verdi data gmsh list'."""
+        GmshParameters = DataFactory('gmsh')
+        nodes = [GmshParameters({'2': True}).store(), GmshParameters({'3': True}).store(),
+                 GmshParameters({'3': True, 'order': 2}).store()]
+
+        result = self.runner.invoke(list_, ['--dim', '3', '--format', 'json'], catch_exceptions=False)
+        rows = json.loads(result.output)
+        assert [row['pk'] for row in rows] == [nodes[1].pk, nodes[2].pk]
+        assert rows[1]['parameters']['order'] == 2
+
+        result = self.runner.invoke(list_, ['--dim', '3', '-f', 'order=2', '--format', 'csv'], catch_exceptions=False)
+        assert len(result.output.splitlines()) == 2
+        assert result.output.splitlines()[1].startswith('{},{}'.format(nodes[2].pk, nodes[2].uuid))
+
+        result = self.runner.invoke(list_, ['--dim', '3', '--limit', '1', '--offset', '1'], catch_exceptions=False)
+        assert len(result.output.splitlines()) == 2
+        assert nodes[2].uuid in result.output
+
     def test_data_diff_export(self):
         """Test 'verdi data gmsh export'
 
@@ -35,3 +62,81 @@ class TestDataCli:
         result = self.runner.invoke(export, [str(self.parameters.pk)],
                                     catch_exceptions=False)
         assert 'ignore-case' in result.output
+
+    def test_data_gmsh_cache(self):
+        """Test 'verdi data gmsh cache list/purge'
+
+        Tests that they can be reached with an empty cache.
+        """
+        result = self.runner.invoke(cache_list, catch_exceptions=False)
+        assert result.output == ''
+        result = self.runner.invoke(cache_purge, ['--max-age', '1', '--dry-run'], catch_exceptions=False)
+        assert 'Would evict 0 entries.' in result.output
+
+
+def test_data_gmsh_bulk_export(gmsh_code, tmp_path):
+    """Test 'verdi data gmsh bulk-export' with compression."""
+    GmshParameters = DataFactory('gmsh')
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({'2': True}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, 'input_files', 'unit_square.geo')),
+    }
+    _, node = run_get_node(CalculationFactory('gmsh'), **inputs)
+
+    result = CliRunner().invoke(bulk_export, [str(tmp_path), '--dim', '2', '--compression', 'gzip'],
+                                catch_exceptions=False)
+    assert 'Exported 1 of 1 meshes' in result.output
+
+    with open(tmp_path / 'manifest.json') as handle:
+        manifest = json.load(handle)
+    entry, = manifest['items']
+    assert entry['pk'] == node.pk
+    assert entry['mesh'] == os.path.join(str(node.pk), 'mesh.msh.gz')
+    with gzip.open(tmp_path / entry['mesh'], 'rt') as handle:
+        assert handle.read() == node.outputs.mshfile.get_content()
+    with open(tmp_path / entry['parameters']) as handle:
+        assert json.load(handle)['2'] is True
+
+
+def test_data_gmsh_diff(tmp_path):
+    """Test 'verdi data gmsh diff' with MSH files."""
+    mshfile = os.path.join(TEST_DIR, 'input_files', 'two_triangles.msh')
+    result = CliRunner().invoke(diff, [mshfile, mshfile], catch_exceptions=False)
+    assert result.exit_code == 0
+    assert 'Meshes are equal' in result.output
+
+    # move the node at the origin
+    with open(mshfile) as handle:
+        content = handle.read()
+    moved = tmp_path / 'moved.msh'
+    moved.write_text(content.replace('1\n0 0 0\n', '1\n0.25 0 0\n', 1))
+    result = CliRunner().invoke(diff, [mshfile, str(moved)], catch_exceptions=False)
+    assert result.exit_code == 1
+    assert 'Node coordinates differ' in result.output
+
+    result = CliRunner().invoke(diff, [mshfile, str(moved), '--tolerance', '1'], catch_exceptions=False)
+    assert result.exit_code == 0
+
+
+def test_data_gmsh_meshes(gmsh_code):
+    """Test querying meshes by their metadata with 'verdi data gmsh meshes'."""
+    GmshParameters = DataFactory('gmsh')
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({'2': True}),
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, 'input_files', 'unit_square.geo')),
+    }
+    result, _ = run_get_node(CalculationFactory('gmsh'), **inputs)
+    mshfile = result['mshfile']
+    metadata = mshfile.get_attribute('msh_metadata')
+    assert (metadata['dimension'], metadata['num_nodes']) == (2, 25)
+    assert metadata['physical_names'] == ['surface']
+
+    options = ['--format', 'json', '--dim', '2', '--physical', 'surface', '--min-nodes', '25', '--element-type', '2']
+    output = CliRunner().invoke(meshes, options, catch_exceptions=False).output
+    assert mshfile.pk in [row['pk'] for row in json.loads(output)]
+
+    for options in (['--dim', '3'], ['--physical', 'inlet'], ['--max-nodes', '24'], ['--element-type', '4']):
+        output = CliRunner().invoke(meshes, ['--format', 'json'] + options, catch_exceptions=False).output
+        assert mshfile.pk not in [row['pk'] for row in json.loads(output)]
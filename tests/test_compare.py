@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+""" Tests for the mesh comparison
+
+"""
+import io
+import os
+
+import numpy as np
+
+from aiida_gmsh.compare import compare, fingerprint
+
+from . import TEST_DIR
+from .synthetic import unit_square_mesh, write_msh
+
+
+def _msh(nodes, elements, binary=False, physical_name='domain'):
+    """Return a MSH file written to memory."""
+    handle = io.BytesIO()
+    write_msh(handle, nodes, elements, binary=binary, physical_name=physical_name)
+    handle.seek(0)
+    return handle
+
+
+def test_compare_renumbered():
+    """Test that meshes are equal up to node and element renumbering and within the tolerance."""
+    nodes, elements = unit_square_mesh(8)
+    rng = np.random.default_rng(0)
+
+    # renumber nodes (node i of the new mesh is node permutation[i] of the original mesh) and shuffle elements
+    permutation = rng.permutation(nodes.shape[0])
+    new_tags = np.empty_like(permutation)
+    new_tags[permutation] = np.arange(1, nodes.shape[0] + 1)
+    renumbered = {2: new_tags[elements[2] - 1][rng.permutation(elements[2].shape[0])]}
+    perturbed = nodes[permutation] + rng.uniform(-1e-12, 1e-12, size=nodes.shape)
+
+    assert compare(_msh(nodes, elements), _msh(perturbed, renumbered, binary=True)) == []
+    assert fingerprint(_msh(nodes, elements))['digest'] == fingerprint(_msh(nodes, elements, binary=True))['digest']
+
+
+def test_compare_rounding_boundary():
+    """Test that nodes within the tolerance are equal, even if they lie on either side of a rounding boundary."""
+    nodes, elements = unit_square_mesh(8)
+    tolerance = 1e-8
+
+    # coordinates straddling the boundaries of the rounding to multiples of the tolerance (fingerprints)
+    below = (np.round(nodes / tolerance) + 0.5 - 1e-3) * tolerance
+    above = below + 2e-3 * tolerance
+    assert compare(_msh(below, elements), _msh(above, elements), tolerance) == []
+    # fingerprints are exact keys
+    assert fingerprint(_msh(below, elements), tolerance)['nodes'] != fingerprint(_msh(above, elements),
+                                                                                 tolerance)['nodes']
+
+    # coordinates straddling the cells of all grids used to match the nodes
+    below = (np.round(nodes / (2 * tolerance)) - 1e-3) * 2 * tolerance
+    above = below + 4e-3 * tolerance
+    assert compare(_msh(below, elements), _msh(above, elements), tolerance) == []
+
+    rng = np.random.default_rng(1)
+    noisy = nodes + rng.uniform(-0.99 * tolerance, 0.99 * tolerance, size=nodes.shape)
+    assert compare(_msh(nodes, elements), _msh(noisy, elements), tolerance) == []
+    noisy[5, 1] = nodes[5, 1] + 1.01 * tolerance
+    assert compare(_msh(nodes, elements), _msh(noisy, elements), tolerance) == ['Node coordinates differ']
+
+
+def test_compare_differences():
+    """Test detecting different coordinates, connectivity and physical groups."""
+    nodes, elements = unit_square_mesh(4)
+
+    moved = nodes.copy()
+    moved[6] += 1e-3
+    assert compare(_msh(nodes, elements), _msh(moved, elements)) == ['Node coordinates differ']
+    assert compare(_msh(nodes, elements), _msh(moved, elements), tolerance=1e-2) == []
+
+    flipped = {2: elements[2].copy()}
+    flipped[2][0] = flipped[2][0, ::-1]
+    assert compare(_msh(nodes, elements), _msh(nodes, flipped)) == ['Connectivity of elements of type 2 differs']
+
+    differences = compare(_msh(nodes, elements), _msh(nodes, elements, physical_name='plate'))
+    assert differences[0] == 'Physical groups of elements of type 2 differ'
+    assert differences[1].startswith('Names of physical groups differ')
+
+    differences = compare(_msh(nodes, elements), _msh(*unit_square_mesh(5)))
+    assert differences[0].startswith('Number of nodes differs')
+
+
+def test_compare_physical_groups():
+    """Test that all physical groups of an element are compared, not only the first one."""
+    with open(os.path.join(TEST_DIR, 'input_files', 'two_triangles.msh'), 'rb') as handle:
+        content = handle.read()
+    # the surface additionally belongs to the physical group 2
+    both = content.replace(b'1 0 0 0 1 1 0 1 1 4', b'1 0 0 0 1 1 0 2 1 2 4')
+
+    assert compare(io.BytesIO(content), io.BytesIO(content)) == []
+    assert compare(io.BytesIO(content), io.BytesIO(both)) == ['Physical groups of elements of type 2 differ']
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+""" Tests for data types
+
+"""
+import pytest
+from voluptuous import Invalid
+from aiida.plugins import DataFactory
+
+
+def test_parameters_hash():
+    """Test that equivalent parameters share the same hash."""
+    GmshParameters = DataFactory('gmsh')
+    parameters = GmshParameters({'2': True})
+    equivalent = GmshParameters({'order': 1, 'pid': False, '2': True, 'format': 'auto'})
+    different = GmshParameters({'3': True})
+
+    assert parameters.canonical_dict() == {'2': True, 'format': 'auto', 'order': 1}
+    assert parameters.get_hash() == equivalent.get_hash()
+    # parameters sharing a hash run the same command
+    assert sorted(parameters.cmdline_params(geofile='a.geo')) == sorted(equivalent.cmdline_params(geofile='a.geo'))
+    assert parameters.get_hash() != different.get_hash()
+
+
+def test_parameters_setnumber():
+    """Test repeated -setnumber/-setstring options and grid expansion."""
+    GmshParameters = DataFactory('gmsh')
+    parameters = GmshParameters({'2': True, 'setnumber': {'radius': 0.1, 'thickness': 1}, 'setstring': {'name': 'a'}})
+
+    cmdline = ' '.join(parameters.cmdline_params(geofile='plate.geo'))
+    assert '-setnumber radius 0.1' in cmdline
+    assert '-setnumber thickness 1.0' in cmdline
+    assert '-setstring name a' in cmdline
+
+    points = parameters.expand_grid({'setnumber': {'radius': [0.1, 0.2, 0.2]}, 'clscale': [1, 1.0]})
+    assert len(points) == 2
+    assert sorted(point['setnumber']['radius'] for point in points) == [0.1, 0.2]
+    assert all(point['setnumber']['thickness'] == 1.0 for point in points)
+
+
+def test_parameters_switches_off():
+    """Test that switches which are turned off are left out of the command line."""
+    GmshParameters = DataFactory('gmsh')
+    cmdline = GmshParameters({'2': True, 'bin': False}).cmdline_params(geofile='a.geo', output_filename='mesh.msh')
+    assert cmdline[:2] == ['a.geo', '-2']
+    assert '-bin' not in cmdline
+    assert 'False' not in cmdline
+    assert cmdline[-2:] == ['-o', 'mesh.msh']
+
+    # opting out of the binary default of 3D meshes
+    cmdline = GmshParameters({'3': True, 'bin': False}).cmdline_params(geofile='a.geo')
+    assert '-bin' not in cmdline
+    assert 'False' not in cmdline
+
+
+def test_parameters_partitions():
+    """Test the options for partitioned meshes."""
+    GmshParameters = DataFactory('gmsh')
+    parameters = GmshParameters({'3': True, 'part': 4, 'part_split': True})
+    cmdline = ' '.join(parameters.cmdline_params(geofile='box.geo'))
+    assert '-part 4' in cmdline
+    assert '-part_split' in cmdline
+
+    with pytest.raises(Invalid):
+        GmshParameters({'3': True, 'part_split': True})
+
+
+def test_parameters_parent_mesh():
+    """Test the post-processing options applied to a parent mesh."""
+    GmshParameters = DataFactory('gmsh')
+    parameters = GmshParameters({'optimize_netgen': True, 'optimize_ho': True})
+    assert parameters.parent_mesh_script('parent/mesh.msh') == \
+        'Merge "parent/mesh.msh";\nOptimizeMesh "Netgen";\nOptimizeMesh "HighOrder";\n'
+    # the parent is optimized by the script, without meshing
+    cmdline = parameters.cmdline_params(geofile=None, output_filename='mesh.msh', parent_mesh='_aiida_parent.geo')
+    assert cmdline[:2] == ['_aiida_parent.geo', '-0']
+    assert '-optimize_netgen' not in cmdline
+    assert '-optimize_ho' not in cmdline
+
+    cmdline = GmshParameters({'refine': True}).cmdline_params(geofile='box.geo', parent_mesh='parent/mesh.msh')
+    assert cmdline[:2] == ['box.geo', 'parent/mesh.msh']
+    assert '-refine' in cmdline
+
+    with pytest.raises(Invalid):
+        GmshParameters({'3': True, 'refine': True})
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+""" Tests for geofile dependencies
+
+"""
+import io
+import os
+
+import pytest
+from aiida.plugins import DataFactory, CalculationFactory
+from aiida.engine import run_get_node
+from aiida.orm import SinglefileData
+
+from aiida_gmsh.dependencies import get_remote_dependency, parse_references, resolve_dependencies
+
+from . import TEST_DIR
+
+GEOFILE = """// Include "ignored.geo";
+Include "params/mesh_size.geo";
+Merge "cad/part.step";
+v() = ShapeFromFile("/data/shared.brep");
+"""
+
+
+def test_parse_references():
+    """Test finding Include, Merge and ShapeFromFile statements."""
+    assert parse_references(GEOFILE) == [('Include', 'params/mesh_size.geo'), ('Merge', 'cad/part.step')]
+
+
+def test_resolve_dependencies():
+    """Test placing dependencies at the referenced paths."""
+    geofile = SinglefileData(file=io.BytesIO(GEOFILE.encode()), filename='plate.geo')
+    dependencies = {
+        'mesh_size': SinglefileData(file=io.BytesIO(b'Include "common.geo";\n'), filename='mesh_size.geo'),
+        'common': SinglefileData(file=io.BytesIO(b'h = 0.1;\n'), filename='common.geo'),
+        'part': SinglefileData(file=io.BytesIO(b'ISO-10303-21;\n'), filename='part.step'),
+        'readme': SinglefileData(file=io.BytesIO(b'\n'), filename='README'),
+    }
+
+    assert resolve_dependencies(geofile, dependencies) == {
+        'mesh_size': 'params/mesh_size.geo',
+        'common': 'params/common.geo',
+        'part': 'cad/part.step',
+        'readme': 'README',
+    }
+
+    dependencies.pop('part')
+    with pytest.raises(ValueError, match='cad/part.step'):
+        resolve_dependencies(geofile, dependencies)
+
+
+def test_process_dependencies(gmsh_code, tmp_path):
+    """Test meshing a geofile including a local and a remote dependency."""
+    GmshParameters = DataFactory('gmsh')
+    with open(os.path.join(TEST_DIR, "input_files", "unit_square.geo")) as handle:
+        content = handle.read().replace('NTransfinite = 5;', 'Include "params/size.geo";')
+    geofile = SinglefileData(file=io.BytesIO(content.encode()), filename='unit_square.geo')
+
+    size_file = tmp_path / 'size.geo'
+    size_file.write_text('NTransfinite = 5;\n')
+    remote = get_remote_dependency(str(size_file), gmsh_code.computer, str(tmp_path / 'store'))
+    assert get_remote_dependency(str(size_file), gmsh_code.computer, str(tmp_path / 'store')).pk == remote.pk
+
+    inputs = {
+        'code': gmsh_code,
+        'parameters': GmshParameters({"2": True}),
+        'geofile': geofile,
+        'dependencies': {'size': remote},
+        'metadata': {
+            'options': {
+                'max_wallclock_seconds': 30,
+                'parse_mesh': True,
+            },
+        },
+    }
+    result, node = run_get_node(CalculationFactory('gmsh'), **inputs)
+    assert node.is_finished_ok
+    assert result['mesh'].num_nodes == 25
+
+    inputs['dependencies'] = {'size': SinglefileData(file=str(size_file))}
+    result, node = run_get_node(CalculationFactory('gmsh'), **inputs)
+    assert node.is_finished_ok
+    assert result['mesh'].num_nodes == 25
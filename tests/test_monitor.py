@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+""" Tests for monitoring the log of gmsh
+
+"""
+import os
+
+from aiida_gmsh.monitor import LogProgress, MonitorRules, check_rules
+
+from . import TEST_DIR
+
+
+def test_log_progress():
+    """Test following the progress while the log is written in chunks."""
+    with open(os.path.join(TEST_DIR, 'input_files', 'gmsh.log')) as handle:
+        content = handle.read()
+
+    progress = LogProgress()
+    # chunks end in the middle of lines
+    progress.update(content[:content.index('Meshing 3D') + 5])
+    assert progress.stage == 'meshing_2d'
+    progress.update(content[content.index('Meshing 3D') + 5:content.index('Warning')])
+    assert progress.stage == 'tetrahedrizing'
+    assert progress.num_nodes == 1242
+    progress.update(content[content.index('Warning'):])
+    assert progress.stage == 'writing'
+    assert (progress.num_nodes, progress.num_elements) == (5283, 30127)
+    assert progress.peak_memory_mb == 41.7
+    assert progress.num_bytes == len(content.encode())
+
+
+def test_check_rules():
+    """Test the rules for aborting calculations."""
+    progress = LogProgress()
+    progress.update('Info    : Optimizing mesh...\nInfo    : 5283 nodes 30127 elements\n')
+
+    assert check_rules(progress, MonitorRules(None, None, None), idle_seconds=1e6) is None
+    assert check_rules(progress, MonitorRules(600, 30127, None), idle_seconds=60) is None
+    assert 'no progress' in check_rules(progress, MonitorRules(600, None, None), idle_seconds=601)
+    assert 'optimizing_mesh' in check_rules(progress, MonitorRules(600, None, None), idle_seconds=601)
+    assert '30127 elements' in check_rules(progress, MonitorRules(None, 30000, None), idle_seconds=0)
+    # memory is only reported with the cpu option
+    assert check_rules(progress, MonitorRules(None, None, 1.), idle_seconds=0) is None
+    progress.update('Info    : Done writing (Wall 0.03s, CPU 0.029s, Mem 38.2Mb)\n')
+    assert 'memory' in check_rules(progress, MonitorRules(None, None, 1.), idle_seconds=0)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+""" Tests for the MSH reader
+
+"""
+import io
+import os
+
+import numpy as np
+import pytest
+
+from aiida_gmsh.msh import MshError, load_memmap, read_counts, read_header, read_mesh, read_metadata
+
+from . import TEST_DIR
+from .synthetic import unit_cube_mesh, unit_square_mesh, write_msh
+
+MSHFILE = os.path.join(TEST_DIR, 'input_files', 'two_triangles.msh')
+PARTITIONED_MSHFILE = os.path.join(TEST_DIR, 'input_files', 'two_partitions.msh')
+
+
+def test_read_mesh():
+    """Test reading nodes, elements and physical groups."""
+    with open(MSHFILE, 'rb') as handle:
+        mesh = read_mesh(handle)
+
+    np.testing.assert_array_equal(mesh['node_tags'], [1, 2, 3, 4])
+    np.testing.assert_allclose(mesh['nodes'], [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+    assert sorted(mesh['elements']) == [1, 2]
+    np.testing.assert_array_equal(mesh['elements'][1], [[1, 2]])
+    np.testing.assert_array_equal(mesh['elements'][2], [[1, 2, 3], [1, 3, 4]])
+    np.testing.assert_array_equal(mesh['element_tags'][2], [2, 3])
+    np.testing.assert_array_equal(mesh['physical_tags'][1], [[2]])
+    np.testing.assert_array_equal(mesh['physical_tags'][2], [[1], [1]])
+    assert mesh['physical_names'] == {1: (2, 'surface'), 2: (1, 'bottom')}
+
+
+def test_read_mesh_physical_groups():
+    """Test that elements keep the tags of all physical groups of their entity."""
+    with open(MSHFILE, 'rb') as handle:
+        content = handle.read()
+
+    # the surface belongs to the physical groups 1 and 2
+    mesh = read_mesh(io.BytesIO(content.replace(b'1 0 0 0 1 1 0 1 1 4', b'1 0 0 0 1 1 0 2 1 2 4')))
+    np.testing.assert_array_equal(mesh['physical_tags'][1], [[2]])
+    np.testing.assert_array_equal(mesh['physical_tags'][2], [[1, 2], [1, 2]])
+
+
+def test_read_mesh_invalid():
+    """Test that truncated and unsupported files are rejected."""
+    with open(MSHFILE, 'rb') as handle:
+        content = handle.read()
+
+    with pytest.raises(MshError):
+        read_mesh(io.BytesIO(content[:content.index(b'$EndNodes')]))
+
+    with pytest.raises(MshError):
+        read_mesh(io.BytesIO(content.replace(b'4.1 0 8', b'2.2 0 8')))
+
+
+def test_read_counts():
+    """Test counting nodes and elements per partition."""
+    with open(MSHFILE, 'rb') as handle:
+        assert read_counts(handle) == {'num_nodes': 4, 'num_elements': 3, 'partitions': {}}
+
+    with open(PARTITIONED_MSHFILE, 'rb') as handle:
+        counts = read_counts(handle)
+    assert counts['num_nodes'] == 4
+    assert counts['num_elements'] == 3
+    assert counts['partitions'] == {
+        1: {'num_nodes': 3, 'num_elements': 2},
+        2: {'num_nodes': 1, 'num_elements': 1},
+    }
+
+
+
+def test_read_mesh_partitioned():
+    """Test that the physical tags of a partitioned mesh are those of the partitioned entities."""
+    with open(PARTITIONED_MSHFILE, 'rb') as handle:
+        content = handle.read()
+    # the model entities (curve 1 and surface 1) are in physical groups 6 and 5, as are the partitioned curve 1
+    # and surfaces 2 and 3 (parts of surface 1), to which the element blocks refer
+    content = content.replace(b'$PartitionedEntities\n', b'$Entities\n0 1 1 0\n1 0 0 0 1 0 0 1 6 0\n'
+                              b'1 0 0 0 1 1 0 1 5 0\n$EndEntities\n$PartitionedEntities\n')
+    content = content.replace(b'1 1 1 1 1 0 0 0 1 0 0 0 2 1 -2', b'1 1 1 1 1 0 0 0 1 0 0 1 6 2 1 -2')
+    content = content.replace(b'2 2 1 1 1 0 0 0 1 1 0 0 0', b'2 2 1 1 1 0 0 0 1 1 0 1 5 0')
+    content = content.replace(b'3 2 1 1 2 0 0 0 1 1 0 0 0', b'3 2 1 1 2 0 0 0 1 1 0 1 5 0')
+
+    mesh = read_mesh(io.BytesIO(content))
+    np.testing.assert_array_equal(mesh['physical_tags'][1], [[6]])
+    np.testing.assert_array_equal(mesh['physical_tags'][2], [[5], [5]])
+    assert read_counts(io.BytesIO(content))['partitions'] == {
+        1: {'num_nodes': 3, 'num_elements': 2},
+        2: {'num_nodes': 1, 'num_elements': 1},
+    }
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_read_mesh_synthetic(tmp_path, binary):
+    """Test reading ASCII and binary files with the same content."""
+    nodes, elements = unit_cube_mesh(3)
+    path = tmp_path / 'cube.msh'
+    with open(path, 'wb') as handle:
+        write_msh(handle, nodes, elements, binary=binary)
+
+    with open(path, 'rb') as handle:
+        mesh = read_mesh(handle)
+
+    np.testing.assert_array_equal(mesh['nodes'], nodes)
+    np.testing.assert_array_equal(mesh['elements'][4], elements[4])
+    assert (mesh['physical_tags'][4] == 1).all()
+    assert mesh['physical_names'] == {1: (3, 'domain')}
+
+
+def test_load_memmap(tmp_path):
+    """Test memory-mapping a binary file."""
+    nodes, elements = unit_square_mesh(4)
+    path = tmp_path / 'square.msh'
+    with open(path, 'wb') as handle:
+        write_msh(handle, nodes, elements, binary=True)
+
+    mesh = load_memmap(str(path))
+    node_block, = mesh.node_blocks
+    element_block, = mesh.element_blocks
+    assert isinstance(node_block.coordinates, np.memmap)
+    np.testing.assert_array_equal(node_block.coordinates, nodes)
+    np.testing.assert_array_equal(element_block.connectivity, elements[2])
+    assert element_block.element_type == 2
+
+    with open(path, 'wb') as handle:
+        write_msh(handle, nodes, elements, binary=False)
+    with pytest.raises(MshError):
+        load_memmap(str(path))
+
+
+def test_load_memmap_node(tmp_path, monkeypatch):
+    """Test memory-mapping a ``SinglefileData`` from the repository and through the fallback copy."""
+    from aiida.orm import SinglefileData  # pylint: disable=import-outside-toplevel
+    from aiida_gmsh import repository  # pylint: disable=import-outside-toplevel
+
+    nodes, elements = unit_square_mesh(4)
+    path = tmp_path / 'square.msh'
+    with open(path, 'wb') as handle:
+        write_msh(handle, nodes, elements, binary=True)
+    node = SinglefileData(file=str(path)).store()
+
+    np.testing.assert_array_equal(load_memmap(node).node_blocks[0].coordinates, nodes)
+    monkeypatch.setattr(repository, '_get_repository_folder', lambda node: None)
+    np.testing.assert_array_equal(load_memmap(node).node_blocks[0].coordinates, nodes)
+
+
+def test_read_header():
+    """Test reading the metadata of complete and truncated files."""
+    with open(MSHFILE, 'rb') as handle:
+        content = handle.read()
+
+    header = read_header(io.BytesIO(content))
+    assert header['version'] == '4.1'
+    assert not header['binary']
+    assert header['physical_names'] == {1: (2, 'surface'), 2: (1, 'bottom')}
+    assert header['num_entities'] == [4, 4, 1, 0]
+    assert header['num_nodes'] == 4
+
+    header = read_header(io.BytesIO(content[:content.index(b'$Entities') + 20]))
+    assert header['physical_names'] == {1: (2, 'surface'), 2: (1, 'bottom')}
+    assert header['num_entities'] is None
+    assert header['num_nodes'] is None
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_read_metadata(tmp_path, binary):
+    """Test reading the metadata without parsing nodes and elements."""
+    with open(MSHFILE, 'rb') as handle:
+        metadata = read_metadata(handle)
+    assert metadata == {
+        'version': '4.1',
+        'binary': False,
+        'dimension': 2,
+        'num_nodes': 4,
+        'num_elements': 3,
+        'num_elements_per_type': {'1': 1, '2': 2},
+        'bounding_box': [0, 0, 0, 1, 1, 0],
+        'physical_names': ['bottom', 'surface'],
+    }
+
+    nodes, elements = unit_cube_mesh(3)
+    path = tmp_path / 'cube.msh'
+    with open(path, 'wb') as handle:
+        write_msh(handle, nodes, elements, binary=binary)
+    with open(path, 'rb') as handle:
+        metadata = read_metadata(handle)
+    assert metadata['binary'] == binary
+    assert metadata['dimension'] == 3
+    assert metadata['num_nodes'] == nodes.shape[0]
+    assert metadata['num_elements_per_type'] == {'4': elements[4].shape[0]}
+    assert metadata['bounding_box'] == [0, 0, 0, 1, 1, 1]
+    assert metadata['physical_names'] == ['domain']
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+""" Tests for mesh quality metrics
+
+"""
+import os
+
+import numpy as np
+
+from aiida_gmsh.msh import read_mesh
+from aiida_gmsh.quality import compute_quality, mesh_quality
+
+from . import TEST_DIR
+from .synthetic import unit_cube_mesh, unit_square_mesh
+
+EQUILATERAL_TETRA = np.array([[0, 0, 0], [1, 0, 0], [0.5, np.sqrt(3) / 2, 0], [0.5, np.sqrt(3) / 6, np.sqrt(2 / 3)]])
+
+
+def test_equilateral():
+    """Test that all metrics are 1 for equilateral elements and SICN detects inverted elements."""
+    quality = compute_quality(EQUILATERAL_TETRA, {2: np.array([[0, 1, 2]]), 4: np.array([[0, 1, 2, 3], [0, 2, 1, 3]])})
+
+    for name in ('sicn', 'gamma', 'aspect_ratio'):
+        assert np.isclose(quality['triangle'][name]['max'], 1)
+    assert quality['triangle']['num_inverted'] == 0
+
+    tetra = quality['tetra']
+    assert tetra['num_elements'] == 2
+    assert tetra['num_inverted'] == 1
+    assert np.isclose(tetra['sicn']['min'], -1)
+    assert np.isclose(tetra['sicn']['max'], 1)
+    assert np.isclose(tetra['gamma']['min'], 1)
+    assert tetra['sicn']['histogram']['counts'][0] == 1
+    assert tetra['sicn']['histogram']['counts'][-1] == 1
+
+
+def test_structured_meshes():
+    """Test quality of structured meshes, independent of the chunk size."""
+    nodes, elements = unit_square_mesh(4)
+    quality = compute_quality(nodes, {2: elements[2] - 1}, chunk_size=7)['triangle']
+    # right isosceles triangles
+    assert quality['num_elements'] == 32
+    assert quality['num_inverted'] == 0
+    assert np.isclose(quality['sicn']['min'], np.sqrt(3) / 2)
+    assert np.isclose(quality['gamma']['mean'], 2 * (np.sqrt(2) - 1))
+    assert np.isclose(quality['aspect_ratio']['max'], np.sqrt(2))
+    assert sum(quality['aspect_ratio']['histogram']['counts']) == 32
+
+    # inverting the orientation of a planar mesh
+    quality = compute_quality(nodes, {2: elements[2][:, ::-1] - 1})['triangle']
+    assert quality['num_inverted'] == 32
+
+    nodes, elements = unit_cube_mesh(3)
+    quality = compute_quality(nodes, {4: elements[4] - 1}, chunk_size=100)['tetra']
+    assert quality['num_elements'] == 162
+    assert quality['num_inverted'] == 0
+    assert np.isclose(quality['sicn']['min'], np.sqrt(3 / 5))
+    assert np.isclose(quality['sicn']['max'], np.sqrt(3 / 5))
+
+
+def test_degenerate():
+    """Test that elements with coinciding nodes are counted as degenerate."""
+    nodes = np.array([[0, 0, 0], [1, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=float)
+    quality = compute_quality(nodes, {4: np.array([[0, 1, 2, 3]])})['tetra']
+    assert quality['num_degenerate'] == 1
+    assert quality['sicn']['min'] == 0
+    assert quality['aspect_ratio']['mean'] is None
+
+
+def test_mesh_quality():
+    """Test computing the quality of a mesh read from a MSH file (lines are ignored)."""
+    with open(os.path.join(TEST_DIR, 'input_files', 'two_triangles.msh'), 'rb') as handle:
+        quality = mesh_quality(read_mesh(handle))
+
+    assert list(quality) == ['triangle']
+    assert quality['triangle']['num_elements'] == 2
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+""" Tests for the throttled submission of sweeps
+
+"""
+import pytest
+
+from aiida_gmsh.sweep import (CHECKSUM_ATTRIBUTE, FAILED, FINISHED, SUBMITTED, SweepItem, read_journal, run_sweep,
+                              store_geofiles)
+
+
+class FakeDaemon:
+    """Calculations terminate after ``polls`` polls, items whose key starts with 'bad' fail."""
+
+    def __init__(self, polls=2):
+        self.polls = polls
+        self.calculations = {}
+        self.max_in_flight = 0
+
+    def submit(self, item):
+        pk = len(self.calculations) + 1
+        self.calculations[pk] = [item.key, 0]
+        return pk
+
+    def get_states(self, pks):
+        self.max_in_flight = max(self.max_in_flight, len(pks))
+        states = {}
+        for pk in pks:
+            key, polls = self.calculations[pk]
+            self.calculations[pk][1] = polls + 1
+            if polls + 1 < self.polls:
+                states[pk] = SUBMITTED
+            else:
+                states[pk] = FAILED if key.startswith('bad') else FINISHED
+        return states
+
+
+def get_items(num_items, num_bad=0):
+    return [SweepItem('{}_{}'.format('bad' if index < num_bad else 'item', index), None, {}) for index in range(num_items)]
+
+
+def test_run_sweep(tmp_path):
+    """Test that the number of calculations in flight is limited and progress is reported."""
+    daemon = FakeDaemon()
+    reports = []
+    progress = run_sweep(get_items(10, num_bad=1), daemon.submit, str(tmp_path / 'sweep.jsonl'), max_in_flight=3,
+                         get_states=daemon.get_states, report=reports.append, sleep=lambda _: None)
+
+    assert len(daemon.calculations) == 10
+    assert daemon.max_in_flight == 3
+    assert (progress.total, progress.submitted, progress.running) == (10, 10, 0)
+    assert (progress.finished, progress.failed) == (9, 1)
+    assert reports[0].running == 3
+    assert reports[-1] == progress
+
+    journal = read_journal(str(tmp_path / 'sweep.jsonl'))
+    assert journal['bad_0']['state'] == FAILED
+    assert all(journal['item_{}'.format(index)]['state'] == FINISHED for index in range(1, 10))
+
+
+def test_run_sweep_resume(tmp_path):
+    """Test that an interrupted sweep does not resubmit items which were submitted before."""
+    journal_path = str(tmp_path / 'sweep.jsonl')
+    daemon = FakeDaemon(polls=3)
+
+    def interrupt(_):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        run_sweep(get_items(6, num_bad=1), daemon.submit, journal_path, max_in_flight=2, get_states=daemon.get_states,
+                  sleep=interrupt)
+    assert len(daemon.calculations) == 2
+    assert {entry['state'] for entry in read_journal(journal_path).values()} == {SUBMITTED}
+
+    # the calculations submitted before the interruption are waited for, not resubmitted
+    progress = run_sweep(get_items(6, num_bad=1), daemon.submit, journal_path, max_in_flight=2,
+                         get_states=daemon.get_states, sleep=lambda _: None)
+    assert len(daemon.calculations) == 6
+    assert (progress.finished, progress.failed) == (5, 1)
+
+    # nothing left to do
+    progress = run_sweep(get_items(6, num_bad=1), daemon.submit, journal_path, get_states=daemon.get_states)
+    assert len(daemon.calculations) == 6
+
+    # failed items are resubmitted on request
+    progress = run_sweep(get_items(6, num_bad=1), daemon.submit, journal_path, retry_failed=True,
+                         get_states=daemon.get_states, sleep=lambda _: None)
+    assert len(daemon.calculations) == 7
+    assert read_journal(journal_path)['bad_0']['pk'] == 7
+
+
+def test_store_geofiles(tmp_path):
+    """Test that geofiles are stored once and their nodes are reused when the sweep is resumed."""
+    paths = {}
+    for name, content in (('first.geo', 'Point(1) = {0, 0, 0};\n'), ('second.geo', 'Point(1) = {1, 0, 0};\n')):
+        (tmp_path / name).write_text(content)
+        paths[name] = str(tmp_path / name)
+
+    nodes = store_geofiles(paths)
+    assert all(node.is_stored for node in nodes.values())
+    assert all(len(node.get_attribute(CHECKSUM_ATTRIBUTE)) == 64 for node in nodes.values())
+    assert {label: node.uuid for label, node in store_geofiles(paths).items()} == {
+        label: node.uuid for label, node in nodes.items()
+    }
+
+    # a changed file is stored again
+    (tmp_path / 'second.geo').write_text('Point(1) = {2, 0, 0};\n')
+    changed = store_geofiles(paths)
+    assert changed['first.geo'].uuid == nodes['first.geo'].uuid
+    assert changed['second.geo'].uuid != nodes['second.geo'].uuid
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+""" Tests for parsing the log of gmsh
+
+"""
+import os
+
+import pytest
+
+from aiida_gmsh.timings import parse_log, stage_name
+
+from . import TEST_DIR
+
+
+def test_parse_log():
+    """Test extracting timings per stage, memory usage and mesh size."""
+    with open(os.path.join(TEST_DIR, 'input_files', 'gmsh.log')) as handle:
+        timings = parse_log(handle.read())
+
+    stages = timings['stages']
+    assert sorted(stages) == ['meshing_1d', 'meshing_2d', 'meshing_3d', 'optimizing_mesh', 'tetrahedrizing', 'writing']
+    assert stages['meshing_3d'] == {'wall': 0.312, 'cpu': 0.305, 'count': 1}
+    # standard and Netgen optimization passes are accumulated
+    assert stages['optimizing_mesh']['count'] == 2
+    assert stages['optimizing_mesh']['wall'] == pytest.approx(0.1435)
+    assert timings['total'] == {'wall': 0.561, 'cpu': 0.543}
+    assert timings['peak_memory_mb'] == 41.7
+    assert (timings['num_nodes'], timings['num_elements']) == (5283, 30127)
+    assert (timings['num_warnings'], timings['num_errors']) == (1, 0)
+
+
+def test_parse_empty_log():
+    """Test that nothing is reported for an empty log."""
+    timings = parse_log('')
+    assert timings['stages'] == {}
+    assert timings['peak_memory_mb'] is None
+
+
+def test_stage_name():
+    """Test that stage names do not depend on file names and sizes."""
+    assert stage_name('meshing 1D') == 'meshing_1d'
+    assert stage_name("writing 'mesh.msh'") == 'writing'
+    assert stage_name('tetrahedrizing 1242 nodes') == 'tetrahedrizing'
+    assert stage_name('Optimizing mesh (Netgen)') == 'optimizing_mesh_netgen'
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+""" Tests for workflows
+
+"""
+import os
+from aiida.plugins import DataFactory, WorkflowFactory
+from aiida.engine import run_get_node
+from aiida.orm import Dict, Int, List, SinglefileData
+
+from aiida_gmsh.msh import read_header
+
+from . import TEST_DIR
+
+
+def test_convergence(gmsh_code):
+    """Test a mesh convergence study with three levels, two of them running at a time."""
+    GmshParameters = DataFactory('gmsh')
+
+    inputs = {
+        'gmsh': {
+            'code': gmsh_code,
+            'parameters': GmshParameters({"2": True}),
+            # the transfinite unit_square.geo would not be affected by -clscale
+            'geofile': SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square_unstructured.geo")),
+            'metadata': {
+                'options': {
+                    'max_wallclock_seconds': 30
+                },
+            },
+        },
+        'refinement_factors': List(list=[1.0, 0.5, 0.25]),
+        'max_concurrent': Int(2),
+    }
+
+    result, node = run_get_node(WorkflowFactory('gmsh.convergence'), **inputs)
+
+    assert node.is_finished_ok
+    assert sorted(result['mshfiles']) == ['level_0', 'level_1', 'level_2']
+    levels = result['summary'].get_dict()['levels']
+    assert [level['refinement_factor'] for level in levels] == [1.0, 0.5, 0.25]
+    for coarse, fine in zip(levels, levels[1:]):
+        assert fine['num_nodes'] > coarse['num_nodes']
+        assert fine['num_elements'] > coarse['num_elements']
+
+
+def test_sweep(gmsh_code):
+    """Test sweeping a parameter of the geometry."""
+    GmshParameters = DataFactory('gmsh')
+
+    inputs = {
+        'batch': {
+            'code': gmsh_code,
+            'metadata': {
+                'options': {
+                    'max_wallclock_seconds': 30
+                },
+            },
+        },
+        'geofile': SinglefileData(file=os.path.join(TEST_DIR, "input_files", "unit_square_parametrized.geo")),
+        'parameters': GmshParameters({"2": True}),
+        'grid': Dict(dict={'setnumber': {'NTransfinite': [3, 5, 5.0]}}),
+    }
+
+    result, node = run_get_node(WorkflowFactory('gmsh.sweep'), **inputs)
+
+    assert node.is_finished_ok
+    assert sorted(result['points']) == ['point_0', 'point_1']
+    assert sorted(result['mshfiles']) == ['point_0', 'point_1']
+    # NTransfinite nodes per side
+    num_nodes = {}
+    for label, mshfile in result['mshfiles'].items():
+        with mshfile.open(mode='rb') as handle:
+            num_nodes[label] = read_header(handle)['num_nodes']
+    assert num_nodes == {'point_0': 9, 'point_1': 25}
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+""" Tests for the XDMF/HDF5 conversion
+
+"""
+import io
+import os
+
+import numpy as np
+import pytest
+
+from aiida_gmsh.msh import MshError, read_mesh
+from aiida_gmsh.xdmf import write_xdmf
+
+from . import TEST_DIR
+from .synthetic import unit_cube_mesh, write_msh
+
+h5py = pytest.importorskip('h5py')
+
+MSHFILE = os.path.join(TEST_DIR, 'input_files', 'two_triangles.msh')
+
+
+def test_write_xdmf(tmp_path):
+    """Test converting cells and facets with their physical tags."""
+    with open(MSHFILE, 'rb') as handle:
+        summary = write_xdmf(handle, str(tmp_path / 'mesh.h5'), str(tmp_path / 'mesh.xdmf'), gdim=2)
+
+    assert summary == {
+        'num_nodes': 4,
+        'cells': {'topology_type': 'Triangle', 'num_elements': 2},
+        'facets': {'topology_type': 'Polyline', 'num_elements': 1},
+    }
+    with h5py.File(str(tmp_path / 'mesh.h5'), 'r') as h5file:
+        np.testing.assert_allclose(h5file['geometry'][:], [[0, 0], [1, 0], [1, 1], [0, 1]])
+        np.testing.assert_array_equal(h5file['cells/topology'][:], [[0, 1, 2], [0, 2, 3]])
+        np.testing.assert_array_equal(h5file['cells/physical'][:], [1, 1])
+        np.testing.assert_array_equal(h5file['facets/topology'][:], [[0, 1]])
+        np.testing.assert_array_equal(h5file['facets/physical'][:], [2])
+
+    xdmf = (tmp_path / 'mesh.xdmf').read_text()
+    assert 'TopologyType="Triangle" NumberOfElements="2"' in xdmf
+    assert 'mesh.h5:/geometry' in xdmf
+    assert 'NodesPerElement="2"' in xdmf
+
+
+def test_write_xdmf_physical_groups(tmp_path):
+    """Test that entities in several physical groups are rejected instead of dropping groups."""
+    with open(MSHFILE, 'rb') as handle:
+        content = handle.read().replace(b'1 0 0 0 1 1 0 1 1 4', b'1 0 0 0 1 1 0 2 1 2 4')
+
+    with pytest.raises(MshError, match='several physical groups'):
+        write_xdmf(io.BytesIO(content), str(tmp_path / 'mesh.h5'), str(tmp_path / 'mesh.xdmf'), gdim=2)
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_write_xdmf_chunked(tmp_path, binary):
+    """Test that chunked and compressed datasets reproduce the mesh."""
+    nodes, elements = unit_cube_mesh(4)
+    path = tmp_path / 'cube.msh'
+    with open(path, 'wb') as handle:
+        write_msh(handle, nodes, elements, binary=binary)
+
+    with open(path, 'rb') as handle:
+        summary = write_xdmf(handle, str(tmp_path / 'cube.h5'), str(tmp_path / 'cube.xdmf'), chunk_rows=64)
+    with open(path, 'rb') as handle:
+        mesh = read_mesh(handle)
+
+    assert summary['cells'] == {'topology_type': 'Tetrahedron', 'num_elements': elements[4].shape[0]}
+    assert summary['facets'] is None
+    with h5py.File(str(tmp_path / 'cube.h5'), 'r') as h5file:
+        assert h5file['cells/topology'].chunks == (64, 4)
+        assert h5file['cells/topology'].compression == 'gzip'
+        np.testing.assert_array_equal(h5file['geometry'][:], mesh['nodes'])
+        np.testing.assert_array_equal(h5file['cells/topology'][:] + 1, elements[4])
+
+
+def test_write_xdmf_lower_dimensions(tmp_path):
+    """Test that elements of lower dimensions than the facets are not written to the HDF5 file."""
+    nodes, elements = unit_cube_mesh(4)
+    sizes = []
+    for name, with_lines in (('cube', False), ('cube_lines', True)):
+        path = tmp_path / (name + '.msh')
+        with open(path, 'wb') as handle:
+            write_msh(handle, nodes, {**elements, 1: elements[4][:, :2]} if with_lines else elements)
+        with open(path, 'rb') as handle:
+            summary = write_xdmf(handle, str(tmp_path / (name + '.h5')), str(tmp_path / (name + '.xdmf')),
+                                 compression=None)
+        assert summary['facets'] is None
+        with h5py.File(str(tmp_path / (name + '.h5')), 'r') as h5file:
+            assert sorted(h5file) == ['cells', 'geometry']
+        sizes.append(os.path.getsize(tmp_path / (name + '.h5')))
+
+    # no space is left behind by datasets of the lines
+    assert sizes[0] == sizes[1]